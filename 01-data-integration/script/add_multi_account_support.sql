@@ -0,0 +1,28 @@
+-- Multi-account (multi-store) support for the Lightspeed to Supabase sync
+-- Run once in the Supabase SQL Editor before setting LIGHTSPEED_ACCOUNTS_FILE.
+-- Existing rows are assigned to the 'default' account, which single-account runs keep using.
+
+-- 1. sync_state: one watermark per (account, entity_type)
+ALTER TABLE sync_state ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE sync_state DROP CONSTRAINT IF EXISTS sync_state_pkey;
+ALTER TABLE sync_state ADD PRIMARY KEY (account, entity_type);
+
+-- 2. Synced tables: rows are tagged with the account they came from
+-- Lightspeed ids are UUIDs, so they stay unique across stores and remain the primary key
+ALTER TABLE lightspeed_outlets ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE lightspeed_customers ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE lightspeed_products ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE lightspeed_sales ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE lightspeed_sale_line_items ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+ALTER TABLE lightspeed_inventory ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+
+CREATE INDEX IF NOT EXISTS idx_lightspeed_sales_account_date ON lightspeed_sales (account, sale_date);
+CREATE INDEX IF NOT EXISTS idx_lightspeed_products_account ON lightspeed_products (account);
+CREATE INDEX IF NOT EXISTS idx_lightspeed_customers_account ON lightspeed_customers (account);
+CREATE INDEX IF NOT EXISTS idx_lightspeed_inventory_account ON lightspeed_inventory (account);
+
+-- 3. sync_log: runs are tagged with their account so per-account history stays separate
+ALTER TABLE sync_log ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+
+-- 4. Verify
+SELECT account, entity_type, last_version, status FROM sync_state ORDER BY account, entity_type;
@@ -0,0 +1,36 @@
+-- Staged bulk UPDATE used by src/bulk_backfill.py --mode update
+-- Run this in Supabase SQL Editor once; it lets a backfill update a batch of
+-- rows with one statement instead of one UPDATE round trip per row.
+
+CREATE OR REPLACE FUNCTION bulk_update_columns(target_table TEXT, key_column TEXT, payload JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+    set_clause TEXT;
+    updated_count INTEGER;
+BEGIN
+    -- Update only the columns present in the payload, typed via the table's row type
+    SELECT string_agg(format('%I = src.%I', column_name, column_name), ', ')
+    INTO set_clause
+    FROM (
+        SELECT DISTINCT jsonb_object_keys(row_data) AS column_name
+        FROM jsonb_array_elements(payload) AS row_data
+    ) payload_columns
+    WHERE column_name <> key_column;
+
+    IF set_clause IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    EXECUTE format(
+        'UPDATE %I AS t SET %s FROM jsonb_populate_recordset(NULL::%I, $1) AS src WHERE t.%I = src.%I',
+        target_table, set_clause, target_table, key_column, key_column
+    ) USING payload;
+
+    GET DIAGNOSTICS updated_count = ROW_COUNT;
+    RETURN updated_count;
+END;
+$$;
+
+-- Only the service role (used by the sync scripts) may run arbitrary bulk updates
+REVOKE EXECUTE ON FUNCTION bulk_update_columns(TEXT, TEXT, JSONB) FROM PUBLIC, anon, authenticated;
@@ -0,0 +1,90 @@
+-- Server-side reconciliation of sales versus sale line items
+-- Run this in Supabase SQL Editor BEFORE deploying the sync code that writes
+-- lightspeed_sales.version, line_item_count and line_item_ids_md5
+
+-- 1. Record the Lightspeed version and expected line item count on every sale
+ALTER TABLE lightspeed_sales ADD COLUMN IF NOT EXISTS version BIGINT;
+ALTER TABLE lightspeed_sales ADD COLUMN IF NOT EXISTS line_item_count INTEGER;
+ALTER TABLE lightspeed_sales ADD COLUMN IF NOT EXISTS line_item_ids_md5 TEXT;
+
+COMMENT ON COLUMN lightspeed_sales.version IS 'Lightspeed version of the sale when it was last synced';
+COMMENT ON COLUMN lightspeed_sales.line_item_count IS 'Number of line items Lightspeed reported for the sale';
+COMMENT ON COLUMN lightspeed_sales.line_item_ids_md5 IS 'md5 of the sale''s line item ids, sorted bytewise and joined with commas';
+
+CREATE INDEX IF NOT EXISTS idx_lightspeed_sales_version ON lightspeed_sales (version);
+CREATE INDEX IF NOT EXISTS idx_lightspeed_sale_line_items_sale_id ON lightspeed_sale_line_items (sale_id);
+
+-- 2. Per-version-bucket counts and checksums for both sides:
+--    expected = line_item_ids_md5 stored on the sale (its line_item_count for sales synced
+--    before the checksum was recorded), actual = the same computed from lightspeed_sale_line_items.
+--    Line items are only aggregated for the sales in the requested range, so each narrowing
+--    pass costs as much as the range it looks at, not the whole table.
+CREATE OR REPLACE FUNCTION sale_line_item_bucket_checksums(
+    bucket_size BIGINT,
+    min_version BIGINT DEFAULT NULL,
+    max_version BIGINT DEFAULT NULL
+)
+RETURNS TABLE (
+    bucket BIGINT,
+    sales BIGINT,
+    expected_items BIGINT,
+    actual_items BIGINT,
+    expected_checksum TEXT,
+    actual_checksum TEXT
+)
+LANGUAGE sql STABLE AS $$
+    WITH ranged AS (
+        SELECT id, version / bucket_size AS bucket, line_item_count, line_item_ids_md5
+        FROM lightspeed_sales
+        WHERE version IS NOT NULL
+          AND line_item_count IS NOT NULL
+          AND (min_version IS NULL OR version >= min_version)
+          AND (max_version IS NULL OR version < max_version)
+    ),
+    items AS (
+        SELECT li.sale_id,
+               count(*) AS actual,
+               md5(string_agg(li.id::TEXT, ',' ORDER BY li.id::TEXT COLLATE "C")) AS actual_md5
+        FROM lightspeed_sale_line_items li
+        JOIN ranged r ON r.id = li.sale_id
+        GROUP BY li.sale_id
+    ),
+    per_sale AS (
+        SELECT r.id,
+               r.bucket,
+               r.line_item_count AS expected,
+               coalesce(i.actual, 0) AS actual,
+               coalesce(r.line_item_ids_md5, r.line_item_count::TEXT) AS expected_signature,
+               CASE WHEN r.line_item_ids_md5 IS NULL THEN coalesce(i.actual, 0)::TEXT
+                    ELSE coalesce(i.actual_md5, md5('')) END AS actual_signature
+        FROM ranged r
+        LEFT JOIN items i ON i.sale_id = r.id
+    )
+    SELECT bucket,
+           count(*),
+           sum(expected),
+           sum(actual),
+           md5(string_agg(id || ':' || expected_signature, ',' ORDER BY id)),
+           md5(string_agg(id || ':' || actual_signature, ',' ORDER BY id))
+    FROM per_sale
+    GROUP BY bucket
+    ORDER BY bucket;
+$$;
+
+-- 3. Sales in a version range whose stored line items don't match the expected count or ids
+CREATE OR REPLACE FUNCTION sale_line_item_mismatches(min_version BIGINT, max_version BIGINT)
+RETURNS TABLE (sale_id TEXT, version BIGINT, expected_items INTEGER, actual_items BIGINT)
+LANGUAGE sql STABLE AS $$
+    SELECT s.id, s.version, s.line_item_count, count(li.id)
+    FROM lightspeed_sales s
+    LEFT JOIN lightspeed_sale_line_items li ON li.sale_id = s.id
+    WHERE s.version >= min_version
+      AND s.version < max_version
+      AND s.line_item_count IS NOT NULL
+    GROUP BY s.id, s.version, s.line_item_count, s.line_item_ids_md5
+    HAVING count(li.id) <> s.line_item_count
+        OR (s.line_item_ids_md5 IS NOT NULL
+            AND coalesce(md5(string_agg(li.id::TEXT, ',' ORDER BY li.id::TEXT COLLATE "C")), md5(''))
+                <> s.line_item_ids_md5)
+    ORDER BY s.version;
+$$;
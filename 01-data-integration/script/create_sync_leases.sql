@@ -0,0 +1,60 @@
+-- Expiring leases so each (entity, shard) is synced by one worker at a time
+-- Run this in Supabase SQL Editor (or any PostgreSQL) before setting SYNC_LEASE_BACKEND=supabase
+
+CREATE TABLE IF NOT EXISTS sync_leases (
+    resource TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    acquired_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    heartbeat_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL
+);
+
+-- Take a lease that is free, expired or already held by p_owner; returns false if someone else holds it.
+-- The single INSERT ... ON CONFLICT makes concurrent acquires race-free.
+CREATE OR REPLACE FUNCTION acquire_sync_lease(p_resource TEXT, p_owner TEXT, p_ttl_seconds INTEGER)
+RETURNS BOOLEAN
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    acquired BOOLEAN;
+BEGIN
+    INSERT INTO sync_leases (resource, owner, acquired_at, heartbeat_at, expires_at)
+    VALUES (p_resource, p_owner, NOW(), NOW(), NOW() + make_interval(secs => p_ttl_seconds))
+    ON CONFLICT (resource) DO UPDATE SET
+        owner = EXCLUDED.owner,
+        acquired_at = CASE WHEN sync_leases.owner = EXCLUDED.owner THEN sync_leases.acquired_at ELSE NOW() END,
+        heartbeat_at = NOW(),
+        expires_at = EXCLUDED.expires_at
+    WHERE sync_leases.owner = EXCLUDED.owner OR sync_leases.expires_at < NOW()
+    RETURNING true INTO acquired;
+
+    RETURN COALESCE(acquired, false);
+END;
+$$;
+
+-- Heartbeat: extend a lease still owned by p_owner; false once another worker has taken it over
+CREATE OR REPLACE FUNCTION renew_sync_lease(p_resource TEXT, p_owner TEXT, p_ttl_seconds INTEGER)
+RETURNS BOOLEAN
+LANGUAGE sql
+AS $$
+    WITH renewed AS (
+        UPDATE sync_leases
+        SET heartbeat_at = NOW(), expires_at = NOW() + make_interval(secs => p_ttl_seconds)
+        WHERE resource = p_resource AND owner = p_owner
+        RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM renewed);
+$$;
+
+CREATE OR REPLACE FUNCTION release_sync_lease(p_resource TEXT, p_owner TEXT)
+RETURNS BOOLEAN
+LANGUAGE sql
+AS $$
+    WITH released AS (
+        DELETE FROM sync_leases WHERE resource = p_resource AND owner = p_owner RETURNING 1
+    )
+    SELECT EXISTS (SELECT 1 FROM released);
+$$;
+
+-- Current holders
+SELECT resource, owner, heartbeat_at, expires_at, expires_at < NOW() AS expired FROM sync_leases ORDER BY resource;
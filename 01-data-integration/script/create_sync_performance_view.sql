@@ -0,0 +1,80 @@
+-- Sync throughput history for the /performance page of the Flask dashboard
+-- Run this in Supabase SQL Editor after create_sync_tables.sql
+
+-- Runs of different accounts are baselined separately (also added by add_multi_account_support.sql)
+ALTER TABLE sync_log ADD COLUMN IF NOT EXISTS account TEXT NOT NULL DEFAULT 'default';
+
+-- Speeds up the per-entity window below and the page's date filter
+CREATE INDEX IF NOT EXISTS idx_sync_log_entity_timestamp ON sync_log (entity_type, timestamp);
+
+-- Replace the plain view created by earlier versions of this script
+DO $$
+BEGIN
+    IF EXISTS (SELECT 1 FROM pg_views WHERE viewname = 'sync_performance') THEN
+        DROP VIEW sync_performance;
+    END IF;
+END $$;
+DROP MATERIALIZED VIEW IF EXISTS sync_performance;
+
+-- One row per finished sync run with its throughput and the rolling baseline of the
+-- previous 10 runs of the same account, entity and action. A run is flagged as slow when it
+-- processed enough records to be meaningful and ran at under half the baseline rate.
+-- Materialized so page loads do not re-run the window over all of sync_log; the sync
+-- refreshes it through refresh_sync_performance() when it finishes.
+CREATE MATERIALIZED VIEW sync_performance AS
+WITH runs AS (
+    SELECT id,
+           timestamp,
+           account,
+           entity_type,
+           action,
+           records_processed,
+           duration_seconds,
+           records_processed / NULLIF(duration_seconds, 0) AS records_per_sec,
+           (metadata->>'api_wait_seconds')::NUMERIC AS api_wait_seconds
+    FROM sync_log
+    WHERE status = 'completed'
+      AND duration_seconds IS NOT NULL
+),
+baselines AS (
+    SELECT runs.*,
+           avg(records_per_sec) FILTER (WHERE records_processed >= 100) OVER recent AS baseline_records_per_sec,
+           count(records_per_sec) FILTER (WHERE records_processed >= 100) OVER recent AS baseline_runs,
+           avg(duration_seconds) OVER recent AS baseline_duration_seconds
+    FROM runs
+    WINDOW recent AS (
+        PARTITION BY account, entity_type, action
+        ORDER BY timestamp
+        ROWS BETWEEN 10 PRECEDING AND 1 PRECEDING
+    )
+)
+SELECT id,
+       timestamp,
+       account,
+       entity_type,
+       action,
+       records_processed,
+       duration_seconds,
+       round(records_per_sec, 2) AS records_per_sec,
+       api_wait_seconds,
+       round(baseline_records_per_sec, 2) AS baseline_records_per_sec,
+       round(baseline_duration_seconds, 2) AS baseline_duration_seconds,
+       coalesce(records_processed >= 100
+                AND baseline_runs >= 3
+                AND records_per_sec < baseline_records_per_sec * 0.5, FALSE) AS is_slow
+FROM baselines;
+
+-- The unique index lets the refresh run CONCURRENTLY, without blocking page reads
+CREATE UNIQUE INDEX IF NOT EXISTS idx_sync_performance_id ON sync_performance (id);
+CREATE INDEX IF NOT EXISTS idx_sync_performance_timestamp ON sync_performance (timestamp);
+
+-- Called by the sync (supabase.rpc) after its runs are logged
+CREATE OR REPLACE FUNCTION refresh_sync_performance()
+RETURNS VOID
+LANGUAGE plpgsql
+SECURITY DEFINER
+AS $$
+BEGIN
+    REFRESH MATERIALIZED VIEW CONCURRENTLY sync_performance;
+END;
+$$;
@@ -21,6 +21,8 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from supabase import create_client, Client
 from lightspeed_client import create_lightspeed_client
+from supabase_reader import read_all
+from bulk_backfill import build_changes, run_backfill
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -66,56 +68,30 @@ def backfill_inventory_dates(supabase: Client, lightspeed):
     logger.info("Starting inventory date backfill...")
     
     # Get all existing inventory records that don't have Lightspeed dates
-    existing_records = supabase.table('lightspeed_inventory').select('id, product_id').execute()
+    existing_records = read_all(supabase, 'lightspeed_inventory', columns='id, product_id')
     
-    if not existing_records.data:
+    if not existing_records:
         logger.info("No existing inventory records found to backfill")
         return
     
-    logger.info(f"Found {len(existing_records.data)} existing inventory records to backfill")
+    logger.info(f"Found {len(existing_records)} existing inventory records to backfill")
     
     # Fetch fresh inventory data from Lightspeed
     logger.info("Fetching fresh inventory data from Lightspeed...")
     fresh_inventory = lightspeed.get_inventory()
     
-    # Create a lookup map of inventory ID to dates
-    inventory_dates_map = {}
-    for inv in fresh_inventory:
-        inventory_dates_map[inv.get('id')] = {
-            'lightspeed_created_at': inv.get('created_at'),
-            'lightspeed_updated_at': inv.get('updated_at')
-        }
+    existing_ids = {record['id'] for record in existing_records}
+    changes = build_changes(fresh_inventory, 'id', {
+        'lightspeed_created_at': 'created_at',
+        'lightspeed_updated_at': 'updated_at'
+    }, existing_ids)
     
-    # Update existing records in batches
-    batch_size = 100
-    updated_count = 0
+    missing_count = len(existing_ids) - len(changes)
+    if missing_count:
+        logger.warning(f"{missing_count} inventory records not found in fresh Lightspeed data")
     
-    for i in range(0, len(existing_records.data), batch_size):
-        batch = existing_records.data[i:i + batch_size]
-        
-        for record in batch:
-            inventory_id = record['id']
-            
-            if inventory_id in inventory_dates_map:
-                dates = inventory_dates_map[inventory_id]
-                
-                # Update the record with Lightspeed dates
-                update_data = {
-                    'lightspeed_created_at': dates['lightspeed_created_at'],
-                    'lightspeed_updated_at': dates['lightspeed_updated_at']
-                }
-                
-                try:
-                    supabase.table('lightspeed_inventory').update(update_data).eq('id', inventory_id).execute()
-                    updated_count += 1
-                    
-                    if updated_count % 50 == 0:
-                        logger.info(f"Updated {updated_count} records...")
-                        
-                except Exception as e:
-                    logger.error(f"Failed to update inventory record {inventory_id}: {e}")
-            else:
-                logger.warning(f"Inventory record {inventory_id} not found in fresh Lightspeed data")
+    # Batched upserts instead of one UPDATE round trip per record
+    updated_count = run_backfill(supabase, 'lightspeed_inventory', changes)
     
     logger.info(f"Backfill completed. Updated {updated_count} inventory records with Lightspeed dates")
 
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Lightspeed account configuration for multi-store syncs.
+LIGHTSPEED_ACCOUNTS_FILE points at a JSON list of accounts; without it the
+pipeline runs single-account from LIGHTSPEED_BASE_URL/LIGHTSPEED_BEARER_TOKEN
+and rows are not tagged with an account.
+
+    [
+        {"name": "downtown", "base_url": "https://downtown.retail.lightspeed.app",
+         "token_env": "LIGHTSPEED_TOKEN_DOWNTOWN", "requests_per_second": 1.0},
+        {"name": "airport", "base_url": "https://airport.retail.lightspeed.app",
+         "bearer_token": "..."}
+    ]
+"""
+
+import os
+import re
+import json
+import logging
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+# Default request rate per account; each account has its own Lightspeed rate limit
+DEFAULT_REQUESTS_PER_SECOND = 1.0
+
+# Account of rows written without one (single-account runs); the column default in add_multi_account_support.sql
+DEFAULT_ACCOUNT = 'default'
+
+ACCOUNT_NAME_PATTERN = re.compile(r'^[a-z0-9][a-z0-9_-]*$')
+
+def load_accounts(path: str = None) -> List[Dict]:
+    """Load and validate the accounts file; an empty list means single-account mode."""
+    path = path or os.environ.get('LIGHTSPEED_ACCOUNTS_FILE')
+    if not path:
+        return []
+
+    with open(path) as f:
+        entries = json.load(f)
+    if not isinstance(entries, list) or not entries:
+        raise ValueError(f"{path} must contain a non-empty JSON list of accounts")
+
+    accounts = []
+    for entry in entries:
+        name = entry.get('name', '')
+        if not ACCOUNT_NAME_PATTERN.match(name):
+            raise ValueError(f"Invalid account name '{name}' (use lowercase letters, digits, '-' and '_')")
+        if name in [account['name'] for account in accounts]:
+            raise ValueError(f"Duplicate account name '{name}'")
+
+        bearer_token = entry.get('bearer_token') or os.environ.get(entry.get('token_env', ''))
+        if not entry.get('base_url') or not bearer_token:
+            raise ValueError(f"Account '{name}' needs base_url and bearer_token or token_env")
+
+        accounts.append({
+            'name': name,
+            'base_url': entry['base_url'],
+            'bearer_token': bearer_token,
+            'requests_per_second': float(entry.get('requests_per_second', DEFAULT_REQUESTS_PER_SECOND))
+        })
+
+    logger.info(f"Loaded {len(accounts)} Lightspeed accounts: {', '.join(a['name'] for a in accounts)}")
+    return accounts
+
+def tag_records(records: List[Dict], account: str) -> List[Dict]:
+    """Add the account column to transformed rows in place."""
+    for record in records:
+        record['account'] = account
+    return records
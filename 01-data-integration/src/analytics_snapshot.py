@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Parquet snapshot of the dashboard tables for the embedded DuckDB analytics store.
+The sync appends every upserted batch as a delta file; running this script
+bootstraps (or rebuilds) the snapshot from Supabase.
+"""
+
+import os
+import sys
+import uuid
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Columns kept for each snapshot table, with the Arrow type they are stored as
+SNAPSHOT_COLUMNS = {
+    'lightspeed_sales': {
+        'id': 'string', 'outlet_id': 'string', 'customer_id': 'string', 'status': 'string',
+        'total_price': 'float64', 'sale_date': 'string', 'updated_at': 'string'
+    },
+    'lightspeed_sale_line_items': {
+        'id': 'string', 'sale_id': 'string', 'product_id': 'string', 'price_total': 'float64',
+        'quantity': 'float64', 'status': 'string', 'total_price': 'float64'
+    },
+    'lightspeed_products': {
+        'id': 'string', 'name': 'string', 'sku': 'string', 'price': 'float64', 'cost': 'float64'
+    }
+}
+
+# Delta files per table before they are merged into a single base file
+COMPACT_AFTER_FILES = 50
+
+# Held while a table's files are merged, so only one process compacts a table at a time
+COMPACT_LOCK_FILE = '.compact.lock'
+
+def _convert(value, arrow_type: str):
+    """Coerce a JSON value to the snapshot column type."""
+    if value is None or value == '':
+        return None
+    if arrow_type == 'float64':
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return None
+    return str(value)
+
+class SnapshotWriter:
+    """Appends upserted rows to a per-table Parquet snapshot."""
+
+    def __init__(self, snapshot_dir: str):
+        """Initialize the writer rooted at snapshot_dir."""
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("pyarrow is required for ANALYTICS_SNAPSHOT_DIR (pip install pyarrow)")
+        self.pa = pyarrow
+        self.snapshot_dir = snapshot_dir
+
+    def _table_dir(self, table_name: str) -> str:
+        """Return the directory holding a table's snapshot files."""
+        return os.path.join(self.snapshot_dir, table_name)
+
+    def _to_arrow(self, table_name: str, records: List[Dict], synced_at: datetime):
+        """Build an Arrow table with the snapshot columns for table_name."""
+        pa = self.pa
+        columns = SNAPSHOT_COLUMNS[table_name]
+        arrays = {
+            name: pa.array([_convert(r.get(name), arrow_type) for r in records], getattr(pa, arrow_type)())
+            for name, arrow_type in columns.items()
+        }
+        arrays['_synced_at'] = pa.array([synced_at] * len(records), pa.timestamp('us', tz='UTC'))
+        return pa.table(arrays)
+
+    def _schema(self, table_name: str):
+        """Return the Arrow schema of a table's snapshot files."""
+        return self._to_arrow(table_name, [], datetime.now(timezone.utc)).schema
+
+    @contextmanager
+    def _compaction_lock(self, directory: str, blocking: bool = True):
+        """Hold the table's compaction lock; yields False if another process holds it and blocking is False."""
+        if fcntl is None:
+            yield True
+            return
+        with open(os.path.join(directory, COMPACT_LOCK_FILE), 'w') as handle:
+            try:
+                fcntl.flock(handle, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _write_file(self, directory: str, filename: str, table):
+        """Write table to filename atomically, so readers never see a partial file."""
+        # A unique name so two writers never share a half-written file; it does not end in
+        # .parquet so readers globbing the directory never see it
+        tmp_path = os.path.join(directory, f".{uuid.uuid4().hex}.parquet.tmp")
+        try:
+            self.pa.parquet.write_table(table, tmp_path, compression='zstd')
+            os.replace(tmp_path, os.path.join(directory, filename))
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _remove(self, directory: str, filenames: List[str]):
+        """Remove files already merged into base.parquet."""
+        for filename in filenames:
+            if filename != 'base.parquet':
+                try:
+                    os.remove(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    pass
+
+    def _merge(self, table_name: str, paths: List[str]):
+        """Read files into one Arrow table keeping the newest row per id (later files win ties)."""
+        pa, schema = self.pa, self._schema(table_name)
+        tables = []
+        for path in paths:
+            table = self.pa.parquet.read_table(path)
+            # Older files may predate a column; fill it with nulls
+            tables.append(pa.table([table.column(field.name).cast(field.type) if field.name in table.column_names
+                                    else pa.nulls(table.num_rows, field.type) for field in schema],
+                                   schema=schema))
+        merged = pa.concat_tables(tables)
+        merged = merged.append_column('_row', pa.array(range(merged.num_rows), pa.int64()))
+        newest = merged.sort_by([('_synced_at', 'descending'), ('_row', 'descending')]) \
+            .group_by('id', use_threads=False).aggregate([('_row', 'first')])
+        return merged.take(newest.column('_row_first')).drop_columns(['_row'])
+
+    def append(self, table_name: str, records: List[Dict]):
+        """Write upserted records as a new delta file for table_name."""
+        if table_name not in SNAPSHOT_COLUMNS or not records:
+            return
+
+        synced_at = datetime.now(timezone.utc)
+        directory = self._table_dir(table_name)
+        os.makedirs(directory, exist_ok=True)
+
+        filename = f"delta-{synced_at.strftime('%Y%m%dT%H%M%S%f')}-{uuid.uuid4().hex[:8]}.parquet"
+        self._write_file(directory, filename, self._to_arrow(table_name, records, synced_at))
+        logger.info(f"Appended {len(records)} rows to {table_name} snapshot")
+
+        delta_files = [f for f in os.listdir(directory) if f.startswith('delta-')]
+        if len(delta_files) >= COMPACT_AFTER_FILES:
+            # Another sync already compacting will pick these files up next time
+            self.compact(table_name, blocking=False)
+
+    def compact(self, table_name: str, blocking: bool = True):
+        """Merge base and delta files into one base file, keeping the newest row per id."""
+        directory = self._table_dir(table_name)
+        if not os.path.isdir(directory):
+            return
+
+        with self._compaction_lock(directory, blocking) as locked:
+            if not locked:
+                logger.info(f"Skipping {table_name} snapshot compaction; another process is compacting it")
+                return
+
+            # Listed under the lock; deltas appended after this stay for the next compaction
+            files = sorted(f for f in os.listdir(directory) if f.endswith('.parquet'))
+            if len(files) < 2:
+                return
+
+            table = self._merge(table_name, [os.path.join(directory, f) for f in files])
+            self._write_file(directory, 'base.parquet', table)
+            # Only now that base.parquet holds their rows can the merged deltas go
+            self._remove(directory, files)
+
+        logger.info(f"Compacted {table_name} snapshot: {len(files)} files -> {table.num_rows} rows")
+
+    def rebuild(self, table_name: str, records: List[Dict]):
+        """Replace a table's snapshot with a full export."""
+        directory = self._table_dir(table_name)
+        os.makedirs(directory, exist_ok=True)
+
+        with self._compaction_lock(directory):
+            files = [f for f in os.listdir(directory) if f.endswith('.parquet')]
+            table = self._to_arrow(table_name, records, datetime.now(timezone.utc))
+            self._write_file(directory, 'base.parquet', table)
+            self._remove(directory, files)
+
+        logger.info(f"Rebuilt {table_name} snapshot: {table.num_rows} rows")
+
+_snapshot_writer = None
+
+def get_snapshot_writer() -> Optional[SnapshotWriter]:
+    """Return the shared snapshot writer, or None when ANALYTICS_SNAPSHOT_DIR is unset."""
+    global _snapshot_writer
+    snapshot_dir = os.environ.get('ANALYTICS_SNAPSHOT_DIR')
+    if not snapshot_dir:
+        return None
+    if _snapshot_writer is None or _snapshot_writer.snapshot_dir != snapshot_dir:
+        _snapshot_writer = SnapshotWriter(snapshot_dir)
+    return _snapshot_writer
+
+def append_to_snapshot(table_name: str, records: List[Dict]):
+    """Append upserted records to the analytics snapshot if one is configured."""
+    try:
+        writer = get_snapshot_writer()
+        if writer:
+            writer.append(table_name, records)
+    except Exception as e:
+        # The snapshot is a cache; never fail a sync because of it
+        logger.warning(f"Failed to update analytics snapshot for {table_name}: {e}")
+
+def export_table(supabase, table_name: str) -> List[Dict]:
+    """Export the snapshot columns of a Supabase table."""
+    from supabase_reader import read_all
+
+    rows = read_all(supabase, table_name, columns=', '.join(SNAPSHOT_COLUMNS[table_name]))
+    logger.info(f"Exported {len(rows)} rows from {table_name}")
+    return rows
+
+def main():
+    """Bootstrap the analytics snapshot from Supabase."""
+    load_dotenv('.env.local')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    print("📦 Building analytics snapshot")
+    print("=" * 40)
+
+    try:
+        from supabase import create_client
+
+        writer = get_snapshot_writer()
+        if not writer:
+            raise ValueError("Missing ANALYTICS_SNAPSHOT_DIR")
+
+        supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+
+        for table_name in SNAPSHOT_COLUMNS:
+            writer.rebuild(table_name, export_table(supabase, table_name))
+            print(f"✅ {table_name} snapshot rebuilt")
+
+        return True
+
+    except Exception as e:
+        logger.error(f"Failed to build analytics snapshot: {e}")
+        print(f"❌ Error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -5,10 +5,20 @@ Simple dashboard showing sync health for all 6 entity types.
 """
 
 import os
+import json
+import time
+import queue
+import threading
+from itertools import product
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, stream_with_context
 from supabase import create_client, Client
+from progress import get_progress_hub
+from accounts import DEFAULT_ACCOUNT
+from telemetry import render_metrics
+from local_queue import get_change_queue
+from webhooks import WebhookError, changed_records, parse_webhook, verify_signature
 
 # Load environment variables
 load_dotenv('.env.local')
@@ -20,78 +30,151 @@ app.secret_key = os.environ.get('DASHBOARD_SECRET_KEY', 'dev-secret-key-change-i
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY") 
 DASHBOARD_PASSWORD = os.environ.get("DASHBOARD_PASSWORD", "craft2025")
+WEBHOOK_SECRET = os.environ.get("LIGHTSPEED_WEBHOOK_SECRET")
+
+# Entity types we're monitoring, with friendly names and table names
+ENTITY_INFO = {
+    'customers': {'name': 'Customers', 'table': 'lightspeed_customers'},
+    'outlets': {'name': 'Outlets', 'table': 'lightspeed_outlets'},
+    'products': {'name': 'Products', 'table': 'lightspeed_products'},
+    'sales': {'name': 'Sales', 'table': 'lightspeed_sales'},
+    'sale_line_items': {'name': 'Sale Line Items', 'table': 'lightspeed_sale_line_items'},
+    'inventory': {'name': 'Inventory', 'table': 'lightspeed_inventory'}
+}
+
+# Sync state is served from memory for SYNC_STATUS_CACHE_TTL seconds; after that a
+# cheap probe of the newest sync_state.updated_at decides whether it must be reloaded
+SYNC_STATUS_CACHE_TTL = float(os.environ.get('SYNC_STATUS_CACHE_TTL', '30'))
+SYNC_STATUS_MAX_AGE = float(os.environ.get('SYNC_STATUS_MAX_AGE', '600'))
+
+# Default history window for the /performance page
+PERFORMANCE_HISTORY_DAYS = 30
+
+# Seconds between keepalive comments on idle /stream connections
+STREAM_KEEPALIVE_SECONDS = 15
+
+_supabase_client = None
+_client_lock = threading.Lock()
+
+_status_cache = {'states': None, 'state_head': None, 'checked_at': 0.0, 'loaded_at': 0.0, 'generation': 0}
+_status_lock = threading.Lock()
 
 def get_supabase_client() -> Client:
-    """Create Supabase client."""
-    return create_client(SUPABASE_URL, SUPABASE_KEY)
+    """Return the Supabase client shared by all requests."""
+    global _supabase_client
+    if _supabase_client is None:
+        with _client_lock:
+            if _supabase_client is None:
+                _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+    return _supabase_client
 
-def get_sync_status():
-    """Fetch sync status for all entity types with health indicators."""
-    supabase = get_supabase_client()
+def get_latest_sync_state_update(supabase: Client):
+    """Return the newest updated_at among the monitored sync_state rows.
+
+    Every sync start and completion rewrites its sync_state row, including the
+    completions that only update an existing sync_log row.
+    """
+    result = supabase.table('sync_state').select('updated_at').in_('entity_type', list(ENTITY_INFO)) \
+        .order('updated_at', desc=True).limit(1).execute()
+    return result.data[0]['updated_at'] if result.data else None
+
+def load_sync_states(supabase: Client) -> dict:
+    """Load the sync_state rows for all monitored entities in one query, keyed by (account, entity_type)."""
+    result = supabase.table('sync_state').select('*').in_('entity_type', list(ENTITY_INFO)).execute()
+    return {(row.get('account') or DEFAULT_ACCOUNT, row['entity_type']): row for row in result.data}
+
+def account_label(account: str, label: str) -> str:
+    """Prefix a label with its account when it is not the default one."""
+    return label if account == DEFAULT_ACCOUNT else f"[{account}] {label}"
+
+def get_cached_sync_states() -> dict:
+    """Return sync states from the in-process cache, reloading only when sync_state has changed."""
+    now = time.monotonic()
+    with _status_lock:
+        cache = _status_cache
+        if cache['states'] is not None and now - cache['checked_at'] < SYNC_STATUS_CACHE_TTL:
+            return cache['states']
+        states, state_head, loaded_at = cache['states'], cache['state_head'], cache['loaded_at']
+        generation = cache['generation']
     
-    # Entity types we're monitoring
-    entity_types = ['customers', 'outlets', 'products', 'sales', 'sale_line_items', 'inventory']
+    # Queries run outside the lock so a slow database never blocks requests served from the cache
+    supabase = get_supabase_client()
+    new_head = get_latest_sync_state_update(supabase)
+    if states is None or new_head != state_head or now - loaded_at >= SYNC_STATUS_MAX_AGE:
+        states, loaded_at = load_sync_states(supabase), now
     
+    with _status_lock:
+        # An invalidation while we were querying means these results may already be stale
+        if cache['generation'] != generation:
+            return states
+        cache['states'] = states
+        cache['state_head'] = new_head
+        cache['loaded_at'] = loaded_at
+        cache['checked_at'] = now
+    return states
+
+def invalidate_sync_status_cache():
+    """Force the next status request to reload from the database."""
+    with _status_lock:
+        _status_cache['states'] = None
+        _status_cache['generation'] += 1
+
+def get_sync_status():
+    """Fetch sync status for all entity types with health indicators."""
     status_data = []
     now = datetime.now()
     
-    for entity_type in entity_types:
-        try:
-            # Try to get sync state from the table
-            result = supabase.table('sync_state').select('*').eq('entity_type', entity_type).execute()
+    try:
+        states = get_cached_sync_states()
+        load_error = None
+    except Exception as e:
+        # Database connection or query error
+        states = {}
+        load_error = str(e)
+    
+    accounts = sorted({account for account, _ in states}) or [DEFAULT_ACCOUNT]
+    for account, (entity_type, info) in product(accounts, ENTITY_INFO.items()):
+        sync_data = states.get((account, entity_type))
+        
+        if load_error:
+            status = 'error'
+            health = 'error'
+            last_sync_display = 'Error'
+            error_message = load_error
+        elif sync_data:
+            last_sync = sync_data.get('last_sync_time')
+            status = sync_data.get('status', 'unknown')
+            error_message = sync_data.get('error_message')
             
-            if result.data:
-                sync_data = result.data[0]
-                last_sync = sync_data.get('last_sync_time')
-                status = sync_data.get('status', 'unknown')
-                error_message = sync_data.get('error_message')
+            # Parse last sync time if it exists
+            if last_sync:
+                last_sync_dt = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
+                time_diff = now - last_sync_dt.replace(tzinfo=None)
                 
-                # Parse last sync time if it exists
-                if last_sync:
-                    last_sync_dt = datetime.fromisoformat(last_sync.replace('Z', '+00:00'))
-                    time_diff = now - last_sync_dt.replace(tzinfo=None)
-                    
-                    # Determine health status based on time thresholds
-                    if time_diff < timedelta(hours=2):
-                        health = 'healthy'
-                    elif time_diff < timedelta(hours=12):
-                        health = 'warning'
-                    else:
-                        health = 'error'
-                        
-                    last_sync_display = last_sync_dt.strftime('%Y-%m-%d %H:%M:%S')
+                # Determine health status based on time thresholds
+                if time_diff < timedelta(hours=2):
+                    health = 'healthy'
+                elif time_diff < timedelta(hours=12):
+                    health = 'warning'
                 else:
                     health = 'error'
-                    last_sync_display = 'Never'
                     
+                last_sync_display = last_sync_dt.strftime('%Y-%m-%d %H:%M:%S')
             else:
-                # No sync state record found
-                status = 'never_synced'
                 health = 'error'
                 last_sync_display = 'Never'
-                error_message = 'No sync state record'
-                
-        except Exception as e:
-            # Database connection or query error
-            status = 'error'
+        else:
+            # No sync state record found
+            status = 'never_synced'
             health = 'error'
-            last_sync_display = 'Error'
-            error_message = str(e)
-            
-        # Map entity types to friendly names and table names
-        entity_info = {
-            'customers': {'name': 'Customers', 'table': 'lightspeed_customers'},
-            'outlets': {'name': 'Outlets', 'table': 'lightspeed_outlets'},
-            'products': {'name': 'Products', 'table': 'lightspeed_products'},
-            'sales': {'name': 'Sales', 'table': 'lightspeed_sales'},
-            'sale_line_items': {'name': 'Sale Line Items', 'table': 'lightspeed_sale_line_items'},
-            'inventory': {'name': 'Inventory', 'table': 'lightspeed_inventory'}
-        }
+            last_sync_display = 'Never'
+            error_message = 'No sync state record'
         
         status_data.append({
+            'account': account,
             'entity_type': entity_type,
-            'name': entity_info[entity_type]['name'],
-            'table': entity_info[entity_type]['table'],
+            'name': account_label(account, info['name']),
+            'table': info['table'],
             'status': status,
             'health': health,
             'last_sync': last_sync_display,
@@ -100,6 +183,38 @@ def get_sync_status():
     
     return status_data
 
+def get_sync_performance(days: int) -> dict:
+    """Load per-run throughput from the sync_performance view, grouped by account and entity."""
+    since = (datetime.now() - timedelta(days=days)).isoformat()
+    result = get_supabase_client().table('sync_performance') \
+        .select('*') \
+        .gte('timestamp', since) \
+        .order('timestamp') \
+        .execute()
+    
+    series = {}
+    slow_runs = []
+    for row in result.data:
+        account = row.get('account') or DEFAULT_ACCOUNT
+        entity_series = series.setdefault(f"{account}/{row['entity_type']}", {
+            'name': account_label(account, ENTITY_INFO.get(row['entity_type'], {}).get('name', row['entity_type'])),
+            'timestamps': [],
+            'records_per_sec': [],
+            'duration_seconds': [],
+            'api_wait_seconds': [],
+            'slow': []
+        })
+        entity_series['timestamps'].append(row['timestamp'])
+        entity_series['records_per_sec'].append(row['records_per_sec'])
+        entity_series['duration_seconds'].append(row['duration_seconds'])
+        entity_series['api_wait_seconds'].append(row['api_wait_seconds'])
+        entity_series['slow'].append(row['is_slow'])
+        
+        if row['is_slow']:
+            slow_runs.append(row)
+    
+    return {'series': series, 'slow_runs': list(reversed(slow_runs)), 'run_count': len(result.data)}
+
 @app.route('/')
 def home():
     """Redirect to dashboard if authenticated, otherwise show login."""
@@ -130,10 +245,54 @@ def dashboard():
     
     try:
         status_data = get_sync_status()
-        return render_template('dashboard.html', status_data=status_data)
+        return render_template('dashboard.html', status_data=status_data, rendered_at=time.time())
     except Exception as e:
         flash(f'Error loading dashboard: {str(e)}', 'error')
-        return render_template('dashboard.html', status_data=[], error=str(e))
+        return render_template('dashboard.html', status_data=[], error=str(e), rendered_at=time.time())
+
+@app.route('/performance')
+def performance():
+    """Sync throughput history with slow runs flagged against the rolling baseline."""
+    if not session.get('authenticated'):
+        flash('Please log in to access the dashboard.', 'error')
+        return redirect(url_for('login'))
+    
+    days = request.args.get('days', PERFORMANCE_HISTORY_DAYS, type=int)
+    try:
+        performance_data = get_sync_performance(days)
+        return render_template('performance.html', days=days, **performance_data)
+    except Exception as e:
+        flash(f'Error loading performance history: {str(e)}', 'error')
+        return render_template('performance.html', days=days, series={}, slow_runs=[], run_count=0, error=str(e))
+
+def on_progress_event(event: dict):
+    """Drop cached sync state as soon as a sync reports that an entity finished."""
+    if event.get('phase') in ('completed', 'failed'):
+        invalidate_sync_status_cache()
+
+@app.route('/stream')
+def stream():
+    """Server-Sent Events feed of live sync progress."""
+    if not session.get('authenticated'):
+        return {'error': 'unauthorized'}, 401
+    
+    hub = get_progress_hub(on_progress_event)
+    subscriber = hub.subscribe() if hub else queue.Queue()
+    
+    def events():
+        try:
+            while True:
+                try:
+                    event = subscriber.get(timeout=STREAM_KEEPALIVE_SECONDS)
+                    yield f"data: {json.dumps(event)}\n\n"
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            if hub:
+                hub.unsubscribe(subscriber)
+    
+    return Response(stream_with_context(events()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/logout')
 def logout():
@@ -153,6 +312,35 @@ def health_check():
     except Exception as e:
         return {'status': 'unhealthy', 'error': str(e)}, 500
 
+@app.route('/webhooks/lightspeed', methods=['POST'])
+def lightspeed_webhook():
+    """Queue the records named in a Lightspeed webhook and acknowledge immediately."""
+    body = request.get_data(cache=True)
+    if WEBHOOK_SECRET and not verify_signature(body, request.headers.get('X-Signature'), WEBHOOK_SECRET):
+        return {'error': 'invalid signature'}, 401
+    
+    try:
+        webhook_type, payload = parse_webhook(request.form, request.get_json(silent=True))
+        change = changed_records(webhook_type, payload)
+    except WebhookError as e:
+        return {'error': str(e)}, 400
+    
+    if change is None:
+        # Acknowledge types we don't sync so Lightspeed doesn't retry them
+        return {'status': 'ignored', 'type': webhook_type}, 202
+    
+    entity_type, record_ids = change
+    get_change_queue().enqueue(entity_type, record_ids)
+    return {'status': 'queued', 'entity_type': entity_type, 'ids': record_ids}, 202
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus text endpoint, including the metrics of the last cron run."""
+    try:
+        return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+    except Exception as e:
+        return Response(f"# error reading metrics: {e}\n", status=500, mimetype='text/plain')
+
 if __name__ == '__main__':
     # Development server
     app.run(debug=True, host='0.0.0.0', port=5001)
\ No newline at end of file
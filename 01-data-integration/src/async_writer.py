@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Async Supabase writer that multiplexes upserts over a few HTTP/2 connections.
+An event loop in a background thread sends up to `concurrency` upsert requests
+at once; synchronous sync code submits batches and gets a WriteTracker back,
+which records completions in submission order so callers know exactly how
+far a table's writes have contiguously succeeded.
+"""
+
+import json
+import time
+import asyncio
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+from postgrest.exceptions import APIError
+
+import telemetry
+from supabase_writer import (UPSERT_PREFER, compress_body, content_range_count, error_body, gzip_rejected,
+                             rest_headers, rest_url, upsert_params)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_CONNECTIONS = 2
+
+class WriteTracker:
+    """Completion tracking for the batches of one table write."""
+
+    def __init__(self, table_name: str, on_batch: Optional[Callable[[List[Dict], int, float, int], None]] = None):
+        """Initialize an empty tracker; on_batch(batch, written, seconds, body_bytes) runs as each batch lands."""
+        self.table_name = table_name
+        self.on_batch = on_batch
+        self.lock = threading.Lock()
+        self.futures: List[Future] = []
+        self.finished = set()
+        self.completed_through = -1  # Highest batch index with every earlier batch written
+        self.rows_written = 0
+        self.error: Optional[BaseException] = None
+
+    def add(self, batch: List[Dict], future: Future):
+        """Track the next batch in submission order."""
+        index = len(self.futures)
+        self.futures.append(future)
+        future.add_done_callback(lambda done: self._on_done(index, batch, done))
+
+    def _on_done(self, index: int, batch: List[Dict], future: Future):
+        """Record a finished batch and advance the contiguous completion mark."""
+        error = future.exception()
+        with self.lock:
+            if error is not None:
+                self.error = self.error or error
+                return
+            written, seconds, body_bytes = future.result()
+            self.rows_written += written
+            self.finished.add(index)
+            while self.completed_through + 1 in self.finished:
+                self.completed_through += 1
+        if self.on_batch:
+            try:
+                self.on_batch(batch, written, seconds, body_bytes)
+            except Exception as e:
+                logger.warning(f"Batch callback for {self.table_name} failed: {e}")
+
+    def wait(self) -> int:
+        """Block until every batch is done; raises the first failure, else returns rows written."""
+        wait(self.futures)
+        if self.error is not None:
+            logger.error(f"Writes to {self.table_name} succeeded through batch {self.completed_through + 1} "
+                         f"of {len(self.futures)}")
+            raise self.error
+        return self.rows_written
+
+class AsyncSupabaseWriter:
+    """Concurrent upserts over pooled HTTP/2 connections, driven from synchronous code."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, connections: int = DEFAULT_CONNECTIONS):
+        """Start the event loop thread and the HTTP/2 client."""
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='async-writer', daemon=True)
+        self.thread.start()
+        asyncio.run_coroutine_threadsafe(self._start(connections), self.loop).result()
+        logger.info(f"Async Supabase writer started ({concurrency} concurrent requests over "
+                    f"{connections} HTTP/2 connections)")
+
+    async def _start(self, connections: int):
+        """Create the semaphore and client on the loop."""
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        self.client = httpx.AsyncClient(
+            http2=True,
+            base_url=rest_url(),
+            headers=rest_headers(),
+            limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+            timeout=120
+        )
+
+    async def _post(self, table_name: str, rows: List[Dict], on_conflict: str) -> Tuple[int, float, int]:
+        """Send one upsert once a concurrency slot is free; returns (rows written, seconds, body bytes)."""
+        async with self.semaphore:
+            start = time.perf_counter()
+            body = json.dumps(rows, default=str).encode('utf-8')
+            params = upsert_params(rows, on_conflict)
+
+            compressed = compress_body(body)
+            response = None
+            if compressed is not None:
+                response = await self.client.post(f"/{table_name}", params=params, content=compressed,
+                                                  headers={'Prefer': UPSERT_PREFER, 'Content-Encoding': 'gzip'})
+                if response.is_error and gzip_rejected(response.status_code, error_body(response)):
+                    response = None
+                else:
+                    telemetry.record_request_bytes(table_name, len(body), len(compressed))
+            if response is None:
+                response = await self.client.post(f"/{table_name}", params=params, content=body,
+                                                  headers={'Prefer': UPSERT_PREFER})
+                telemetry.record_request_bytes(table_name, len(body), len(body))
+
+            if response.is_error:
+                raise APIError(error_body(response))
+            seconds = time.perf_counter() - start
+            written = content_range_count(response.headers.get('content-range'), rows)
+            telemetry.record_upsert(table_name, written, seconds)
+            return written, seconds, len(body)
+
+    def upsert_batches(self, table_name: str, records: List[Dict], batch_size: int = 100, on_conflict: str = '',
+                       on_batch: Optional[Callable[[List[Dict], int, float, int], None]] = None) -> WriteTracker:
+        """Submit every batch without waiting; call wait() on the tracker for the result."""
+        tracker = WriteTracker(table_name, on_batch)
+        for i in range(0, len(records), batch_size):
+            batch = records[i:i + batch_size]
+            tracker.add(batch, asyncio.run_coroutine_threadsafe(self._post(table_name, batch, on_conflict), self.loop))
+        logger.info(f"Submitted {len(tracker.futures)} batches of {table_name} to the async writer")
+        return tracker
+
+    def close(self):
+        """Close the client and stop the event loop."""
+        asyncio.run_coroutine_threadsafe(self.client.aclose(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+class WritePipeline:
+    """Overlaps entity syncs: the next entity fetches while earlier entities' writes are in flight.
+
+    Only one entity holds fetch_lock at a time, so the Lightspeed client is still used sequentially.
+    """
+
+    def __init__(self, writer: AsyncSupabaseWriter, depth: int = 2):
+        """Initialize a pipeline running up to depth entity syncs at once."""
+        self.writer = writer
+        self.fetch_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=depth, thread_name_prefix='entity')
+
+    def submit(self, fn: Callable, *args) -> Future:
+        """Start an entity sync; call in dependency order."""
+        return self.executor.submit(fn, *args)
+
+    def close(self):
+        """Wait for running syncs; the writer is left open for other pipelines."""
+        self.executor.shutdown()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Newest-first date windows for a progressive sales backfill.
+The most recent window is loaded first so the dashboard is useful within
+minutes; older windows follow one at a time. Each window's progress is kept in
+sync_state under a key like 'sales_window:2025-03-01..2025-03-30', so an
+interrupted backfill resumes with the windows that are not done yet.
+"""
+
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from accounts import DEFAULT_ACCOUNT
+
+logger = logging.getLogger(__name__)
+
+WINDOW_KEY_PREFIX = 'sales_window:'
+DEFAULT_WINDOW_DAYS = 30
+
+# Without an explicit oldest date, stop after this many consecutive windows without sales
+EMPTY_WINDOWS_TO_STOP = 3
+
+# Windows are aligned to this date so their keys stay the same from one run to the next;
+# it is also the furthest back a backfill goes
+WINDOW_ORIGIN = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+def iter_windows(newest_end: datetime, window_days: int = DEFAULT_WINDOW_DAYS,
+                 oldest: Optional[datetime] = None) -> Iterator[Tuple[datetime, datetime]]:
+    """Yield [start, end) windows walking back from the one containing newest_end, stopping at oldest."""
+    # Floor division plus one, so the first window's end is strictly after newest_end
+    periods = (newest_end - WINDOW_ORIGIN) // timedelta(days=window_days) + 1
+    end = WINDOW_ORIGIN + timedelta(days=periods * window_days)
+    oldest = oldest or WINDOW_ORIGIN
+    while end > oldest:
+        start = max(end - timedelta(days=window_days), oldest)
+        yield start, end
+        end = start
+
+def window_key(start: datetime, end: datetime) -> str:
+    """Return the sync_state key of a window; both dates are inclusive."""
+    return f"{WINDOW_KEY_PREFIX}{start:%Y-%m-%d}..{end - timedelta(days=1):%Y-%m-%d}"
+
+def completed_windows(supabase) -> Dict[str, Optional[int]]:
+    """Return the windows already loaded with their highest version (None when they had no sales)."""
+    result = supabase.table('sync_state').select('entity_type, status, last_version') \
+        .like('entity_type', f'{WINDOW_KEY_PREFIX}%').eq('account', DEFAULT_ACCOUNT).execute()
+    return {row['entity_type']: row.get('last_version') for row in result.data if row['status'] == 'success'}
+
+def mark_window(supabase, key: str, status: str, highest_version: Optional[int] = None,
+                error_message: Optional[str] = None):
+    """Record a window's progress in sync_state."""
+    try:
+        state = {
+            'account': DEFAULT_ACCOUNT,
+            'entity_type': key,
+            'last_sync_time': datetime.now(timezone.utc).isoformat(),
+            'status': status,
+            'error_message': error_message,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }
+        if highest_version is not None:
+            state['last_version'] = highest_version
+        supabase.table('sync_state').upsert(state, on_conflict='account,entity_type').execute()
+    except Exception as e:
+        logger.error(f"Failed to update sync state for {key}: {e}")
+
+def backfill_windows(supabase, import_window: Callable[[datetime, datetime], Tuple[int, Optional[int]]],
+                     window_days: int = DEFAULT_WINDOW_DAYS, oldest: Optional[datetime] = None,
+                     newest_end: Optional[datetime] = None,
+                     on_window: Optional[Callable[[str, int], None]] = None) -> Tuple[int, int]:
+    """Import windows newest first; returns (windows loaded, windows failed).
+
+    import_window(start, end) loads one window and returns (sales loaded, highest version).
+    Windows already marked successful are skipped (the still-open newest window never is), and on_window(key, sales) runs after each
+    window lands.
+    """
+    if newest_end is None:
+        newest_end = datetime.now(timezone.utc)
+    done = completed_windows(supabase)
+    loaded, failed, empty_streak = 0, 0, 0
+
+    for start, end in iter_windows(newest_end, window_days, oldest):
+        key = window_key(start, end)
+        if key in done:
+            logger.info(f"⏭️  {key} already loaded")
+            empty_streak = empty_streak + 1 if done[key] is None else 0
+            if oldest is None and empty_streak >= EMPTY_WINDOWS_TO_STOP:
+                break
+            continue
+
+        mark_window(supabase, key, 'running')
+        try:
+            sales, highest_version = import_window(start, end)
+        except Exception as e:
+            logger.error(f"❌ Failed to load {key}: {e}")
+            mark_window(supabase, key, 'failed', error_message=str(e))
+            failed += 1
+            continue
+
+        # The newest window is still open; 'partial' keeps it out of the done set so reruns reload it
+        mark_window(supabase, key, 'partial' if end > newest_end else 'success', highest_version)
+        loaded += 1
+        logger.info(f"✅ Loaded {key}: {sales} sales")
+        if on_window:
+            on_window(key, sales)
+
+        empty_streak = empty_streak + 1 if sales == 0 else 0
+        if oldest is None and empty_streak >= EMPTY_WINDOWS_TO_STOP:
+            logger.info(f"No sales in the last {EMPTY_WINDOWS_TO_STOP} windows; reached the start of history")
+            break
+
+    return loaded, failed
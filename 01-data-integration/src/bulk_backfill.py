@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Bulk column backfill for Supabase tables.
+Reads a source (Lightspeed endpoint or the local raw landing zone), maps source
+fields onto target columns and writes them as batched upserts or staged bulk
+UPDATEs with configurable concurrency and a resumable checkpoint.
+
+Example:
+    python3 src/bulk_backfill.py --table lightspeed_inventory --source endpoint:2.0/inventory \\
+        --map lightspeed_created_at=created_at --map lightspeed_updated_at=updated_at
+"""
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, List, Optional
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from supabase_reader import iter_rows
+from supabase_writer import upsert_rows
+
+logger = logging.getLogger(__name__)
+
+def load_source(source: str, lightspeed=None) -> List[Dict]:
+    """Load source records from 'endpoint:<path>' or 'snapshot:<entity>'."""
+    kind, _, target = source.partition(':')
+
+    if kind == 'endpoint':
+        if lightspeed is None:
+            from lightspeed_client import create_lightspeed_client
+            lightspeed = create_lightspeed_client()
+        return lightspeed._get_paginated_data(target)
+
+    if kind == 'snapshot':
+        from raw_store import RawPageStore
+        raw_dir = os.environ.get('LIGHTSPEED_RAW_DIR')
+        if not raw_dir:
+            raise ValueError("snapshot sources require LIGHTSPEED_RAW_DIR")
+        return RawPageStore(raw_dir).read_entity(target)
+
+    raise ValueError(f"Unknown source '{source}' (expected endpoint:<path> or snapshot:<entity>)")
+
+def parse_mapping(pairs: List[str]) -> Dict[str, str]:
+    """Parse 'target_column=source_field' pairs."""
+    mapping = {}
+    for pair in pairs:
+        target, sep, source_field = pair.partition('=')
+        if not sep or not target or not source_field:
+            raise ValueError(f"Invalid mapping '{pair}' (expected target_column=source_field)")
+        mapping[target.strip()] = source_field.strip()
+    return mapping
+
+def build_changes(source_records: List[Dict], key: str, mapping: Dict[str, str],
+                  existing_keys: Optional[set] = None, source_key: Optional[str] = None) -> List[Dict]:
+    """Build one row per source record with the key and mapped columns, ordered by key."""
+    source_key = source_key or key
+    changes = {}
+
+    for record in source_records:
+        key_value = record.get(source_key)
+        if key_value is None:
+            continue
+        if existing_keys is not None and key_value not in existing_keys:
+            continue
+        row = {key: key_value}
+        for target, source_field in mapping.items():
+            row[target] = record.get(source_field)
+        changes[key_value] = row
+
+    return [changes[k] for k in sorted(changes, key=str)]
+
+class Checkpoint:
+    """Tracks the highest key below which every batch has been written."""
+
+    def __init__(self, path: Optional[str], fingerprint: str):
+        """Load an existing checkpoint for the same backfill, if any."""
+        self.path = path
+        self.fingerprint = fingerprint
+        self.completed_through = None
+
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get('fingerprint') == fingerprint:
+                self.completed_through = state.get('completed_through')
+                logger.info(f"Resuming backfill after key {self.completed_through}")
+            else:
+                logger.warning(f"Ignoring checkpoint {path}: it belongs to a different backfill")
+
+    def save(self, completed_through: str):
+        """Persist progress atomically."""
+        self.completed_through = completed_through
+        if not self.path:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'fingerprint': self.fingerprint, 'completed_through': completed_through}, f)
+        os.replace(tmp_path, self.path)
+
+def write_batch(supabase, table: str, key: str, batch: List[Dict], mode: str) -> int:
+    """Write one batch and return the number of rows affected."""
+    if mode == 'update':
+        result = supabase.rpc('bulk_update_columns', {
+            'target_table': table,
+            'key_column': key,
+            'payload': batch
+        }).execute()
+        return int(result.data or 0)
+
+    # Only keys that already exist are sent, so the upsert only ever updates the mapped columns
+    return upsert_rows(supabase, table, batch, on_conflict=key)
+
+def run_backfill(supabase, table: str, changes: List[Dict], key: str = 'id', mode: str = 'upsert',
+                 batch_size: int = 500, concurrency: int = 4, checkpoint_path: Optional[str] = None) -> int:
+    """Apply changes in concurrent batches, checkpointing contiguous progress."""
+    columns = sorted(changes[0]) if changes else []
+    checkpoint = Checkpoint(checkpoint_path, f"{table}:{key}:{mode}:{','.join(columns)}")
+
+    if checkpoint.completed_through is not None:
+        changes = [row for row in changes if str(row[key]) > checkpoint.completed_through]
+
+    batches = [changes[i:i + batch_size] for i in range(0, len(changes), batch_size)]
+    if not batches:
+        logger.info(f"Nothing to backfill in {table}")
+        return 0
+
+    logger.info(f"Backfilling {len(changes)} rows into {table} ({len(batches)} batches, "
+                f"mode={mode}, concurrency={concurrency})")
+
+    start_time = time.time()
+    updated_count = 0
+    done = [False] * len(batches)
+    next_pending = 0
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(write_batch, supabase, table, key, batch, mode): index
+                   for index, batch in enumerate(batches)}
+
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                updated_count += future.result()
+            except Exception as e:
+                logger.error(f"Batch {index + 1} failed: {e}")
+                for pending in futures:
+                    pending.cancel()
+                raise
+
+            done[index] = True
+            # Only advance the checkpoint past batches that completed in order
+            while next_pending < len(batches) and done[next_pending]:
+                next_pending += 1
+            if next_pending:
+                checkpoint.save(str(batches[next_pending - 1][-1][key]))
+
+            elapsed = time.time() - start_time
+            logger.info(f"Batch {index + 1}/{len(batches)} done: {updated_count} rows updated "
+                        f"({updated_count / max(elapsed, 0.001):.0f} rows/s)")
+
+    logger.info(f"Backfill of {table} complete: {updated_count} rows in {time.time() - start_time:.1f}s")
+    return updated_count
+
+def main():
+    """Command-line entry point."""
+    load_dotenv('.env.local')
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    parser = argparse.ArgumentParser(description="Backfill columns of a Supabase table in bulk")
+    parser.add_argument('--table', required=True, help="target table, e.g. lightspeed_inventory")
+    parser.add_argument('--source', required=True, help="endpoint:<api path> or snapshot:<entity>")
+    parser.add_argument('--key', default='id', help="key column in the target table")
+    parser.add_argument('--source-key', help="key field in the source records (defaults to --key)")
+    parser.add_argument('--map', action='append', required=True, dest='mapping',
+                        help="target_column=source_field (repeatable)")
+    parser.add_argument('--mode', choices=['upsert', 'update'], default='upsert',
+                        help="batched upserts, or staged bulk UPDATE via bulk_update_columns()")
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--checkpoint', help="progress file used to resume an interrupted backfill")
+    args = parser.parse_args()
+
+    print(f"🧱 Backfilling {args.table}")
+    print("=" * 40)
+
+    try:
+        from supabase import create_client
+        supabase = create_client(os.environ["SUPABASE_URL"], os.environ["SUPABASE_SERVICE_ROLE_KEY"])
+
+        mapping = parse_mapping(args.mapping)
+        source_records = load_source(args.source)
+        existing_keys = {row[args.key] for row in iter_rows(supabase, args.table, columns=args.key, key=args.key)}
+        changes = build_changes(source_records, args.key, mapping, existing_keys, args.source_key)
+
+        updated = run_backfill(supabase, args.table, changes, key=args.key, mode=args.mode,
+                               batch_size=args.batch_size, concurrency=args.concurrency,
+                               checkpoint_path=args.checkpoint)
+        print(f"✅ Backfilled {updated} rows in {args.table}")
+        return True
+
+    except Exception as e:
+        logger.error(f"Backfill failed: {e}")
+        print(f"❌ Error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
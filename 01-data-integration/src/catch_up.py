@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Automatic catch-up mode for version-cursor syncs that have fallen far behind.
+Before fetching, the gap between the watermark and the head of the collection
+is estimated from one large probe page and a few one-record probes further
+ahead. Small gaps are fetched serially as usual; once the estimate passes
+SYNC_CATCH_UP_THRESHOLD records, the version range is split between several
+cursors that crawl in parallel with large pages, and the results are written
+in larger batches.
+
+The cursors share the client's request spacing, so they only go faster than a
+serial crawl when the spacing is below latency. While they run, the spacing is
+set from the account's API allowance (LIGHTSPEED_REGISTERS, or
+SYNC_CATCH_UP_REQUESTS_PER_SECOND) instead of the 1 request/second default.
+"""
+
+import os
+import logging
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Estimated records behind before switching to catch-up mode (0 disables it)
+DEFAULT_CATCH_UP_THRESHOLD = 20000
+
+# Page size of the probe and of the catch-up cursors
+CATCH_UP_PAGE_SIZE = 5000
+
+# Version cursors crawling in parallel in catch-up mode
+CATCH_UP_CURSORS = 4
+
+# Upsert batch size in catch-up mode
+CATCH_UP_BATCH_SIZE = 500
+
+# One-record probes allowed while looking for the head of the collection
+MAX_HEAD_PROBES = 20
+
+# Lightspeed allows 300 requests per register plus 50 in every 5-minute window
+RATE_WINDOW_SECONDS = 300
+REQUESTS_PER_REGISTER = 300
+REQUESTS_PER_WINDOW_BASE = 50
+
+# Share of the allowance the catch-up cursors may use, leaving headroom for other clients
+CATCH_UP_BUDGET_FRACTION = 0.9
+
+def catch_up_threshold() -> int:
+    """Return the catch-up threshold from SYNC_CATCH_UP_THRESHOLD."""
+    return int(os.environ.get('SYNC_CATCH_UP_THRESHOLD', DEFAULT_CATCH_UP_THRESHOLD))
+
+def catch_up_requests_per_second() -> float:
+    """Return the request rate for catch-up cursors, sized to the account's API allowance."""
+    override = os.environ.get('SYNC_CATCH_UP_REQUESTS_PER_SECOND')
+    if override:
+        return float(override)
+    registers = int(os.environ.get('LIGHTSPEED_REGISTERS', '1'))
+    allowance = (REQUESTS_PER_REGISTER * registers + REQUESTS_PER_WINDOW_BASE) / RATE_WINDOW_SECONDS
+    return allowance * CATCH_UP_BUDGET_FRACTION
+
+@contextmanager
+def catch_up_rate(lightspeed):
+    """Space the client's requests for the catch-up budget, restoring the usual spacing afterwards.
+
+    Never slows a client already configured faster; a 429 still backs every cursor off.
+    """
+    with lightspeed.lock:
+        previous = lightspeed.min_request_interval
+        lightspeed.min_request_interval = min(previous, 1.0 / catch_up_requests_per_second())
+        interval = lightspeed.min_request_interval
+    logger.info(f"Catch-up cursors share {1.0 / interval:.2f} requests/second" if interval else
+                "Catch-up cursors are not rate limited")
+    try:
+        yield
+    finally:
+        with lightspeed.lock:
+            lightspeed.min_request_interval = previous
+
+def probe_head(lightspeed, endpoint: str, known_version: int, step: int) -> int:
+    """Return a version at or just past the newest record, probing ahead with doubling steps."""
+    for _ in range(MAX_HEAD_PROBES):
+        probe = known_version + step
+        data = lightspeed._make_request(endpoint, {'after': probe, 'page_size': 1}).get('data', [])
+        if not data:
+            return probe
+        known_version = max(item.get('version') or probe for item in data)
+        step *= 2
+    return known_version
+
+def estimate_gap(lightspeed, endpoint: str, after_version: int) -> Tuple[int, List[Dict], Optional[int]]:
+    """Estimate the records after after_version; returns (estimate, probe page, head estimate).
+
+    The head estimate is None when the probe page already reached the end of the collection.
+    """
+    page = lightspeed._make_request(endpoint, {'after': after_version,
+                                               'page_size': CATCH_UP_PAGE_SIZE}).get('data', [])
+    versions = [item.get('version') for item in page if item.get('version')]
+    if len(page) < CATCH_UP_PAGE_SIZE or not versions:
+        return len(page), page, None
+
+    # Assume the rest of the range is as dense as the probe page
+    page_max = max(versions)
+    span = max(page_max - after_version, 1)
+    head = probe_head(lightspeed, endpoint, page_max, span)
+    return int(len(page) * (head - after_version) / span), page, head
+
+def fetch_version_ranges(lightspeed, endpoint: str, after_version: int, head: int,
+                         cursors: int = CATCH_UP_CURSORS) -> List[Dict]:
+    """Crawl (after_version, head] with parallel cursors; the last cursor runs on past head."""
+    width = max((head - after_version) // cursors, 1)
+    bounds = [after_version + width * i for i in range(cursors)] + [None]
+    ranges = list(zip(bounds[:-1], bounds[1:]))
+    logger.info(f"Crawling {endpoint} with {len(ranges)} parallel cursors from version {after_version}")
+
+    with catch_up_rate(lightspeed), ThreadPoolExecutor(max_workers=len(ranges),
+                                                       thread_name_prefix='cursor') as executor:
+        pages = executor.map(lambda bound: lightspeed.get_version_range(endpoint, bound[0], bound[1],
+                                                                        CATCH_UP_PAGE_SIZE), ranges)
+        return [record for records in pages for record in records]
+
+def fetch_after_version(lightspeed, endpoint: str, entity_type: str,
+                        after_version: Optional[int]) -> Tuple[List[Dict], str]:
+    """Fetch every record after after_version, choosing the mode; returns (records, mode)."""
+    threshold = catch_up_threshold()
+    if not after_version or threshold <= 0:
+        # A first sync has no watermark to measure from and is left to the historical import
+        return lightspeed._get_paginated_data(endpoint, {'after': after_version} if after_version else None), 'normal'
+
+    estimate, page, head = estimate_gap(lightspeed, endpoint, after_version)
+    if page:
+        lightspeed._notify_page(endpoint, page)
+    versions = [item.get('version') for item in page if item.get('version')]
+    if not versions:
+        logger.info(f"Sync mode for {entity_type}: normal (no records after version {after_version})")
+        return page, 'normal'
+
+    page_max = max(versions)
+    if head is None or estimate < threshold:
+        logger.info(f"Sync mode for {entity_type}: normal (~{estimate} records behind)")
+        return page + lightspeed.get_version_range(endpoint, page_max), 'normal'
+
+    logger.info(f"⏩ Sync mode for {entity_type}: catch-up (~{estimate} records behind, "
+                f"threshold {threshold}); {CATCH_UP_CURSORS} cursors, pages of {CATCH_UP_PAGE_SIZE}")
+    return page + fetch_version_ranges(lightspeed, endpoint, page_max, head), 'catch_up'
@@ -1,11 +1,16 @@
 #!/usr/bin/env python3
 """
 Complete the sale line items import by checking what's missing.
+
+Run with --reconcile to compare per-sale line item counts and per-version-bucket
+checksums server-side (see script/create_reconciliation_functions.sql) and
+re-fetch only the sales whose line items don't match.
 """
 
 import os
 import sys
 import logging
+import argparse
 from datetime import datetime, timezone
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
@@ -13,6 +18,10 @@ from dotenv import load_dotenv
 load_dotenv('.env.local')
 
 from lightspeed_client import create_lightspeed_client
+from incremental_sync import transform_line_item
+from analytics_snapshot import append_to_snapshot
+from supabase_reader import iter_pages
+from supabase_writer import upsert_rows
 from supabase import create_client
 
 logging.basicConfig(level=logging.INFO)
@@ -28,24 +37,10 @@ def get_existing_line_item_ids(supabase):
     logger.info("Fetching existing line item IDs...")
     
     all_ids = set()
-    page_size = 1000
-    start = 0
     
-    while True:
-        result = supabase.table('lightspeed_sale_line_items').select('id').range(start, start + page_size - 1).execute()
-        
-        if not result.data:
-            break
-            
-        batch_ids = {item['id'] for item in result.data}
-        all_ids.update(batch_ids)
-        
-        logger.info(f"Loaded {len(batch_ids)} IDs (total: {len(all_ids)})")
-        
-        if len(result.data) < page_size:
-            break
-            
-        start += page_size
+    for page in iter_pages(supabase, 'lightspeed_sale_line_items', columns='id'):
+        all_ids.update(item['id'] for item in page)
+        logger.info(f"Loaded {len(page)} IDs (total: {len(all_ids)})")
     
     logger.info(f"Found {len(all_ids)} existing line item IDs")
     return all_ids
@@ -70,22 +65,94 @@ def extract_missing_line_items(lightspeed, existing_ids):
             line_item_id = line_item.get('id')
             
             if line_item_id not in existing_ids:
-                transformed_item = {
-                    'id': line_item_id,
-                    'sale_id': sale_id,
-                    'product_id': line_item.get('product_id'),
-                    'price_total': line_item.get('price_total'),
-                    'quantity': line_item.get('quantity'),
-                    'status': line_item.get('status'),
-                    'total_price': line_item.get('total_price')
-                }
-                missing_line_items.append(transformed_item)
+                missing_line_items.append(transform_line_item(sale_id, line_item))
     
     logger.info(f"Found {len(missing_line_items)} missing line items out of {total_found} total")
     return missing_line_items
 
+# Bucket sizes used to narrow down mismatches, coarsest first
+RECONCILE_BUCKET_SIZES = [1_000_000_000, 10_000_000]
+
+def get_mismatched_buckets(supabase, bucket_size, min_version=None, max_version=None):
+    """Return version buckets whose expected and actual line item checksums differ."""
+    result = supabase.rpc('sale_line_item_bucket_checksums', {
+        'bucket_size': bucket_size,
+        'min_version': min_version,
+        'max_version': max_version
+    }).execute()
+    
+    mismatched = [row for row in result.data if row['expected_checksum'] != row['actual_checksum']]
+    logger.info(f"Compared {len(result.data)} buckets of {bucket_size:,} versions: {len(mismatched)} differ")
+    return mismatched
+
+def find_mismatched_sales(supabase):
+    """Narrow from coarse buckets to individual sales whose line items don't match."""
+    ranges = [(None, None)]
+    
+    for bucket_size in RECONCILE_BUCKET_SIZES:
+        next_ranges = []
+        for min_version, max_version in ranges:
+            for bucket in get_mismatched_buckets(supabase, bucket_size, min_version, max_version):
+                start = bucket['bucket'] * bucket_size
+                next_ranges.append((start, start + bucket_size))
+                logger.info(f"Bucket {start}-{start + bucket_size}: expected {bucket['expected_items']} items, "
+                            f"found {bucket['actual_items']}")
+        ranges = next_ranges
+        if not ranges:
+            return []
+    
+    mismatches = []
+    for min_version, max_version in ranges:
+        result = supabase.rpc('sale_line_item_mismatches', {
+            'min_version': min_version,
+            'max_version': max_version
+        }).execute()
+        mismatches.extend(result.data)
+    
+    logger.info(f"Found {len(mismatches)} sales with mismatched line items")
+    return mismatches
+
+def count_unverifiable_sales(supabase):
+    """Count sales synced before line_item_count was recorded."""
+    result = supabase.table('lightspeed_sales').select('id', count='exact').is_('line_item_count', 'null').limit(1).execute()
+    return result.count or 0
+
+def refetch_line_items(lightspeed, mismatches):
+    """Re-fetch only the mismatched sales and return their line items."""
+    line_items = []
+    
+    for mismatch in mismatches:
+        sale_id = mismatch['sale_id']
+        sale = lightspeed.get_sale(sale_id)
+        fresh_items = sale.get('line_items') or []
+        
+        if mismatch['actual_items'] > len(fresh_items):
+            logger.warning(f"Sale {sale_id} has {mismatch['actual_items']} stored line items but Lightspeed "
+                           f"reports {len(fresh_items)}; extra rows are left for manual review")
+        
+        line_items.extend(transform_line_item(sale_id, item) for item in fresh_items)
+    
+    return line_items
+
+def reconcile(lightspeed, supabase):
+    """Repair line items for only the sales that differ, without loading all IDs."""
+    unverifiable = count_unverifiable_sales(supabase)
+    if unverifiable:
+        logger.warning(f"{unverifiable} sales have no line_item_count yet and cannot be verified "
+                       "until they are re-synced or backfilled")
+    
+    mismatches = find_mismatched_sales(supabase)
+    if not mismatches:
+        print("✅ All verifiable sales have complete line items!")
+        return 0, 0
+    
+    line_items = refetch_line_items(lightspeed, mismatches)
+    records_created = batch_upsert(supabase, line_items)
+    print(f"✅ Repaired {len(mismatches)} sales ({records_created} line items upserted)")
+    return len(line_items), records_created
+
 def batch_upsert(supabase, records, batch_size=100):
-    """Upsert missing records."""
+    """Upsert missing records and add them to the analytics snapshot."""
     if not records:
         logger.info("No records to upsert")
         return 0
@@ -94,8 +161,8 @@ def batch_upsert(supabase, records, batch_size=100):
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
         try:
-            result = supabase.table('lightspeed_sale_line_items').upsert(batch).execute()
-            total_created += len(result.data)
+            total_created += upsert_rows(supabase, 'lightspeed_sale_line_items', batch)
+            append_to_snapshot('lightspeed_sale_line_items', batch)
             logger.info(f"Upserted batch {i//batch_size + 1} of {len(batch)} records")
         except Exception as e:
             logger.error(f"Failed to upsert batch: {e}")
@@ -121,6 +188,11 @@ def update_sync_status(supabase, records_processed, records_created):
         logger.error(f"Failed to update sync status: {e}")
 
 def main():
+    parser = argparse.ArgumentParser(description="Complete or reconcile sale line items")
+    parser.add_argument('--reconcile', action='store_true',
+                        help="compare counts and checksums server-side and re-fetch only mismatched sales")
+    args = parser.parse_args()
+    
     print("🔄 Completing Sale Line Items Import")
     print("=" * 40)
     
@@ -128,6 +200,11 @@ def main():
         lightspeed = create_lightspeed_client()
         supabase = create_supabase_client()
         
+        if args.reconcile:
+            records_processed, records_created = reconcile(lightspeed, supabase)
+            update_sync_status(supabase, records_processed, records_created)
+            return True
+        
         # Get existing line item IDs
         existing_ids = get_existing_line_item_ids(supabase)
         
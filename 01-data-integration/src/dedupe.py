@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+De-duplication of fetched records before upsert.
+A record modified while a version-cursor crawl is running can come back on a
+later page; sending both copies in one upsert makes PostgreSQL reject the batch
+("ON CONFLICT DO UPDATE command cannot affect row a second time").
+"""
+
+import logging
+from typing import Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+def dedupe_by_version(records: List[Dict], key: str = 'id') -> Tuple[List[Dict], int]:
+    """Keep the highest-version copy of each record; returns (records, duplicates dropped).
+
+    Records without a version keep their last copy, which is the newest on
+    version-ordered pages. Records without a key are passed through.
+    """
+    # id -> (version, position) of the copy to keep
+    latest: Dict[str, Tuple[int, int]] = {}
+    for position, record in enumerate(records):
+        record_id = record.get(key)
+        if record_id is None:
+            continue
+        version = int(record.get('version') or -1)
+        kept = latest.get(record_id)
+        if kept is None or version >= kept[0]:
+            latest[record_id] = (version, position)
+
+    if len(latest) == sum(1 for record in records if record.get(key) is not None):
+        return records, 0
+
+    unique = [record for position, record in enumerate(records)
+              if record.get(key) is None or latest[record.get(key)][1] == position]
+    return unique, len(records) - len(unique)
@@ -14,6 +14,7 @@ from dotenv import load_dotenv
 load_dotenv('.env.local')
 
 from lightspeed_client import create_lightspeed_client, LightspeedAPIError
+from supabase_writer import upsert_rows
 from supabase import create_client, Client
 
 logging.basicConfig(level=logging.INFO)
@@ -67,8 +68,7 @@ def batch_upsert(supabase: Client, table_name: str, records, batch_size: int = 1
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
         try:
-            result = supabase.table(table_name).upsert(batch).execute()
-            total_created += len(result.data)
+            total_created += upsert_rows(supabase, table_name, batch)
             logger.info(f"Upserted batch {i//batch_size + 1} of {len(batch)} records to {table_name}")
             time.sleep(0.5)  # Rate limiting
         except Exception as e:
@@ -9,6 +9,8 @@ import os
 import sys
 import time
 import logging
+import argparse
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone, timedelta
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
@@ -17,14 +19,30 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.dirname(__file__))
 
 from lightspeed_client import create_lightspeed_client, LightspeedAPIError
+from analytics_snapshot import append_to_snapshot
+from progress import track_entity
+from sync_metrics import SyncMetrics
+import telemetry
+from profiling import start_profiler, profile_entity
+from dedupe import dedupe_by_version
+from line_item_checksum import line_item_ids_md5
+from catch_up import CATCH_UP_BATCH_SIZE, fetch_after_version
+from supabase_writer import upsert_rows_sized
+from async_writer import DEFAULT_CONCURRENCY, AsyncSupabaseWriter, WritePipeline
+from local_queue import get_batch_queue
+from accounts import DEFAULT_ACCOUNT, load_accounts, tag_records
+from leases import LeaseLostError, entity_lease
+from sync_lock import DaemonLock, lock_file_path
 from supabase import create_client, Client
 
+LOG_FILE = 'incremental_sync.log'
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('incremental_sync.log'),
+        logging.FileHandler(LOG_FILE),
         logging.StreamHandler()
     ]
 )
@@ -40,10 +58,12 @@ def create_supabase_client() -> Client:
         
     return create_client(url, key)
 
-def get_last_sync_version(supabase: Client, entity_type: str) -> Optional[int]:
-    """Get last successful sync version for entity type."""
+def get_last_sync_version(supabase: Client, entity_type: str, account: Optional[str] = None) -> Optional[int]:
+    """Get last successful sync version for entity type (and account in multi-account mode)."""
     try:
-        result = supabase.table('sync_state').select('last_version, status').eq('entity_type', entity_type).execute()
+        # Single-account runs own the 'default' rows; without the filter another account's row could be read
+        result = supabase.table('sync_state').select('last_version, status').eq('entity_type', entity_type) \
+            .eq('account', account or DEFAULT_ACCOUNT).execute()
         
         if result.data and result.data[0]['status'] == 'success':
             last_version = result.data[0]['last_version']
@@ -58,18 +78,22 @@ def get_last_sync_version(supabase: Client, entity_type: str) -> Optional[int]:
         logger.error(f"Failed to get last sync version for {entity_type}: {e}")
         return None
 
-def log_sync_start(supabase: Client, entity_type: str) -> str:
-    """Log sync start and return log ID."""
+def log_sync_start(supabase: Client, entity_type: str, action: str = 'incremental_sync',
+                   account: Optional[str] = None) -> str:
+    """Log sync start and return log ID, tagged with the account in multi-account mode."""
     try:
-        result = supabase.table('sync_log').insert({
+        entry = {
             'entity_type': entity_type,
-            'action': 'incremental_sync',
+            'action': action,
             'status': 'started',
             'timestamp': datetime.now(timezone.utc).isoformat()
-        }).execute()
+        }
+        if account:
+            entry['account'] = account
+        result = supabase.table('sync_log').insert(entry).execute()
         
         log_id = result.data[0]['id']
-        logger.info(f"Started incremental sync for {entity_type} (log_id: {log_id})")
+        logger.info(f"Started {action} for {entity_type} (log_id: {log_id})")
         return str(log_id)
         
     except Exception as e:
@@ -78,14 +102,15 @@ def log_sync_start(supabase: Client, entity_type: str) -> str:
 
 def log_sync_complete(supabase: Client, log_id: str, entity_type: str, 
                      records_processed: int, records_created: int, duration: float, 
-                     status: str = 'completed', error_details: str = None):
-    """Log sync completion."""
+                     status: str = 'completed', error_details: str = None, metadata: Optional[Dict] = None):
+    """Log sync completion with the per-stage metrics in metadata."""
     try:
         supabase.table('sync_log').update({
             'status': status,
             'duration_seconds': duration,
             'records_processed': records_processed,
-            'error_details': error_details
+            'error_details': error_details,
+            'metadata': metadata
         }).eq('id', log_id).execute()
         
         logger.info(f"Completed {entity_type}: {records_processed} processed, {records_created} upserted")
@@ -93,8 +118,18 @@ def log_sync_complete(supabase: Client, log_id: str, entity_type: str,
     except Exception as e:
         logger.error(f"Failed to log sync completion for {entity_type}: {e}")
 
-def update_sync_state(supabase: Client, entity_type: str, status: str, highest_version: Optional[int] = None, error_message: str = None):
-    """Update sync state table with version tracking."""
+def refresh_sync_performance(supabase: Client):
+    """Refresh the sync_performance materialized view read by the /performance page."""
+    try:
+        supabase.rpc('refresh_sync_performance', {}).execute()
+        logger.info("Refreshed sync_performance")
+    except Exception as e:
+        # Only the performance page goes stale; the sync itself succeeded
+        logger.warning(f"Failed to refresh sync_performance: {e}")
+
+def update_sync_state(supabase: Client, entity_type: str, status: str, highest_version: Optional[int] = None,
+                      error_message: str = None, account: Optional[str] = None):
+    """Update sync state table with version tracking, per account in multi-account mode."""
     try:
         sync_data = {
             'entity_type': entity_type,
@@ -108,7 +143,8 @@ def update_sync_state(supabase: Client, entity_type: str, status: str, highest_v
             sync_data['last_version'] = highest_version
             logger.info(f"Updating {entity_type} to version {highest_version}")
         
-        supabase.table('sync_state').upsert(sync_data).execute()
+        sync_data['account'] = account or DEFAULT_ACCOUNT
+        supabase.table('sync_state').upsert(sync_data, on_conflict='account,entity_type').execute()
         logger.info(f"Updated sync state for {entity_type}: {status}")
         
     except Exception as e:
@@ -178,7 +214,10 @@ def transform_sale(sale: Dict) -> Dict:
         'total_price': sale.get('total_price'),
         'sale_date': sale.get('created_at'),
         'created_at': sale.get('created_at'),
-        'updated_at': sale.get('updated_at')
+        'updated_at': sale.get('updated_at'),
+        'version': sale.get('version'),
+        'line_item_count': len(sale.get('line_items') or []),  # Checked by complete_line_items --reconcile
+        'line_item_ids_md5': line_item_ids_md5(sale.get('line_items'))
     }
 
 def transform_inventory(inventory: Dict) -> Dict:
@@ -193,6 +232,18 @@ def transform_inventory(inventory: Dict) -> Dict:
         'updated_at': datetime.now(timezone.utc).isoformat()
     }
 
+def transform_line_item(sale_id: str, line_item: Dict) -> Dict:
+    """Transform a line item nested in a Lightspeed sale to Supabase format."""
+    return {
+        'id': line_item.get('id'),
+        'sale_id': sale_id,
+        'product_id': line_item.get('product_id'),
+        'price_total': line_item.get('price_total'),
+        'quantity': line_item.get('quantity'),
+        'status': line_item.get('status'),
+        'total_price': line_item.get('total_price')
+    }
+
 def extract_line_items_from_sales(lightspeed, after_version: Optional[int]) -> List[Dict]:
     """Extract line items from sales data after given version."""
     logger.info(f"Fetching sales after version {after_version} to extract line items...")
@@ -201,6 +252,10 @@ def extract_line_items_from_sales(lightspeed, after_version: Optional[int]) -> L
     sales_data = lightspeed.get_sales(after_version=after_version)
     logger.info(f"Retrieved {len(sales_data)} sales records")
     
+    return line_items_from_sales(sales_data)
+
+def line_items_from_sales(sales_data: List[Dict]) -> List[Dict]:
+    """Transform the line items nested in fetched sales."""
     line_items = []
     
     for sale in sales_data:
@@ -208,21 +263,12 @@ def extract_line_items_from_sales(lightspeed, after_version: Optional[int]) -> L
         sale_line_items = sale.get('line_items', [])
         
         for line_item in sale_line_items:
-            transformed_item = {
-                'id': line_item.get('id'),
-                'sale_id': sale_id,
-                'product_id': line_item.get('product_id'),
-                'price_total': line_item.get('price_total'),
-                'quantity': line_item.get('quantity'),
-                'status': line_item.get('status'),
-                'total_price': line_item.get('total_price')
-            }
-            line_items.append(transformed_item)
+            line_items.append(transform_line_item(sale_id, line_item))
     
     logger.info(f"Extracted {len(line_items)} line items from {len(sales_data)} sales")
     return line_items
 
-def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_size: int = 100) -> int:
+def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_size: int = 100, progress=None, metrics=None) -> int:
     """Upsert records in batches to Supabase."""
     if not records:
         return 0
@@ -232,8 +278,15 @@ def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_s
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
         try:
-            result = supabase.table(table_name).upsert(batch).execute()
-            total_upserted += len(result.data)
+            batch_start = time.perf_counter()
+            written, body_bytes = upsert_rows_sized(supabase, table_name, batch)
+            batch_seconds = time.perf_counter() - batch_start
+            telemetry.record_upsert(table_name, written, batch_seconds)
+            if metrics:
+                metrics.record_batch(body_bytes, batch_seconds)
+            total_upserted += written
+            if progress:
+                progress.upserted(written)
             logger.info(f"Upserted batch {i//batch_size + 1} of {len(batch)} records to {table_name}")
             
             # Small delay to avoid overwhelming the database
@@ -245,20 +298,64 @@ def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_s
             
     return total_upserted
 
-def sync_entity_incremental(lightspeed, supabase, entity_type: str) -> bool:
-    """Sync a specific entity type incrementally."""
+def load_queue_key(entity_type: str, account: Optional[str] = None) -> str:
+    """Return the load queue key; batches of one key are loaded in order."""
+    return f"{account}/{entity_type}" if account else entity_type
+
+def queue_batches(queue, entity_type: str, table_name: str, records: List[Dict],
+                  highest_version: Optional[int], batch_size: int = 100) -> int:
+    """Append transformed records and their watermark to the local load queue under entity_type's key."""
+    batches = [records[i:i + batch_size] for i in range(0, len(records), batch_size)]
+    queue.put_batches(entity_type, table_name, batches, highest_version)
+    logger.info(f"Queued {len(records)} {entity_type} rows for loading into {table_name}")
+    return len(records)
+
+def sync_entity_incremental(lightspeed, supabase, entity_type: str, account: Optional[str] = None,
+                            pipeline=None) -> bool:
+    """Sync an entity while holding its lease, so overlapping workers never sync it twice."""
+    lease = entity_lease(supabase, entity_type, account)
+    if lease is None:
+        return run_entity_sync(lightspeed, supabase, entity_type, account, pipeline=pipeline)
+    
+    if not lease.acquire():
+        logger.info(f"⏭️  Skipping {lease.resource}: leased by {lease.holder() or 'another worker'}")
+        return True
+    try:
+        return run_entity_sync(lightspeed, supabase, entity_type, account, lease, pipeline)
+    finally:
+        lease.release()
+
+def run_entity_sync(lightspeed, supabase, entity_type: str, account: Optional[str] = None, lease=None,
+                    pipeline=None) -> bool:
+    """Sync a specific entity type incrementally, for one account in multi-account mode."""
+    # In a write pipeline only one entity fetches at a time; earlier entities keep writing meanwhile
+    fetch_lock = pipeline.fetch_lock if pipeline else None
+    if fetch_lock:
+        fetch_lock.acquire()
     start_time = time.time()
-    log_id = log_sync_start(supabase, entity_type)
+    log_id = log_sync_start(supabase, entity_type, account=account)
+    progress = track_entity(load_queue_key(entity_type, account), lightspeed)
+    metrics = SyncMetrics(lightspeed, account)
+    queue_key = load_queue_key(entity_type, account)
     
     try:
-        # Get last sync version
-        last_version = get_last_sync_version(supabase, entity_type)
+        # Get last sync version; batches still waiting in the load queue are already fetched
+        queue = get_batch_queue()
+        last_version = get_last_sync_version(supabase, entity_type, account)
+        pending_version = queue.pending_watermark(queue_key) if queue else None
+        if pending_version is not None and (last_version is None or pending_version > last_version):
+            last_version = pending_version
         logger.info(f"Last version for {entity_type}: {last_version}")
         
+        def fetch_versioned(endpoint: str) -> List[Dict]:
+            # Version-cursor entities switch to parallel cursors when far behind
+            records, metrics.mode = fetch_after_version(lightspeed, endpoint, entity_type, last_version)
+            return records
+        
         # Define entity mappings
         entity_config = {
             'customers': {
-                'fetch_method': lambda: lightspeed.get_customers(after_version=last_version),
+                'fetch_method': lambda: fetch_versioned('2.0/customers'),
                 'transform': transform_customer,
                 'table': 'lightspeed_customers'
             },
@@ -268,17 +365,17 @@ def sync_entity_incremental(lightspeed, supabase, entity_type: str) -> bool:
                 'table': 'lightspeed_outlets'
             },
             'products': {
-                'fetch_method': lambda: lightspeed.get_products(after_version=last_version),
+                'fetch_method': lambda: fetch_versioned('2.0/products'),
                 'transform': transform_product,
                 'table': 'lightspeed_products'
             },
             'sales': {
-                'fetch_method': lambda: lightspeed.get_sales(after_version=last_version),
+                'fetch_method': lambda: fetch_versioned('2.0/sales'),
                 'transform': transform_sale,
                 'table': 'lightspeed_sales'
             },
             'sale_line_items': {
-                'fetch_method': lambda: extract_line_items_from_sales(lightspeed, last_version),
+                'fetch_method': lambda: line_items_from_sales(fetch_versioned('2.0/sales')),
                 'transform': lambda item: item,  # Already transformed in fetch_method
                 'table': 'lightspeed_sale_line_items'
             },
@@ -296,41 +393,96 @@ def sync_entity_incremental(lightspeed, supabase, entity_type: str) -> bool:
         
         # Fetch data from Lightspeed
         logger.info(f"Fetching {entity_type} from Lightspeed (since version: {last_version})...")
-        raw_data = config['fetch_method']()
+        with metrics.stage('fetch'):
+            raw_data = config['fetch_method']()
+        batch_size = CATCH_UP_BATCH_SIZE if metrics.mode == 'catch_up' else 100
         
         # Skip if no new data
         if not raw_data:
             logger.info(f"No new {entity_type} records found since last sync")
             duration = time.time() - start_time
+            telemetry.record_sync(entity_type, 'completed', duration, 0, time.time(), account)
             if log_id:
-                log_sync_complete(supabase, log_id, entity_type, 0, 0, duration)
-            update_sync_state(supabase, entity_type, 'success')
+                log_sync_complete(supabase, log_id, entity_type, 0, 0, duration, metadata=metrics.to_metadata())
+            update_sync_state(supabase, entity_type, 'success', account=account)
+            progress.finish()
             return True
         
         logger.info(f"Retrieved {len(raw_data)} {entity_type} records from Lightspeed")
         
+        # Drop copies of records modified mid-crawl; only the newest version is written
+        with metrics.stage('dedupe'):
+            raw_data, duplicates = dedupe_by_version(raw_data)
+        metrics.increment('duplicates_dropped', duplicates)
+        if duplicates:
+            logger.info(f"Dropped {duplicates} duplicate {entity_type} records (kept the highest version)")
+        
         # Transform data
         logger.info(f"Transforming {entity_type} data...")
-        transformed_data = [config['transform'](item) for item in raw_data]
-        
-        # Upsert to Supabase
-        logger.info(f"Upserting {entity_type} to Supabase...")
-        records_upserted = batch_upsert(supabase, config['table'], transformed_data)
+        with metrics.stage('transform'):
+            transformed_data = [config['transform'](item) for item in raw_data]
+            if account:
+                tag_records(transformed_data, account)
         
         # Get highest version from fetched data
         highest_version = get_highest_version(raw_data)
         
+        # Done with Lightspeed; let the next entity start fetching while this one writes
+        if fetch_lock:
+            metrics.freeze_client()
+            progress.detach()
+            fetch_lock.release()
+            fetch_lock = None
+        
+        # Don't write if another worker took the entity over while we were fetching
+        if lease:
+            lease.check()
+        
+        if queue:
+            # Hand the batches to the queue loader, which advances sync_state once they are loaded
+            with metrics.stage('enqueue'):
+                records_upserted = queue_batches(queue, queue_key, config['table'], transformed_data, highest_version,
+                                                 batch_size)
+        elif pipeline:
+            # Send every batch at once over the async writer and wait for all of them to land
+            logger.info(f"Upserting {entity_type} to Supabase (async)...")
+            def on_batch(batch, written, seconds, body_bytes):
+                metrics.record_batch(body_bytes, seconds)
+                progress.upserted(written)
+            tracker = pipeline.writer.upsert_batches(config['table'], transformed_data, batch_size, on_batch=on_batch)
+            with metrics.stage('write_wait'):
+                records_upserted = tracker.wait()
+            with metrics.stage('snapshot'):
+                append_to_snapshot(config['table'], transformed_data)
+        else:
+            # Upsert to Supabase
+            logger.info(f"Upserting {entity_type} to Supabase...")
+            records_upserted = batch_upsert(supabase, config['table'], transformed_data, batch_size,
+                                            progress=progress, metrics=metrics)
+            with metrics.stage('snapshot'):
+                append_to_snapshot(config['table'], transformed_data)
+        
         # Log completion
         duration = time.time() - start_time
+        metrics.log_summary(entity_type)
+        telemetry.record_sync(entity_type, 'completed', duration, len(raw_data), time.time(), account)
         if log_id:
-            log_sync_complete(supabase, log_id, entity_type, len(raw_data), records_upserted, duration)
+            log_sync_complete(supabase, log_id, entity_type, len(raw_data), records_upserted, duration, metadata=metrics.to_metadata())
         
         # Update sync state with new version
-        update_sync_state(supabase, entity_type, 'success', highest_version)
+        if not queue:
+            update_sync_state(supabase, entity_type, 'success', highest_version, account=account)
+        progress.finish()
         
         logger.info(f"✅ Successfully synced {entity_type}: {len(raw_data)} records in {duration:.2f}s (version: {highest_version})")
         return True
         
+    except LeaseLostError as e:
+        # The new owner is syncing this entity now; leave sync_state to it
+        logger.error(f"❌ Abandoned {entity_type}: {e}")
+        progress.finish('failed', str(e))
+        return False
+        
     except Exception as e:
         duration = time.time() - start_time
         error_msg = str(e)
@@ -338,48 +490,153 @@ def sync_entity_incremental(lightspeed, supabase, entity_type: str) -> bool:
         logger.error(f"❌ Failed to sync {entity_type}: {error_msg}")
         
         # Log failure
+        telemetry.record_sync(entity_type, 'failed', duration, 0, time.time(), account)
         if log_id:
-            log_sync_complete(supabase, log_id, entity_type, 0, 0, duration, 'failed', error_msg)
+            log_sync_complete(supabase, log_id, entity_type, 0, 0, duration, 'failed', error_msg, metrics.to_metadata())
         
         # Update sync state
-        update_sync_state(supabase, entity_type, 'failed', error_msg)
+        update_sync_state(supabase, entity_type, 'failed', error_message=error_msg, account=account)
+        progress.finish('failed', error_msg)
         
         return False
+    
+    finally:
+        if fetch_lock:
+            fetch_lock.release()
+
+# Sync order matters for dependencies
+ENTITIES = ['outlets', 'customers', 'products', 'sales', 'sale_line_items', 'inventory']
+
+def sync_entities(lightspeed, supabase, entities: List[str], account: Optional[str] = None, profiler=None,
+                  writer=None) -> int:
+    """Sync entities in order and return how many succeeded.
+    
+    With an async writer, each entity's fetch overlaps the previous entity's writes.
+    """
+    success_count = 0
+    prefix = f"[{account}] " if account else ""
+    
+    if writer:
+        if profiler:
+            logger.warning("Per-entity profiles are skipped when entity writes overlap")
+        pipeline = WritePipeline(writer)
+        try:
+            futures = []
+            for entity_type in entities:
+                logger.info(f"\n🔄 {prefix}Syncing {entity_type}...")
+                futures.append(pipeline.submit(sync_entity_incremental, lightspeed, supabase, entity_type,
+                                               account, pipeline))
+            results = [future.result() for future in futures]
+        finally:
+            pipeline.close()
+    else:
+        results = []
+        for entity_type in entities:
+            logger.info(f"\n🔄 {prefix}Syncing {entity_type}...")
+            with profile_entity(profiler, entity_type):
+                results.append(sync_entity_incremental(lightspeed, supabase, entity_type, account))
+    
+    for entity_type, succeeded in zip(entities, results):
+        if succeeded:
+            success_count += 1
+            print(f"✅ {prefix}{entity_type.title()} sync completed")
+        else:
+            print(f"❌ {prefix}{entity_type.title()} sync failed")
+    
+    if getattr(lightspeed, 'scheduler', None):
+        lightspeed.scheduler.log_report(prefix)
+    return success_count
+
+def sync_account(account: Dict, supabase, entities: List[str], writer=None) -> int:
+    """Sync one configured account with its own client and rate limit."""
+    try:
+        lightspeed = create_lightspeed_client(account)
+        if not lightspeed.test_connection():
+            raise Exception("Failed to connect to Lightspeed API")
+    except Exception as e:
+        logger.error(f"❌ [{account['name']}] {e}")
+        print(f"❌ [{account['name']}] {e}")
+        return 0
+    return sync_entities(lightspeed, supabase, entities, account['name'], writer=writer)
+
+def sync_accounts(accounts: List[Dict], supabase, entities: List[str], writer=None) -> int:
+    """Sync every account concurrently and return the total number of successful entity syncs."""
+    with ThreadPoolExecutor(max_workers=len(accounts), thread_name_prefix='account') as executor:
+        counts = list(executor.map(lambda account: sync_account(account, supabase, entities, writer), accounts))
+    for account, count in zip(accounts, counts):
+        logger.info(f"[{account['name']}] {count}/{len(entities)} entities synced")
+    return sum(counts)
 
 def main():
     """Main incremental sync function."""
     load_dotenv('.env.local')
     
+    parser = argparse.ArgumentParser(description="Incremental Lightspeed to Supabase sync")
+    parser.add_argument('--profile', nargs='?', const='all', choices=['all', 'cpu'],
+                        help="write per-entity sampled stacks (and, unless 'cpu', allocation reports) "
+                             "to profiles/ next to the log")
+    parser.add_argument('--async-writes', action='store_true',
+                        help="upsert over pooled HTTP/2 connections and overlap each entity's writes "
+                             "with the next entity's fetch")
+    parser.add_argument('--write-concurrency', type=int,
+                        default=int(os.environ.get('SUPABASE_WRITE_CONCURRENCY', DEFAULT_CONCURRENCY)),
+                        help="upsert requests in flight at once with --async-writes (default: %(default)s)")
+    args = parser.parse_args()
+    
     print("🔄 Starting Incremental Data Sync")
     print("=" * 40)
     
+    # The daemon syncs continuously while it runs; a cron run on top would only duplicate its work
+    lock = DaemonLock(lock_file_path())
+    if not lock.acquire():
+        print(f"⏭️  The sync daemon (or another sync) holds {lock.path}; skipping this run")
+        return True
+    
+    profiler = start_profiler(LOG_FILE, args.profile) if args.profile else None
+    writer = None
+    
     try:
+        accounts = load_accounts()
+        
         # Initialize clients
         logger.info("Initializing API clients...")
-        lightspeed = create_lightspeed_client()
         supabase = create_supabase_client()
         
-        # Test connections
-        logger.info("Testing API connections...")
-        if not lightspeed.test_connection():
-            raise Exception("Failed to connect to Lightspeed API")
-        
-        logger.info("✅ API connections successful")
+        if args.async_writes:
+            if get_batch_queue():
+                logger.warning("--async-writes is ignored while SYNC_LOAD_QUEUE is set; the queue loader writes")
+            else:
+                writer = AsyncSupabaseWriter(args.write_concurrency)
+        
+        if accounts:
+            # Each account has its own client and rate limit, so accounts run side by side
+            if profiler:
+                logger.warning("Per-entity profiles mix accounts when several are synced concurrently")
+            success_count = sync_accounts(accounts, supabase, ENTITIES, writer)
+            total_count = len(ENTITIES) * len(accounts)
+        else:
+            lightspeed = create_lightspeed_client()
+            
+            # Test connections
+            logger.info("Testing API connections...")
+            if not lightspeed.test_connection():
+                raise Exception("Failed to connect to Lightspeed API")
+            
+            logger.info("✅ API connections successful")
+            success_count = sync_entities(lightspeed, supabase, ENTITIES, profiler=profiler, writer=writer)
+            total_count = len(ENTITIES)
         
-        # Sync entities (order matters for dependencies)
-        entities = ['outlets', 'customers', 'products', 'sales', 'sale_line_items', 'inventory']
-        success_count = 0
+        # Load whatever was queued; batches that cannot be loaded now stay queued for the next run
+        queue = get_batch_queue()
+        if queue:
+            from queue_loader import QueueLoader
+            remaining = QueueLoader(supabase, queue).drain()
+            if remaining:
+                print(f"⚠️  Batches left in {queue.path} for a later load: {remaining}")
         
-        for entity_type in entities:
-            logger.info(f"\n🔄 Syncing {entity_type}...")
-            if sync_entity_incremental(lightspeed, supabase, entity_type):
-                success_count += 1
-                print(f"✅ {entity_type.title()} sync completed")
-            else:
-                print(f"❌ {entity_type.title()} sync failed")
+        refresh_sync_performance(supabase)
         
         # Summary
-        total_count = len(entities)
         logger.info(f"\n🎉 Incremental sync complete: {success_count}/{total_count} succeeded")
         
         if success_count == total_count:
@@ -393,6 +650,14 @@ def main():
         logger.error(f"Fatal error during sync: {e}")
         print(f"\n❌ Sync failed: {e}")
         return False
+    
+    finally:
+        if writer:
+            writer.close()
+        telemetry.write_textfile('incremental_sync')
+        if profiler:
+            profiler.stop()
+        lock.release()
 
 if __name__ == "__main__":
     success = main()
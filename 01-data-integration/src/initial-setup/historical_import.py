@@ -8,22 +8,36 @@ import os
 import sys
 import time
 import logging
+import argparse
 from datetime import datetime, timezone
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
 # Add src to Python path
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 
 from lightspeed_client import create_lightspeed_client, LightspeedAPIError
+from analytics_snapshot import append_to_snapshot
+from progress import track_entity
+from sync_metrics import SyncMetrics
+import telemetry
+from profiling import start_profiler, profile_entity
+from dedupe import dedupe_by_version
+from line_item_checksum import line_item_ids_md5
+from supabase_writer import upsert_rows_sized
+from transform_pool import TransformPool
+from backfill_windows import DEFAULT_WINDOW_DAYS, backfill_windows, iter_windows
+from accounts import DEFAULT_ACCOUNT
 from supabase import create_client, Client
 
+LOG_FILE = 'historical_import.log'
+
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(levelname)s - %(message)s',
     handlers=[
-        logging.FileHandler('historical_import.log'),
+        logging.FileHandler(LOG_FILE),
         logging.StreamHandler()
     ]
 )
@@ -59,14 +73,15 @@ def log_sync_start(supabase: Client, entity_type: str) -> str:
 
 def log_sync_complete(supabase: Client, log_id: str, entity_type: str, 
                      records_processed: int, records_created: int, duration: float, 
-                     status: str = 'completed', error_details: str = None):
-    """Log sync completion."""
+                     status: str = 'completed', error_details: str = None, metadata: Optional[Dict] = None):
+    """Log sync completion with the per-stage metrics in metadata."""
     try:
         supabase.table('sync_log').update({
             'status': status,
             'duration_seconds': duration,
             'records_processed': records_processed,
-            'error_details': error_details
+            'error_details': error_details,
+            'metadata': metadata
         }).eq('id', log_id).execute()
         
         logger.info(f"Completed {entity_type}: {records_processed} processed, {records_created} created")
@@ -74,16 +89,21 @@ def log_sync_complete(supabase: Client, log_id: str, entity_type: str,
     except Exception as e:
         logger.error(f"Failed to log sync completion for {entity_type}: {e}")
 
-def update_sync_state(supabase: Client, entity_type: str, status: str, error_message: str = None):
+def update_sync_state(supabase: Client, entity_type: str, status: str, error_message: str = None,
+                      highest_version: Optional[int] = None):
     """Update sync state table."""
     try:
-        supabase.table('sync_state').upsert({
+        sync_data = {
+            'account': DEFAULT_ACCOUNT,
             'entity_type': entity_type,
             'last_sync_time': datetime.now(timezone.utc).isoformat(),
             'status': status,
             'error_message': error_message,
             'updated_at': datetime.now(timezone.utc).isoformat()
-        }).execute()
+        }
+        if highest_version is not None:
+            sync_data['last_version'] = highest_version
+        supabase.table('sync_state').upsert(sync_data, on_conflict='account,entity_type').execute()
         
         logger.info(f"Updated sync state for {entity_type}: {status}")
         
@@ -144,7 +164,10 @@ def transform_sale(sale: Dict) -> Dict:
         'total_price': sale.get('total_price'),
         'sale_date': sale.get('created_at'),
         'created_at': sale.get('created_at'),
-        'updated_at': sale.get('updated_at')
+        'updated_at': sale.get('updated_at'),
+        'version': sale.get('version'),
+        'line_item_count': len(sale.get('line_items') or []),  # Checked by complete_line_items --reconcile
+        'line_item_ids_md5': line_item_ids_md5(sale.get('line_items'))
     }
 
 def transform_inventory(inventory: Dict) -> Dict:
@@ -159,15 +182,34 @@ def transform_inventory(inventory: Dict) -> Dict:
         'updated_at': datetime.now(timezone.utc).isoformat()
     }
 
-def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_size: int = 100) -> int:
+def transform_sale_line_item(item: Dict) -> Dict:
+    """Transform a Lightspeed sale line item to Supabase format."""
+    return {
+        'id': item.get('id'),
+        'sale_id': item.get('sale_id'),
+        'product_id': item.get('product_id'),
+        'price_total': item.get('price_total'),
+        'quantity': item.get('quantity'),
+        'status': item.get('status'),
+        'total_price': item.get('total_price')
+    }
+
+def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_size: int = 100, progress=None, metrics=None) -> int:
     """Upsert records in batches to Supabase."""
     total_created = 0
     
     for i in range(0, len(records), batch_size):
         batch = records[i:i + batch_size]
         try:
-            result = supabase.table(table_name).upsert(batch).execute()
-            total_created += len(result.data)
+            batch_start = time.perf_counter()
+            written, body_bytes = upsert_rows_sized(supabase, table_name, batch)
+            batch_seconds = time.perf_counter() - batch_start
+            telemetry.record_upsert(table_name, written, batch_seconds)
+            if metrics:
+                metrics.record_batch(body_bytes, batch_seconds)
+            total_created += written
+            if progress:
+                progress.upserted(written)
             logger.info(f"Upserted batch {i//batch_size + 1} of {len(batch)} records to {table_name}")
             
             # Small delay to avoid overwhelming the database
@@ -179,48 +221,48 @@ def batch_upsert(supabase: Client, table_name: str, records: List[Dict], batch_s
             
     return total_created
 
-def import_entity(lightspeed, supabase, entity_type: str) -> bool:
-    """Import a specific entity type."""
+def import_entity(lightspeed, supabase, entity_type: str, pool: Optional[TransformPool] = None) -> bool:
+    """Import a specific entity type, decoding and transforming in pool workers when given."""
     start_time = time.time()
     log_id = log_sync_start(supabase, entity_type)
+    progress = track_entity(entity_type, lightspeed)
+    metrics = SyncMetrics(lightspeed)
     
     try:
         # Define entity mappings
         entity_config = {
             'customers': {
+                'endpoint': '2.0/customers',
                 'fetch_method': lightspeed.get_customers,
                 'transform': transform_customer,
                 'table': 'lightspeed_customers'
             },
             'outlets': {
+                'endpoint': '2.0/outlets',
                 'fetch_method': lightspeed.get_outlets,
                 'transform': transform_outlet,
                 'table': 'lightspeed_outlets'
             },
             'products': {
+                'endpoint': '2.0/products',
                 'fetch_method': lightspeed.get_products,
                 'transform': transform_product,
                 'table': 'lightspeed_products'
             },
             'sales': {
+                'endpoint': '2.0/sales',
                 'fetch_method': lightspeed.get_sales,
                 'transform': transform_sale,
                 'table': 'lightspeed_sales'
             },
             'sale_line_items': {
+                'endpoint': '2.0/sale_line_items',
                 'fetch_method': lambda: lightspeed._get_paginated_data('2.0/sale_line_items'),
-                'transform': lambda item: {
-                    'id': item.get('id'),
-                    'sale_id': item.get('sale_id'),
-                    'product_id': item.get('product_id'),
-                    'price_total': item.get('price_total'),
-                    'quantity': item.get('quantity'),
-                    'status': item.get('status'),
-                    'total_price': item.get('total_price')
-                },
+                'transform': transform_sale_line_item,
                 'table': 'lightspeed_sale_line_items'
             },
             'inventory': {
+                'endpoint': '2.0/inventory',
                 'fetch_method': lightspeed.get_inventory,
                 'transform': transform_inventory,
                 'table': 'lightspeed_inventory'
@@ -232,28 +274,62 @@ def import_entity(lightspeed, supabase, entity_type: str) -> bool:
         
         config = entity_config[entity_type]
         
-        # Fetch data from Lightspeed
-        logger.info(f"Fetching {entity_type} from Lightspeed...")
-        raw_data = config['fetch_method']()
-        logger.info(f"Retrieved {len(raw_data)} {entity_type} records from Lightspeed")
+        if pool:
+            # Raw pages go to the worker processes as they arrive; decoding overlaps the fetch
+            logger.info(f"Fetching {entity_type} from Lightspeed ({pool.workers} transform workers)...")
+            endpoint = config['endpoint']
+            with metrics.stage('fetch'):
+                futures = pool.submit_pages(lightspeed.iter_raw_pages(endpoint), config['transform'])
+            with metrics.stage('transform'):
+                transformed_data = pool.collect(futures, config['transform'],
+                                                on_page=lambda rows: progress.on_page(endpoint, rows))
+            fetched = len(transformed_data)
+            logger.info(f"Retrieved {fetched} {entity_type} records from Lightspeed")
+            
+            # Raw records never reach this process, so dedupe the transformed rows; most drop the
+            # version, in which case the last copy in fetch (version) order is kept, i.e. the newest
+            with metrics.stage('dedupe'):
+                transformed_data, duplicates = dedupe_by_version(transformed_data)
+        else:
+            # Fetch data from Lightspeed
+            logger.info(f"Fetching {entity_type} from Lightspeed...")
+            with metrics.stage('fetch'):
+                raw_data = config['fetch_method']()
+            fetched = len(raw_data)
+            logger.info(f"Retrieved {fetched} {entity_type} records from Lightspeed")
+            
+            # Drop copies of records modified mid-crawl before transforming them
+            with metrics.stage('dedupe'):
+                raw_data, duplicates = dedupe_by_version(raw_data)
+            
+            # Transform data
+            logger.info(f"Transforming {entity_type} data...")
+            with metrics.stage('transform'):
+                transformed_data = [config['transform'](item) for item in raw_data]
         
-        # Transform data
-        logger.info(f"Transforming {entity_type} data...")
-        transformed_data = [config['transform'](item) for item in raw_data]
+        # Only the newest version of each record is written
+        metrics.increment('duplicates_dropped', duplicates)
+        if duplicates:
+            logger.info(f"Dropped {duplicates} duplicate {entity_type} records (kept the highest version)")
         
         # Upsert to Supabase
         logger.info(f"Upserting {entity_type} to Supabase...")
-        records_created = batch_upsert(supabase, config['table'], transformed_data)
+        records_created = batch_upsert(supabase, config['table'], transformed_data, progress=progress, metrics=metrics)
+        with metrics.stage('snapshot'):
+            append_to_snapshot(config['table'], transformed_data)
         
         # Log completion
         duration = time.time() - start_time
+        metrics.log_summary(entity_type)
+        telemetry.record_sync(entity_type, 'completed', duration, fetched, time.time())
         if log_id:
-            log_sync_complete(supabase, log_id, entity_type, len(raw_data), records_created, duration)
+            log_sync_complete(supabase, log_id, entity_type, fetched, records_created, duration, metadata=metrics.to_metadata())
         
         # Update sync state
         update_sync_state(supabase, entity_type, 'success')
+        progress.finish()
         
-        logger.info(f"✅ Successfully imported {entity_type}: {len(raw_data)} records in {duration:.2f}s")
+        logger.info(f"✅ Successfully imported {entity_type}: {fetched} records in {duration:.2f}s")
         return True
         
     except Exception as e:
@@ -263,18 +339,92 @@ def import_entity(lightspeed, supabase, entity_type: str) -> bool:
         logger.error(f"❌ Failed to import {entity_type}: {error_msg}")
         
         # Log failure
+        telemetry.record_sync(entity_type, 'failed', duration, 0, time.time())
         if log_id:
-            log_sync_complete(supabase, log_id, entity_type, 0, 0, duration, 'failed', error_msg)
+            log_sync_complete(supabase, log_id, entity_type, 0, 0, duration, 'failed', error_msg, metrics.to_metadata())
         
         # Update sync state
         update_sync_state(supabase, entity_type, 'failed', error_msg)
+        progress.finish('failed', error_msg)
         
         return False
 
+def import_sales_window(lightspeed, supabase, start: datetime, end: datetime) -> Tuple[int, Optional[int]]:
+    """Import the sales created in [start, end) with their line items; returns (sales, highest version)."""
+    logger.info(f"\n📅 Importing sales from {start.date()} to {end.date()}...")
+    sales = lightspeed.search_sales(start.strftime('%Y-%m-%dT%H:%M:%SZ'), end.strftime('%Y-%m-%dT%H:%M:%SZ'))
+    sales, duplicates = dedupe_by_version(sales)
+    if duplicates:
+        logger.info(f"Dropped {duplicates} duplicate sales (kept the highest version)")
+    
+    tables = {
+        'lightspeed_sales': [transform_sale(sale) for sale in sales],
+        'lightspeed_sale_line_items': [transform_sale_line_item({**item, 'sale_id': sale.get('id')})
+                                       for sale in sales for item in sale.get('line_items') or []]
+    }
+    for table, records in tables.items():
+        batch_upsert(supabase, table, records)
+        append_to_snapshot(table, records)
+    
+    versions = [sale['version'] for sale in sales if sale.get('version')]
+    return len(sales), max(versions, default=None)
+
+def seed_sales_watermark(supabase: Client, version: int):
+    """Start incremental sales syncs from the newest window instead of version 0, unless already set.
+    
+    Anything modified later gets a higher version, and older windows are fetched by date.
+    """
+    for entity_type in ('sales', 'sale_line_items'):
+        result = supabase.table('sync_state').select('last_version').eq('entity_type', entity_type) \
+            .eq('account', DEFAULT_ACCOUNT).execute()
+        if result.data and result.data[0].get('last_version') is not None:
+            continue
+        update_sync_state(supabase, entity_type, 'success', highest_version=version)
+
+def import_progressive(lightspeed, supabase, window_days: int, since: Optional[datetime] = None,
+                       pool: Optional[TransformPool] = None) -> bool:
+    """Load the newest sales window first so the dashboard is usable, then older windows."""
+    newest_start, _ = next(iter_windows(datetime.now(timezone.utc), window_days, since))
+    versions = []
+    
+    def load_window(start: datetime, end: datetime) -> Tuple[int, Optional[int]]:
+        sales, highest_version = import_sales_window(lightspeed, supabase, start, end)
+        if highest_version is not None:
+            versions.append(highest_version)
+        return sales, highest_version
+    
+    # Dashboard first: the small dimensions and the most recent window of sales
+    imported = [import_entity(lightspeed, supabase, entity_type, pool) for entity_type in ('outlets', 'products')]
+    _, failed = backfill_windows(supabase, load_window, window_days, oldest=newest_start)
+    if versions:
+        seed_sales_watermark(supabase, max(versions))
+    if not failed:
+        print(f"📊 Sales since {newest_start.date()} are loaded; the dashboard is usable while older windows load")
+    
+    # Then everything else, oldest windows last
+    imported += [import_entity(lightspeed, supabase, entity_type, pool) for entity_type in ('customers', 'inventory')]
+    loaded, older_failed = backfill_windows(supabase, load_window, window_days, oldest=since)
+    print(f"📅 Loaded {loaded} older sales windows" + (f", {older_failed} failed" if older_failed else ""))
+    return all(imported) and not failed and not older_failed
+
 def main():
     """Main import function."""
     load_dotenv('.env.local')
     
+    parser = argparse.ArgumentParser(description="Historical Lightspeed to Supabase import")
+    parser.add_argument('--profile', nargs='?', const='all', choices=['all', 'cpu'],
+                        help="write per-entity sampled stacks (and, unless 'cpu', allocation reports) "
+                             "to profiles/ next to the log")
+    parser.add_argument('--workers', type=int, nargs='?', const=os.cpu_count(), default=0,
+                        help="decode and transform pages in this many processes (all cores if no value)")
+    parser.add_argument('--progressive', type=int, nargs='?', const=DEFAULT_WINDOW_DAYS, default=0, metavar='DAYS',
+                        help="load sales newest first in windows of DAYS days (default %(const)s), tracked in sync_state")
+    parser.add_argument('--since', type=lambda value: datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc),
+                        help="with --progressive, oldest sale date to load (YYYY-MM-DD; default: until the history runs out)")
+    args = parser.parse_args()
+    profiler = start_profiler(LOG_FILE, args.profile) if args.profile else None
+    pool = None
+    
     print("🚀 Starting Historical Data Import")
     print("=" * 50)
     
@@ -291,18 +441,41 @@ def main():
         
         logger.info("✅ API connections successful")
         
+        if args.workers > 1:
+            if lightspeed.raw_dir:
+                # The landing zone and replay need decoded records in this process
+                logger.warning("--workers is ignored while LIGHTSPEED_RAW_DIR is set")
+            else:
+                pool = TransformPool(args.workers)
+        
+        # Imported here so incremental_sync does not set up logging before this script does
+        from incremental_sync import refresh_sync_performance
+        
+        if args.progressive:
+            succeeded = import_progressive(lightspeed, supabase, args.progressive, args.since, pool)
+            refresh_sync_performance(supabase)
+            if succeeded:
+                print("\n🎉 Progressive import complete! Check your dashboard at http://127.0.0.1:5001")
+            else:
+                print("\n⚠️  Some imports or windows failed; rerun with --progressive to retry them.")
+            return succeeded
+        
         # Import entities in order (dependencies first)
         entities = ['outlets', 'customers', 'products', 'sales', 'inventory']
         success_count = 0
         
         for entity_type in entities:
             logger.info(f"\n📦 Importing {entity_type}...")
-            if import_entity(lightspeed, supabase, entity_type):
+            with profile_entity(profiler, entity_type):
+                succeeded = import_entity(lightspeed, supabase, entity_type, pool)
+            if succeeded:
                 success_count += 1
                 print(f"✅ {entity_type.title()} import completed")
             else:
                 print(f"❌ {entity_type.title()} import failed")
         
+        refresh_sync_performance(supabase)
+        
         # Summary
         total_count = len(entities)
         logger.info(f"\n🎉 Historical import complete: {success_count}/{total_count} succeeded")
@@ -318,6 +491,13 @@ def main():
         logger.error(f"Fatal error during import: {e}")
         print(f"\n❌ Import failed: {e}")
         return False
+    
+    finally:
+        if pool:
+            pool.close()
+        telemetry.write_textfile('historical_import')
+        if profiler:
+            profiler.stop()
 
 if __name__ == "__main__":
     success = main()
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Expiring leases so each (entity, shard) is synced by exactly one worker.
+A worker acquires the lease before syncing and a heartbeat thread renews it;
+if the worker dies, the lease expires and the next worker takes it over.
+Set SYNC_LEASE_BACKEND=supabase (after running script/create_sync_leases.sql)
+to coordinate cron runs, daemons and other hosts; 'memory' only coordinates
+threads within one process and is used for local testing.
+"""
+
+import os
+import uuid
+import time
+import socket
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds a lease lasts without a heartbeat
+DEFAULT_LEASE_TTL = 300
+
+class LeaseLostError(Exception):
+    """Raised when a worker no longer owns the lease it is working under."""
+    pass
+
+def lease_resource(entity_type: str, account: Optional[str] = None, shard: Optional[str] = None) -> str:
+    """Return the lease name for an entity, e.g. 'downtown/sales#2024-01'."""
+    resource = f"{account}/{entity_type}" if account else entity_type
+    return f"{resource}#{shard}" if shard else resource
+
+def default_owner() -> str:
+    """Return a worker id that is unique across hosts and processes."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+class MemoryLeaseBackend:
+    """In-process lease table with the same semantics as the SQL functions."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        """Initialize an empty lease table; clock can be replaced to test expiry."""
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.leases: Dict[str, Dict] = {}
+
+    def acquire(self, resource: str, owner: str, ttl_seconds: float) -> bool:
+        """Take the lease if it is free, expired or already ours."""
+        with self.lock:
+            now = self.clock()
+            lease = self.leases.get(resource)
+            if lease and lease['owner'] != owner and lease['expires_at'] > now:
+                return False
+            self.leases[resource] = {'owner': owner, 'expires_at': now + ttl_seconds}
+            return True
+
+    def renew(self, resource: str, owner: str, ttl_seconds: float) -> bool:
+        """Extend our lease; False if another worker has taken it over."""
+        with self.lock:
+            lease = self.leases.get(resource)
+            if not lease or lease['owner'] != owner:
+                return False
+            lease['expires_at'] = self.clock() + ttl_seconds
+            return True
+
+    def release(self, resource: str, owner: str) -> bool:
+        """Drop our lease."""
+        with self.lock:
+            lease = self.leases.get(resource)
+            if not lease or lease['owner'] != owner:
+                return False
+            del self.leases[resource]
+            return True
+
+    def holder(self, resource: str) -> Optional[str]:
+        """Return the current unexpired owner of a lease."""
+        with self.lock:
+            lease = self.leases.get(resource)
+            return lease['owner'] if lease and lease['expires_at'] > self.clock() else None
+
+class SupabaseLeaseBackend:
+    """Leases in the sync_leases table, changed only through its SQL functions."""
+
+    def __init__(self, supabase):
+        """Initialize with a Supabase client."""
+        self.supabase = supabase
+
+    def _call(self, function: str, params: Dict) -> bool:
+        """Call a lease function and return its boolean result."""
+        return bool(self.supabase.rpc(function, params).execute().data)
+
+    def acquire(self, resource: str, owner: str, ttl_seconds: float) -> bool:
+        """Take the lease if it is free, expired or already ours."""
+        return self._call('acquire_sync_lease', {'p_resource': resource, 'p_owner': owner,
+                                                 'p_ttl_seconds': int(ttl_seconds)})
+
+    def renew(self, resource: str, owner: str, ttl_seconds: float) -> bool:
+        """Extend our lease; False if another worker has taken it over."""
+        return self._call('renew_sync_lease', {'p_resource': resource, 'p_owner': owner,
+                                               'p_ttl_seconds': int(ttl_seconds)})
+
+    def release(self, resource: str, owner: str) -> bool:
+        """Drop our lease."""
+        return self._call('release_sync_lease', {'p_resource': resource, 'p_owner': owner})
+
+    def holder(self, resource: str) -> Optional[str]:
+        """Return the current unexpired owner of a lease."""
+        result = self.supabase.table('sync_leases').select('owner, expires_at') \
+            .eq('resource', resource).gt('expires_at', datetime.now(timezone.utc).isoformat()).execute()
+        return result.data[0]['owner'] if result.data else None
+
+class Lease:
+    """One worker's claim on a resource, renewed by a heartbeat thread while held."""
+
+    def __init__(self, backend, resource: str, owner: Optional[str] = None, ttl_seconds: float = DEFAULT_LEASE_TTL):
+        """Initialize the lease; call acquire() to take it."""
+        self.backend = backend
+        self.resource = resource
+        self.owner = owner or default_owner()
+        self.ttl_seconds = ttl_seconds
+        self.lost = threading.Event()
+        self.stop_event = threading.Event()
+        self.heartbeat_thread = None
+
+    def acquire(self) -> bool:
+        """Take the lease and start heartbeats; False if another worker holds it."""
+        if not self.backend.acquire(self.resource, self.owner, self.ttl_seconds):
+            return False
+        self.lost.clear()
+        self.stop_event.clear()
+        self.heartbeat_thread = threading.Thread(target=self._heartbeat, name=f'lease-{self.resource}', daemon=True)
+        self.heartbeat_thread.start()
+        logger.info(f"🔒 Acquired lease {self.resource} as {self.owner}")
+        return True
+
+    def _heartbeat(self):
+        """Renew the lease three times per TTL until released or lost."""
+        while not self.stop_event.wait(self.ttl_seconds / 3):
+            try:
+                renewed = self.backend.renew(self.resource, self.owner, self.ttl_seconds)
+            except Exception as e:
+                # A missed heartbeat is survivable until the lease actually expires
+                logger.warning(f"Lease heartbeat for {self.resource} failed: {e}")
+                continue
+            if not renewed:
+                logger.error(f"Lost lease {self.resource}; another worker has taken it over")
+                self.lost.set()
+                return
+
+    def check(self):
+        """Raise LeaseLostError if the lease has been taken over."""
+        if self.lost.is_set():
+            raise LeaseLostError(f"Lease {self.resource} was taken over by another worker")
+
+    def release(self):
+        """Stop heartbeats and give the lease up."""
+        self.stop_event.set()
+        if self.heartbeat_thread:
+            self.heartbeat_thread.join()
+            self.heartbeat_thread = None
+        try:
+            self.backend.release(self.resource, self.owner)
+        except Exception as e:
+            # The lease simply expires if it cannot be released
+            logger.warning(f"Failed to release lease {self.resource}: {e}")
+        logger.info(f"🔓 Released lease {self.resource}")
+
+    def holder(self) -> Optional[str]:
+        """Return who currently holds the resource."""
+        return self.backend.holder(self.resource)
+
+_memory_backend = None
+
+def get_lease_backend(supabase=None):
+    """Return the backend selected by SYNC_LEASE_BACKEND, or None when leasing is off."""
+    global _memory_backend
+    name = os.environ.get('SYNC_LEASE_BACKEND', 'off').lower()
+    if name in ('', 'off', 'none'):
+        return None
+    if name == 'memory':
+        if _memory_backend is None:
+            _memory_backend = MemoryLeaseBackend()
+        return _memory_backend
+    if name == 'supabase':
+        if supabase is None:
+            raise ValueError("SYNC_LEASE_BACKEND=supabase requires a Supabase client")
+        return SupabaseLeaseBackend(supabase)
+    raise ValueError(f"Unknown SYNC_LEASE_BACKEND '{name}' (expected supabase, memory or off)")
+
+def entity_lease(supabase, entity_type: str, account: Optional[str] = None,
+                 shard: Optional[str] = None) -> Optional[Lease]:
+    """Return an unacquired lease for an entity, or None when leasing is off."""
+    backend = get_lease_backend(supabase)
+    if backend is None:
+        return None
+    ttl_seconds = float(os.environ.get('SYNC_LEASE_TTL', DEFAULT_LEASE_TTL))
+    return Lease(backend, lease_resource(entity_type, account, shard), ttl_seconds=ttl_seconds)
@@ -5,18 +5,56 @@ Handles authentication, rate limiting, and data fetching for all entity types.
 """
 
 import os
+import re
+import json
 import time
 import requests
-from typing import Dict, List, Optional, Any
+import threading
+from typing import Callable, Dict, Iterator, List, Optional, Any
 from datetime import datetime, timezone
 import logging
 
+import telemetry
+from rate_budget import create_scheduler, request_entity
+
 logger = logging.getLogger(__name__)
 
+# Collection responses end with {"version": {"min": ..., "max": ...}}; record versions are plain ints
+PAGE_VERSION_PATTERN = re.compile(rb'"version"\s*:\s*\{[^{}]*?"max"\s*:\s*(\d+)')
+
 class LightspeedAPIError(Exception):
     """Custom exception for Lightspeed API errors."""
     pass
 
+class LightspeedNotFoundError(LightspeedAPIError):
+    """The requested record does not exist (it may have been deleted)."""
+    pass
+
+def page_max_version(body: bytes) -> Optional[int]:
+    """Read a page's highest version from the raw body without decoding the records.
+    
+    Only the part after the data array is searched, so a nested "version" object inside a
+    record can never be taken for the page summary; None tells the caller to decode instead.
+    """
+    data_end = body.rfind(b']')
+    if data_end < 0:
+        return None
+    match = PAGE_VERSION_PATTERN.search(body, data_end)
+    return int(match.group(1)) if match else None
+
+def new_request_stats() -> Dict[str, float]:
+    """Return zeroed cumulative request counters for a client."""
+    return {
+        'requests': 0,
+        'pages': 0,
+        'retries': 0,
+        'bytes_in': 0,
+        'http_seconds': 0.0,
+        'json_decode_seconds': 0.0,
+        'throttle_wait_seconds': 0.0,  # Blocked in _rate_limit
+        'retry_wait_seconds': 0.0  # Waiting out 429 responses
+    }
+
 class LightspeedClient:
     """Client for interacting with Lightspeed Retail API."""
     
@@ -36,28 +74,115 @@ class LightspeedClient:
         # Rate limiting - Lightspeed: 300 x registers + 50 per 5-minute window  
         self.last_request_time = 0
         self.min_request_interval = 1.0  # 1 second between requests to be safe
+        self.backoff_until = 0.0  # After a 429, no cursor sends before this time
         self.rate_limit_remaining = None
+        self.stats = new_request_stats()
+        self.lock = threading.Lock()  # Guards the request schedule and stats when cursors run in parallel
         
-    def _rate_limit(self):
-        """Implement basic rate limiting."""
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+        # Rate-budget scheduler deciding which entity may spend requests, set by create_lightspeed_client
+        self.scheduler = None
         
-        if time_since_last < self.min_request_interval:
-            sleep_time = self.min_request_interval - time_since_last
-            time.sleep(sleep_time)
-            
-        self.last_request_time = time.time()
+        # Raw landing zone directory, set by create_lightspeed_client
+        self.raw_dir = None
+        
+        # Callbacks invoked with (endpoint, page_data) for every fetched page
+        self.page_listeners: List[Callable[[str, List[Dict]], None]] = []
+        
+    def add_page_listener(self, listener: Callable[[str, List[Dict]], None]):
+        """Register a callback that receives every page fetched from the API."""
+        self.page_listeners.append(listener)
+    
+    def remove_page_listener(self, listener: Callable[[str, List[Dict]], None]):
+        """Unregister a page listener."""
+        if listener in self.page_listeners:
+            self.page_listeners.remove(listener)
+    
+    @property
+    def rate_limit_wait_seconds(self) -> float:
+        """Total time spent waiting on rate limits, proactive and 429."""
+        return self.stats['throttle_wait_seconds'] + self.stats['retry_wait_seconds']
+    
+    def _notify_page(self, endpoint: str, data: List[Dict]):
+        """Pass a fetched page to listeners without letting them break the fetch."""
+        with self.lock:
+            self.stats['pages'] += 1
+        for listener in self.page_listeners:
+            try:
+                listener(endpoint, data)
+            except Exception as e:
+                logger.warning(f"Page listener failed for {endpoint}: {e}")
+        
+    def _reserve_slot(self) -> float:
+        """Claim the next free request time; the caller holds self.lock."""
+        slot = max(time.time(), self.last_request_time + self.min_request_interval, self.backoff_until)
+        self.last_request_time = slot
+        return slot
+    
+    def _rate_limit(self, reason: str = 'throttle'):
+        """Space requests min_request_interval apart, also across threads sharing the client.
+        
+        reason labels the wait: 'throttle', or 'retry_after' when retrying a 429.
+        """
+        # Reserve the next free slot, then wait for it outside the lock
+        with self.lock:
+            slot = self._reserve_slot()
+        
+        waited = 0.0
+        while True:
+            sleep_time = slot - time.time()
+            if sleep_time > 0:
+                time.sleep(sleep_time)
+                waited += sleep_time
+            with self.lock:
+                # A 429 seen by another cursor while this one slept holds it back too
+                if slot >= self.backoff_until:
+                    break
+                slot = self._reserve_slot()
+        
+        if waited > 0:
+            with self.lock:
+                self.stats['retry_wait_seconds' if reason == 'retry_after' else 'throttle_wait_seconds'] += waited
+            telemetry.record_rate_limit_wait(waited, reason)
+    
+    def _timed_get(self, endpoint: str, url: str, params: Optional[Dict]) -> requests.Response:
+        """GET a URL, recording request time and response size."""
+        start = time.perf_counter()
+        response = self.session.get(url, params=params, timeout=30)
+        elapsed = time.perf_counter() - start
+        if self.scheduler:
+            self.scheduler.observe(response.headers)
+        with self.lock:
+            self.stats['http_seconds'] += elapsed
+            self.stats['requests'] += 1
+            self.stats['bytes_in'] += len(response.content)
+        telemetry.record_request(endpoint, response.status_code, elapsed,
+                                 response.headers.get('X-RateLimit-Remaining'))
+        return response
+    
+    def _decode(self, response: requests.Response) -> Dict[str, Any]:
+        """Decode a JSON response, recording the time spent."""
+        start = time.perf_counter()
+        data = response.json()
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.stats['json_decode_seconds'] += elapsed
+        return data
     
     def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Dict[str, Any]:
         """Make a request to the Lightspeed API with error handling."""
+        return self._decode(self._fetch(endpoint, params))
+    
+    def _fetch(self, endpoint: str, params: Optional[Dict] = None) -> requests.Response:
+        """Make a request and return the successful response without decoding it."""
+        if self.scheduler:
+            self.scheduler.acquire(request_entity(endpoint, params))
         self._rate_limit()
         
         url = f"{self.base_url}/api/{endpoint}"
         
         try:
             logger.debug(f"Making request to: {url}")
-            response = self.session.get(url, params=params, timeout=30)
+            response = self._timed_get(endpoint, url, params)
             
             # Check rate limit headers
             self.rate_limit_remaining = response.headers.get('X-RateLimit-Remaining')
@@ -65,19 +190,25 @@ class LightspeedClient:
                 logger.debug(f"Rate limit remaining: {self.rate_limit_remaining}")
             
             if response.status_code == 200:
-                return response.json()
+                return response
             elif response.status_code == 401:
                 raise LightspeedAPIError("Authentication failed - check bearer token")
+            elif response.status_code == 404:
+                raise LightspeedNotFoundError(f"Not found: {endpoint}")
             elif response.status_code == 429:
                 # Rate limited - check Retry-After header
                 retry_after = response.headers.get('Retry-After', '300')  # Default 5 minutes
                 wait_time = int(retry_after)
                 logger.warning(f"Rate limited, waiting {wait_time} seconds before retry")
-                time.sleep(wait_time)
+                with self.lock:
+                    # Back off every cursor sharing this client, not just this one
+                    self.backoff_until = max(self.backoff_until, time.time() + wait_time)
+                    self.stats['retries'] += 1
+                self._rate_limit('retry_after')
                 
-                response = self.session.get(url, params=params, timeout=30)
+                response = self._timed_get(endpoint, url, params)
                 if response.status_code == 200:
-                    return response.json()
+                    return response
                 else:
                     raise LightspeedAPIError(f"Rate limit retry failed: {response.status_code}")
             else:
@@ -110,6 +241,7 @@ class LightspeedClient:
                 if not data:  # Empty collection means we're done
                     break
                     
+                self._notify_page(endpoint, data)
                 all_data.extend(data)
                 
                 # Get the highest version number for next page
@@ -142,6 +274,7 @@ class LightspeedClient:
                 if isinstance(data, list):
                     if not data:  # Empty page means we're done
                         break
+                    self._notify_page(endpoint, data)
                     all_data.extend(data)
                     
                     # Check pagination metadata if available
@@ -163,6 +296,45 @@ class LightspeedClient:
         logger.info(f"Fetched {len(all_data)} records from {endpoint}")
         return all_data
     
+    def iter_raw_pages(self, endpoint: str, params: Optional[Dict] = None) -> Iterator[bytes]:
+        """Yield the raw body of every page of a 2.0 endpoint, leaving decoding to the caller.
+        
+        The cursor comes from the page's version.max, so records are not decoded here.
+        Page listeners are not called; callers report progress once pages are decoded.
+        """
+        after_version = (params or {}).get('after')
+        
+        while True:
+            current_params = dict(params or {})
+            if after_version:
+                current_params['after'] = after_version
+            
+            logger.info(f"Fetching {endpoint} (after version: {after_version})")
+            body = self._fetch(endpoint, current_params).content
+            
+            next_version = page_max_version(body)
+            if next_version is None:
+                # No version summary (e.g. the empty final page): fall back to decoding
+                data = json.loads(body).get('data', [])
+                versions = [item.get('version') for item in data if item.get('version')]
+                if not versions:
+                    if data:
+                        with self.lock:
+                            self.stats['pages'] += 1
+                        yield body
+                    break
+                next_version = max(versions)
+            
+            with self.lock:
+                self.stats['pages'] += 1
+            yield body
+            
+            # Safety check to prevent infinite loops
+            if after_version and next_version <= int(after_version):
+                logger.warning(f"Version cursor for {endpoint} stopped advancing at {next_version}")
+                break
+            after_version = next_version
+    
     def get_customers(self, after_version: Optional[int] = None) -> List[Dict]:
         """Fetch customer data using version-based pagination."""
         params = {}
@@ -194,6 +366,71 @@ class LightspeedClient:
             
         return self._get_paginated_data('2.0/sales', params)
     
+    def search_sales(self, date_from: str, date_to: str, page_size: int = 1000) -> List[Dict]:
+        """Fetch the sales created in [date_from, date_to) through the search endpoint."""
+        params = {'type': 'sales', 'date_from': date_from, 'date_to': date_to, 'page_size': page_size}
+        all_data = []
+        
+        while True:
+            logger.info(f"Searching sales from {date_from} to {date_to} (offset: {len(all_data)})")
+            data = self._make_request('2.0/search', {**params, 'offset': len(all_data)}).get('data', [])
+            if not data:
+                break
+            self._notify_page('2.0/search', data)
+            all_data.extend(data)
+            if len(data) < page_size:
+                break
+        
+        logger.info(f"Found {len(all_data)} sales from {date_from} to {date_to}")
+        return all_data
+    
+    def get_version_range(self, endpoint: str, after_version: int, until_version: Optional[int] = None,
+                          page_size: Optional[int] = None) -> List[Dict]:
+        """Fetch the records of a 2.0 endpoint with versions in (after_version, until_version].
+        
+        Without until_version the cursor runs to the end of the collection.
+        """
+        all_data = []
+        
+        while until_version is None or after_version < until_version:
+            params = {'after': after_version}
+            if page_size:
+                params['page_size'] = page_size
+            logger.info(f"Fetching {endpoint} (after version: {after_version}, until: {until_version})")
+            data = self._make_request(endpoint, params).get('data', [])
+            versions = [item.get('version') for item in data if item.get('version')]
+            if not versions:
+                break
+            self._notify_page(endpoint, data)
+            if until_version is None:
+                all_data.extend(data)
+            else:
+                all_data.extend(item for item in data if (item.get('version') or 0) <= until_version)
+            after_version = max(versions)
+        
+        logger.info(f"Fetched {len(all_data)} records from {endpoint} with versions up to {until_version or 'the end'}")
+        return all_data
+    
+    def get_sales_version_range(self, after_version: int, until_version: int) -> List[Dict]:
+        """Fetch the sales with versions in (after_version, until_version]."""
+        return self.get_version_range('2.0/sales', after_version, until_version)
+    
+    def get_sale(self, sale_id: str) -> Dict:
+        """Fetch a single sale, including its line items."""
+        return self._make_request(f'2.0/sales/{sale_id}').get('data', {})
+    
+    def get_product(self, product_id: str) -> Dict:
+        """Fetch a single product."""
+        return self._make_request(f'2.0/products/{product_id}').get('data', {})
+    
+    def get_customer(self, customer_id: str) -> Dict:
+        """Fetch a single customer."""
+        return self._make_request(f'2.0/customers/{customer_id}').get('data', {})
+    
+    def get_product_inventory(self, product_id: str) -> List[Dict]:
+        """Fetch the inventory records of one product across outlets."""
+        return self._make_request(f'2.0/products/{product_id}/inventory').get('data', [])
+    
     def get_inventory(self) -> List[Dict]:
         """Fetch inventory data."""
         return self._get_paginated_data('2.0/inventory')
@@ -207,12 +444,49 @@ class LightspeedClient:
         except LightspeedAPIError:
             return False
 
-def create_lightspeed_client() -> LightspeedClient:
-    """Create a Lightspeed client using environment variables."""
-    base_url = os.environ.get('LIGHTSPEED_BASE_URL')
-    bearer_token = os.environ.get('LIGHTSPEED_BEARER_TOKEN')
+def create_lightspeed_client(account: Optional[Dict] = None, rate_budget: bool = False) -> LightspeedClient:
+    """Create a Lightspeed client using environment variables, or for one configured account.
+    
+    LIGHTSPEED_RAW_DIR enables the local Parquet landing zone for fetched pages.
+    LIGHTSPEED_REPLAY=1 serves data from that landing zone instead of the API.
+    Accounts (see accounts.py) get their own rate limit and landing zone subdirectory.
+    rate_budget attaches the rate-budget scheduler, for callers whose entity crawls compete
+    for the limit (the daemon); SYNC_RATE_BUDGET=on/off overrides it.
+    """
+    raw_dir = os.environ.get('LIGHTSPEED_RAW_DIR')
+    replay = os.environ.get('LIGHTSPEED_REPLAY', '').lower() in ('1', 'true', 'yes')
+    if raw_dir and account:
+        raw_dir = os.path.join(raw_dir, f"account={account['name']}")
+    
+    if replay:
+        if not raw_dir:
+            raise ValueError("LIGHTSPEED_REPLAY requires LIGHTSPEED_RAW_DIR")
+        from raw_store import RawPageStore, ReplayLightspeedClient
+        logger.info(f"Replaying Lightspeed data from {raw_dir}")
+        return ReplayLightspeedClient(RawPageStore(raw_dir))
+    
+    if account:
+        base_url = account['base_url']
+        bearer_token = account['bearer_token']
+    else:
+        base_url = os.environ.get('LIGHTSPEED_BASE_URL')
+        bearer_token = os.environ.get('LIGHTSPEED_BEARER_TOKEN')
     
     if not base_url or not bearer_token:
         raise ValueError("Missing LIGHTSPEED_BASE_URL or LIGHTSPEED_BEARER_TOKEN environment variables")
     
-    return LightspeedClient(base_url, bearer_token)
\ No newline at end of file
+    client = LightspeedClient(base_url, bearer_token)
+    if account:
+        client.min_request_interval = 1.0 / account['requests_per_second']
+    # A sequential sync only competes with itself, so pausing lower-priority crawls just stalls it
+    setting = os.environ.get('SYNC_RATE_BUDGET', '').lower()
+    if setting in ('on', '1', 'true') or (rate_budget and setting not in ('off', '0', 'false')):
+        client.scheduler = create_scheduler()
+    
+    if raw_dir:
+        from raw_store import RawPageStore
+        client.add_page_listener(RawPageStore(raw_dir).write_page)
+        client.raw_dir = raw_dir
+        logger.info(f"Landing raw Lightspeed pages in {raw_dir}")
+    
+    return client
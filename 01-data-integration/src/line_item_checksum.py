@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Checksum of the line item ids Lightspeed reports for a sale.
+Stored on lightspeed_sales at sync time and recomputed server-side from
+lightspeed_sale_line_items (see script/create_reconciliation_functions.sql),
+so reconciliation catches wrong or missing items, not just wrong counts.
+"""
+
+import hashlib
+from typing import Dict, List, Optional
+
+def line_item_ids_md5(line_items: Optional[List[Dict]]) -> str:
+    """Return md5 of the sale's line item ids, sorted bytewise and joined with ','."""
+    ids = sorted(str(item.get('id')) for item in line_items or [] if item.get('id') is not None)
+    return hashlib.md5(','.join(ids).encode()).hexdigest()
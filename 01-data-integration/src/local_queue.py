@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Durable local queues backed by SQLite in WAL mode.
+ChangeQueue holds record ids announced by Lightspeed webhooks until the webhook
+worker has fetched and upserted them. Repeated notifications for the same record
+coalesce into one pending row. BatchQueue sits between the sync's fetch and load
+stages so a Supabase outage delays loads instead of losing fetched data.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_PATH = 'webhook_queue.db'
+
+# Seconds a claimed row stays invisible to other workers before it is handed out again
+DEFAULT_LEASE_SECONDS = 120
+
+# Failed rows are retried with exponential backoff and dropped after this many attempts
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 600
+
+class SQLiteStore:
+    """Thread-local SQLite connections to one WAL-mode database file."""
+
+    def __init__(self, path: str):
+        """Open (and create if needed) the database at path."""
+        self.path = path
+        self.local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._create_schema(self.connection())
+
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's connection."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            # FULL keeps acknowledged work on disk even across a power loss
+            conn.execute('PRAGMA synchronous=FULL')
+            self.local.conn = conn
+        return conn
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Create tables; subclasses add their own."""
+        pass
+
+class ChangeQueue(SQLiteStore):
+    """Coalescing queue of (entity_type, record_id) pairs waiting to be synced."""
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Create the pending_changes table."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS pending_changes (
+                entity_type TEXT NOT NULL,
+                record_id TEXT NOT NULL,
+                received_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                PRIMARY KEY (entity_type, record_id)
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_pending_changes_available "
+                     "ON pending_changes (entity_type, available_at)")
+
+    def enqueue(self, entity_type: str, record_ids: List[str]) -> int:
+        """Add ids, merging with any pending notification for the same record."""
+        now = time.time()
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany("""
+                INSERT INTO pending_changes (entity_type, record_id, received_at, available_at)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (entity_type, record_id) DO UPDATE SET
+                    received_at = excluded.received_at,
+                    available_at = min(pending_changes.available_at, excluded.available_at),
+                    attempts = 0,
+                    last_error = NULL
+            """, [(entity_type, str(record_id), now, now) for record_id in record_ids])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(record_ids)
+
+    def claim(self, entity_type: str, limit: int, settle_seconds: float = 0.0,
+              lease_seconds: float = DEFAULT_LEASE_SECONDS) -> List[Tuple[str, float]]:
+        """Lease up to limit ids that have been quiet for settle_seconds.
+
+        Returns (record_id, received_at) pairs to pass back to ack() or fail().
+        """
+        now = time.time()
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            rows = conn.execute("""
+                SELECT record_id, received_at FROM pending_changes
+                WHERE entity_type = ? AND available_at <= ? AND received_at <= ?
+                ORDER BY received_at
+                LIMIT ?
+            """, (entity_type, now, now - settle_seconds, limit)).fetchall()
+            conn.executemany("UPDATE pending_changes SET available_at = ? WHERE entity_type = ? AND record_id = ?",
+                             [(now + lease_seconds, entity_type, record_id) for record_id, _ in rows])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return rows
+
+    def ack(self, entity_type: str, claimed: List[Tuple[str, float]]):
+        """Remove synced ids, keeping any that were re-notified while being processed."""
+        conn = self.connection()
+        conn.executemany("DELETE FROM pending_changes WHERE entity_type = ? AND record_id = ? AND received_at = ?",
+                         [(entity_type, record_id, received_at) for record_id, received_at in claimed])
+
+    def fail(self, entity_type: str, claimed: List[Tuple[str, float]], error: str):
+        """Schedule failed ids for a retry with backoff, dropping them after MAX_ATTEMPTS."""
+        now = time.time()
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for record_id, _ in claimed:
+                row = conn.execute("SELECT attempts FROM pending_changes WHERE entity_type = ? AND record_id = ?",
+                                   (entity_type, record_id)).fetchone()
+                if row is None:
+                    continue
+                attempts = row[0] + 1
+                if attempts >= MAX_ATTEMPTS:
+                    logger.error(f"Dropping {entity_type} {record_id} after {attempts} failed attempts: {error}")
+                    conn.execute("DELETE FROM pending_changes WHERE entity_type = ? AND record_id = ?",
+                                 (entity_type, record_id))
+                    continue
+                backoff = min(MAX_BACKOFF_SECONDS, 5 * 2 ** attempts)
+                conn.execute("""
+                    UPDATE pending_changes SET attempts = ?, available_at = ?, last_error = ?
+                    WHERE entity_type = ? AND record_id = ?
+                """, (attempts, now + backoff, error[:500], entity_type, record_id))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def depth(self) -> Dict[str, int]:
+        """Return the number of pending ids per entity type."""
+        rows = self.connection().execute(
+            "SELECT entity_type, count(*) FROM pending_changes GROUP BY entity_type").fetchall()
+        return dict(rows)
+
+_change_queue = None
+
+def get_change_queue(path: Optional[str] = None) -> ChangeQueue:
+    """Return the process-wide change queue at WEBHOOK_QUEUE_PATH."""
+    global _change_queue
+    path = path or os.environ.get('WEBHOOK_QUEUE_PATH', DEFAULT_QUEUE_PATH)
+    if _change_queue is None or _change_queue.path != path:
+        _change_queue = ChangeQueue(path)
+    return _change_queue
+
+class BatchQueue(SQLiteStore):
+    """FIFO of transformed row batches and watermark markers between fetch and load.
+
+    Batches of one entity are handed out strictly in order, so a newer version of a
+    record is never overwritten by an older batch and a watermark is only reached
+    once every batch fetched before it has been loaded.
+    """
+
+    def _create_schema(self, conn: sqlite3.Connection):
+        """Create the load_batches table."""
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS load_batches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity_type TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                table_name TEXT,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT
+            )
+        """)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_load_batches_entity ON load_batches (entity_type, id)")
+
+    def _put(self, entity_type: str, kind: str, table_name: Optional[str], payload) -> int:
+        """Append one batch and return its id."""
+        now = time.time()
+        cursor = self.connection().execute("""
+            INSERT INTO load_batches (entity_type, kind, table_name, payload, created_at, available_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, (entity_type, kind, table_name, json.dumps(payload, default=str), now, now))
+        return cursor.lastrowid
+
+    def put_rows(self, entity_type: str, table_name: str, records: List[Dict]) -> int:
+        """Append a batch of transformed rows for table_name."""
+        return self._put(entity_type, 'rows', table_name, records)
+
+    def put_watermark(self, entity_type: str, highest_version: Optional[int]) -> int:
+        """Append a marker that advances sync_state once the batches before it are loaded."""
+        return self._put(entity_type, 'watermark', None, {'highest_version': highest_version})
+
+    def put_batches(self, entity_type: str, table_name: str, batches: List[List[Dict]],
+                    highest_version: Optional[int]) -> int:
+        """Append row batches and their watermark in one transaction; returns the batches queued.
+
+        A crash mid-enqueue leaves nothing behind, so a rerun never loads half a fetch twice.
+        """
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            for batch in batches:
+                self._put(entity_type, 'rows', table_name, batch)
+            self._put(entity_type, 'watermark', None, {'highest_version': highest_version})
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return len(batches)
+
+    def claim(self, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> Optional[Dict]:
+        """Lease the oldest batch of any entity whose earlier batches are all acknowledged."""
+        now = time.time()
+        conn = self.connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute("""
+                SELECT b.id, b.entity_type, b.kind, b.table_name, b.payload, b.attempts
+                FROM load_batches b
+                JOIN (SELECT entity_type, min(id) AS head FROM load_batches GROUP BY entity_type) h
+                  ON b.id = h.head
+                WHERE b.available_at <= ?
+                ORDER BY b.id
+                LIMIT 1
+            """, (now,)).fetchone()
+            if row:
+                conn.execute("UPDATE load_batches SET available_at = ? WHERE id = ?", (now + lease_seconds, row[0]))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+        if not row:
+            return None
+        batch_id, entity_type, kind, table_name, payload, attempts = row
+        return {'id': batch_id, 'entity_type': entity_type, 'kind': kind, 'table': table_name,
+                'payload': json.loads(payload), 'attempts': attempts}
+
+    def ack(self, batch_id: int):
+        """Remove a loaded batch."""
+        self.connection().execute("DELETE FROM load_batches WHERE id = ?", (batch_id,))
+
+    def fail(self, batch_id: int, error: str):
+        """Retry a batch later; batches are never dropped, so the entity waits behind it."""
+        conn = self.connection()
+        row = conn.execute("SELECT attempts FROM load_batches WHERE id = ?", (batch_id,)).fetchone()
+        if row is None:
+            return
+        attempts = row[0] + 1
+        backoff = min(MAX_BACKOFF_SECONDS, 5 * 2 ** min(attempts, 10))
+        conn.execute("UPDATE load_batches SET attempts = ?, available_at = ?, last_error = ? WHERE id = ?",
+                     (attempts, time.time() + backoff, error[:500], batch_id))
+
+    def pending_watermark(self, entity_type: str) -> Optional[int]:
+        """Return the highest version queued but not yet loaded for an entity."""
+        rows = self.connection().execute(
+            "SELECT payload FROM load_batches WHERE entity_type = ? AND kind = 'watermark'",
+            (entity_type,)).fetchall()
+        versions = [json.loads(payload).get('highest_version') for (payload,) in rows]
+        versions = [int(v) for v in versions if v is not None]
+        return max(versions) if versions else None
+
+    def depth(self) -> Dict[str, int]:
+        """Return the number of queued batches per entity type."""
+        rows = self.connection().execute(
+            "SELECT entity_type, count(*) FROM load_batches GROUP BY entity_type").fetchall()
+        return dict(rows)
+
+_batch_queue = None
+
+def get_batch_queue(path: Optional[str] = None) -> Optional[BatchQueue]:
+    """Return the batch queue at SYNC_LOAD_QUEUE, or None when loads go straight to Supabase."""
+    global _batch_queue
+    path = path or os.environ.get('SYNC_LOAD_QUEUE')
+    if not path:
+        return None
+    if _batch_queue is None or _batch_queue.path != path:
+        _batch_queue = BatchQueue(path)
+    return _batch_queue
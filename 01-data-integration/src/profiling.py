@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Low-overhead profiling for sync runs (--profile).
+A background thread samples the main thread's stack about 100 times a second and
+writes collapsed stacks per entity (input for flamegraph.pl or speedscope), and
+tracemalloc snapshots taken around each entity produce a top-N allocation report.
+Sampling costs a few percent; tracemalloc slows allocation-heavy code noticeably,
+which is small next to the rate-limited fetches but can be skipped with mode 'cpu'.
+"""
+
+import os
+import sys
+import time
+import logging
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Seconds between stack samples
+DEFAULT_SAMPLE_INTERVAL = 0.01
+
+# Frames kept per allocation; one frame keeps tracemalloc overhead small
+TRACEMALLOC_FRAMES = 1
+
+# Allocation sites listed per entity
+DEFAULT_TOP_N = 25
+
+def _collapse(frame) -> str:
+    """Render a frame chain root-first as 'file:function;file:function'."""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+class SyncProfiler:
+    """Sampling CPU profiler plus tracemalloc reports, grouped by entity."""
+
+    def __init__(self, output_dir: str, interval: float = DEFAULT_SAMPLE_INTERVAL, top_n: int = DEFAULT_TOP_N,
+                 trace_allocations: bool = True):
+        """Profile the calling thread, writing results to output_dir."""
+        self.output_dir = output_dir
+        self.trace_allocations = trace_allocations
+        self.interval = interval
+        self.top_n = top_n
+        self.target_ident = threading.get_ident()
+        self.current_entity: Optional[str] = None
+        self.samples: Dict[str, Counter] = {}
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def start(self):
+        """Start sampling and allocation tracing."""
+        os.makedirs(self.output_dir, exist_ok=True)
+        if self.trace_allocations:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.thread = threading.Thread(target=self._run, name='sync-profiler', daemon=True)
+        self.thread.start()
+        logger.info(f"Profiling enabled, writing to {self.output_dir}")
+
+    def stop(self):
+        """Stop sampling and write the whole-run collapsed stacks."""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        if self.trace_allocations:
+            tracemalloc.stop()
+
+        total = Counter()
+        for samples in self.samples.values():
+            total.update(samples)
+        self._write_collapsed('all', total)
+        logger.info(f"Profile written to {self.output_dir}")
+
+    def _run(self):
+        """Sample the target thread's stack until stopped."""
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            if frame is None:
+                continue
+            entity = self.current_entity or 'other'
+            self.samples.setdefault(entity, Counter())[_collapse(frame)] += 1
+
+    def _write_collapsed(self, name: str, samples: Counter):
+        """Write samples in the collapsed stack format, one 'stack count' per line."""
+        path = os.path.join(self.output_dir, f"{name}.collapsed")
+        with open(path, 'w') as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def _write_allocations(self, name: str, before, after, duration: float):
+        """Write the top-N allocation sites that grew during an entity."""
+        filters = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+        stats = after.filter_traces(filters).compare_to(before.filter_traces(filters), 'lineno')
+        current, peak = tracemalloc.get_traced_memory()
+
+        path = os.path.join(self.output_dir, f"{name}-allocations.txt")
+        with open(path, 'w') as f:
+            f.write(f"Entity: {name}\n")
+            f.write(f"Duration: {duration:.1f}s\n")
+            f.write(f"Traced memory: current {current / 1024 / 1024:.1f} MiB, peak {peak / 1024 / 1024:.1f} MiB\n\n")
+            f.write(f"Top {self.top_n} allocation sites by growth:\n")
+            for stat in stats[:self.top_n]:
+                frame = stat.traceback[0]
+                f.write(f"{stat.size_diff / 1024:+10.1f} KiB {stat.count_diff:+8d} blocks  "
+                        f"{frame.filename}:{frame.lineno}\n")
+
+    @contextmanager
+    def entity(self, name: str):
+        """Attribute samples and allocations inside the block to an entity."""
+        self.current_entity = name
+        before = None
+        if self.trace_allocations:
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            before = tracemalloc.take_snapshot()
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            after = tracemalloc.take_snapshot() if before is not None else None
+            self.current_entity = None
+            try:
+                self._write_collapsed(name, self.samples.get(name, Counter()))
+                if before is not None:
+                    self._write_allocations(name, before, after, time.time() - start_time)
+            except OSError as e:
+                logger.warning(f"Failed to write profile for {name}: {e}")
+
+def start_profiler(log_path: str, mode: str = 'all') -> SyncProfiler:
+    """Start a profiler writing to profiles/<timestamp>/ next to the log file.
+
+    mode 'all' samples stacks and traces allocations; 'cpu' only samples stacks.
+    """
+    log_dir = os.path.dirname(os.path.abspath(log_path))
+    output_dir = os.path.join(log_dir, 'profiles', datetime.now().strftime('%Y%m%dT%H%M%S'))
+    profiler = SyncProfiler(output_dir, trace_allocations=(mode != 'cpu'))
+    profiler.start()
+    return profiler
+
+def profile_entity(profiler: Optional[SyncProfiler], name: str):
+    """Return the profiler's entity context, or a no-op when profiling is off."""
+    return profiler.entity(name) if profiler else nullcontext()
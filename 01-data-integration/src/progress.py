@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Live sync progress events for the monitoring dashboard.
+Sync processes publish small JSON events over UDP, fire-and-forget, so a sync
+never waits on the dashboard. The Flask app runs one subscriber that fans the
+events out to every open /stream connection.
+"""
+
+import os
+import json
+import time
+import queue
+import socket
+import logging
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# host:port the dashboard listens on for progress events; 'off' disables publishing
+DEFAULT_PROGRESS_ADDR = '127.0.0.1:5002'
+
+# Events buffered per open dashboard before the oldest are dropped
+SUBSCRIBER_QUEUE_SIZE = 200
+
+def get_progress_addr() -> Optional[Tuple[str, int]]:
+    """Return the configured progress address, or None when progress is disabled."""
+    value = os.environ.get('SYNC_PROGRESS_ADDR', DEFAULT_PROGRESS_ADDR).strip()
+    if not value or value.lower() == 'off':
+        return None
+    host, _, port = value.rpartition(':')
+    return (host or '127.0.0.1', int(port))
+
+class ProgressPublisher:
+    """Sends progress events as UDP datagrams."""
+
+    def __init__(self, addr: Tuple[str, int]):
+        """Create a non-blocking socket for addr."""
+        self.addr = addr
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setblocking(False)
+
+    def publish(self, event: Dict):
+        """Send one event; nobody listening is not an error."""
+        try:
+            self.sock.sendto(json.dumps(event, default=str).encode('utf-8'), self.addr)
+        except OSError as e:
+            logger.debug(f"Dropped progress event: {e}")
+
+_publisher = None
+
+def get_progress_publisher() -> Optional[ProgressPublisher]:
+    """Return the shared publisher, or None when SYNC_PROGRESS_ADDR is 'off'."""
+    global _publisher
+    addr = get_progress_addr()
+    if addr is None:
+        return None
+    if _publisher is None or _publisher.addr != addr:
+        _publisher = ProgressPublisher(addr)
+    return _publisher
+
+class ProgressReporter:
+    """Tracks and publishes the progress of one entity sync."""
+
+    def __init__(self, entity_type: str, lightspeed=None, publisher: Optional[ProgressPublisher] = None):
+        """Start tracking entity_type, following the pages fetched by lightspeed."""
+        self.entity_type = entity_type
+        self.lightspeed = lightspeed
+        self.publisher = publisher
+        self.start_time = time.time()
+        self.pages = 0
+        self.rows_fetched = 0
+        self.rows_upserted = 0
+        self.wait_baseline = self._client_wait_seconds()
+
+        if lightspeed is not None and publisher is not None:
+            lightspeed.add_page_listener(self.on_page)
+        self._emit('started')
+
+    def _client_wait_seconds(self) -> float:
+        """Return the client's cumulative rate-limit wait."""
+        return getattr(self.lightspeed, 'rate_limit_wait_seconds', 0.0) or 0.0
+
+    def _emit(self, phase: str, **fields):
+        """Publish the current counters with a phase."""
+        if self.publisher is None:
+            return
+        elapsed = time.time() - self.start_time
+        event = {
+            'entity_type': self.entity_type,
+            'phase': phase,
+            'pages': self.pages,
+            'rows_fetched': self.rows_fetched,
+            'rows_upserted': self.rows_upserted,
+            'rows_per_sec': round(self.rows_upserted / elapsed, 1) if elapsed > 0 else 0.0,
+            'rate_limit_wait_seconds': round(self._client_wait_seconds() - self.wait_baseline, 1),
+            'elapsed_seconds': round(elapsed, 1),
+            'pid': os.getpid(),
+            'timestamp': time.time()
+        }
+        event.update(fields)
+        self.publisher.publish(event)
+
+    def on_page(self, endpoint: str, data: List[Dict]):
+        """Page listener: count a fetched page."""
+        self.pages += 1
+        self.rows_fetched += len(data)
+        self._emit('fetching')
+
+    def upserted(self, count: int):
+        """Count rows written to Supabase."""
+        self.rows_upserted += count
+        self._emit('upserting')
+
+    def detach(self):
+        """Stop counting the client's pages, e.g. once another entity starts fetching with it."""
+        if self.lightspeed is not None and self.publisher is not None:
+            self.lightspeed.remove_page_listener(self.on_page)
+
+    def finish(self, status: str = 'completed', error: Optional[str] = None):
+        """Publish the final event and stop following the client."""
+        self.detach()
+        self._emit(status, error=error)
+
+def track_entity(entity_type: str, lightspeed=None) -> ProgressReporter:
+    """Start a progress reporter for one entity sync."""
+    return ProgressReporter(entity_type, lightspeed, get_progress_publisher())
+
+class ProgressHub:
+    """Receives progress events and fans them out to subscriber queues."""
+
+    def __init__(self, addr: Tuple[str, int]):
+        """Initialize the hub for addr; call start() to begin listening."""
+        self.addr = addr
+        self.latest: Dict[str, Dict] = {}
+        self.subscribers: List[queue.Queue] = []
+        self.listeners: List[Callable[[Dict], None]] = []
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def start(self) -> bool:
+        """Bind the UDP socket and start the receiver thread."""
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            sock.bind(self.addr)
+        except OSError as e:
+            logger.warning(f"Live progress disabled: cannot listen on {self.addr[0]}:{self.addr[1]} ({e})")
+            sock.close()
+            return False
+
+        self.thread = threading.Thread(target=self._run, args=(sock,), name='progress-hub', daemon=True)
+        self.thread.start()
+        logger.info(f"Listening for sync progress on {self.addr[0]}:{self.addr[1]}")
+        return True
+
+    def _run(self, sock: socket.socket):
+        """Receive events forever and hand them to every subscriber."""
+        while True:
+            payload, _ = sock.recvfrom(65535)
+            try:
+                event = json.loads(payload)
+                entity_type = event['entity_type']
+            except (ValueError, KeyError, TypeError):
+                continue
+
+            with self.lock:
+                self.latest[entity_type] = event
+                subscribers = list(self.subscribers)
+
+            for subscriber in subscribers:
+                self._offer(subscriber, event)
+
+            for listener in self.listeners:
+                try:
+                    listener(event)
+                except Exception as e:
+                    logger.warning(f"Progress listener failed: {e}")
+
+    @staticmethod
+    def _offer(subscriber: queue.Queue, event: Dict):
+        """Queue an event, dropping the oldest one if a slow client is behind."""
+        try:
+            subscriber.put_nowait(event)
+        except queue.Full:
+            try:
+                subscriber.get_nowait()
+            except queue.Empty:
+                pass
+            subscriber.put_nowait(event)
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Register a callback invoked on the receiver thread for every event."""
+        self.listeners.append(listener)
+
+    def subscribe(self) -> queue.Queue:
+        """Return a new subscriber queue primed with the latest event per entity."""
+        subscriber = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self.lock:
+            for event in self.latest.values():
+                subscriber.put_nowait(event)
+            self.subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        """Stop delivering events to a subscriber queue."""
+        with self.lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+_hub = None
+_hub_lock = threading.Lock()
+
+def get_progress_hub(listener: Optional[Callable[[Dict], None]] = None) -> Optional[ProgressHub]:
+    """Return the process-wide hub, starting it on first use."""
+    global _hub
+    addr = get_progress_addr()
+    if addr is None:
+        return None
+
+    with _hub_lock:
+        if _hub is None:
+            hub = ProgressHub(addr)
+            if listener:
+                hub.add_listener(listener)
+            hub.start()
+            _hub = hub
+    return _hub
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Loader workers for the local batch queue (SYNC_LOAD_QUEUE).
+The sync appends transformed batches and watermark markers to the queue; these
+workers upsert the batches into Supabase at their own pace, acknowledge them,
+and advance sync_state only when a watermark is reached. Batches survive
+restarts, so a Supabase outage delays loads instead of forcing a re-crawl.
+"""
+
+import os
+import sys
+import signal
+import logging
+import argparse
+import threading
+from typing import Dict, List
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from incremental_sync import create_supabase_client, batch_upsert, update_sync_state
+from analytics_snapshot import append_to_snapshot
+from local_queue import BatchQueue, get_batch_queue
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 2
+
+# Seconds an idle worker waits before looking for new batches
+IDLE_SECONDS = 2.0
+
+def load_batch(supabase, batch: Dict):
+    """Upsert a row batch, or advance sync_state for a watermark."""
+    if batch['kind'] == 'rows':
+        batch_upsert(supabase, batch['table'], batch['payload'])
+        append_to_snapshot(batch['table'], batch['payload'])
+    else:
+        # Multi-account batches are keyed '<account>/<entity_type>'
+        account, _, entity_type = batch['entity_type'].rpartition('/')
+        update_sync_state(supabase, entity_type, 'success', batch['payload'].get('highest_version'),
+                          account=account or None)
+
+class QueueLoader:
+    """Worker threads that drain the batch queue into Supabase."""
+
+    def __init__(self, supabase, queue: BatchQueue, workers: int = DEFAULT_WORKERS):
+        """Initialize the loader."""
+        self.supabase = supabase
+        self.queue = queue
+        self.workers = workers
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+
+    def process_one(self) -> bool:
+        """Load the next available batch; False when nothing is available."""
+        batch = self.queue.claim()
+        if batch is None:
+            return False
+        try:
+            load_batch(self.supabase, batch)
+        except Exception as e:
+            logger.error(f"Failed to load {batch['entity_type']} batch {batch['id']} "
+                         f"(attempt {batch['attempts'] + 1}): {e}")
+            self.queue.fail(batch['id'], str(e))
+            return True
+        self.queue.ack(batch['id'])
+        return True
+
+    def drain(self) -> Dict[str, int]:
+        """Load everything currently loadable and return what is left per entity."""
+        while self.process_one():
+            pass
+        remaining = self.queue.depth()
+        if remaining:
+            logger.warning(f"Batches left for a later load: {remaining}")
+        return remaining
+
+    def _run(self):
+        """Worker loop."""
+        while not self.stop_event.is_set():
+            if not self.process_one():
+                self.stop_event.wait(IDLE_SECONDS)
+
+    def start(self):
+        """Start the worker threads in the background."""
+        for index in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f'queue-loader-{index}', daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        logger.info(f"Started {self.workers} queue loader workers on {self.queue.path}")
+
+    def stop(self, *_):
+        """Stop the workers after their current batch."""
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+
+def main():
+    """Run loader workers until stopped, or drain once."""
+    load_dotenv('.env.local')
+
+    parser = argparse.ArgumentParser(description="Load queued sync batches into Supabase")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--once', action='store_true', help="drain what can be loaded now and exit")
+    args = parser.parse_args()
+
+    print("📥 Starting Queue Loader")
+    print("=" * 40)
+
+    try:
+        queue = get_batch_queue()
+        if queue is None:
+            raise ValueError("Missing SYNC_LOAD_QUEUE")
+
+        loader = QueueLoader(create_supabase_client(), queue, args.workers)
+        if args.once:
+            remaining = loader.drain()
+            print(f"✅ Queue drained, remaining: {remaining}")
+            return not remaining
+
+        stopped = threading.Event()
+        def shutdown(*_):
+            stopped.set()
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+
+        loader.start()
+        stopped.wait()
+        loader.stop()
+        return True
+
+    except Exception as e:
+        logger.error(f"Queue loader failed: {e}")
+        print(f"❌ Error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
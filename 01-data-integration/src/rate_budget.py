@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Priority-aware scheduling of the Lightspeed request budget across entities.
+Every request a LightspeedClient makes is charged to an entity (taken from the
+endpoint) before it is sent. When X-RateLimit-Remaining runs low, lower-priority
+crawls pause so the budget left is spent on sales, which the dashboard needs
+fresh. Priority 0 entities never pause; priority p pauses once fewer than
+p * SYNC_RATE_LOW_WATER requests remain.
+
+Under pressure (less than half the limit remaining), an entity with a budget
+share also pauses once it has used that share of the limit in the current
+rate-limit window. Both are overridable:
+
+    SYNC_RATE_PRIORITIES=sales=0,products=1,customers=2
+    SYNC_RATE_SHARES=customers=0.2,inventory=0.2
+"""
+
+import os
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITIES = {
+    'sales': 0,
+    'sale_line_items': 0,
+    'outlets': 1,
+    'products': 1,
+    'customers': 2,
+    'inventory': 2
+}
+
+# Fraction of the rate limit an entity may use per window while the budget is under pressure
+DEFAULT_SHARES = {
+    'customers': 0.2,
+    'inventory': 0.2
+}
+
+# Priority assumed for endpoints not listed above
+DEFAULT_PRIORITY = 1
+
+DEFAULT_LOW_WATER = 20
+
+# Lightspeed's rate limit window
+WINDOW_SECONDS = 300
+
+# A remaining-count older than this is not trusted to pause anything; the next request refreshes it
+OBSERVATION_TTL_SECONDS = 30
+
+PAUSE_POLL_SECONDS = 5.0
+
+# Longest a crawl is paused before it is let through anyway
+MAX_PAUSE_SECONDS = WINDOW_SECONDS
+
+def parse_mapping(value: Optional[str], cast=float) -> Dict:
+    """Parse 'a=1,b=2' into a dict."""
+    mapping = {}
+    for item in (value or '').split(','):
+        if '=' in item:
+            key, number = item.split('=', 1)
+            mapping[key.strip()] = cast(number)
+    return mapping
+
+def request_entity(endpoint: str, params: Optional[Dict] = None) -> str:
+    """Return the entity a request is charged to, e.g. '2.0/products/<id>/inventory' -> 'inventory'."""
+    parts = endpoint.strip('/').split('/')
+    if len(parts) < 2:
+        return endpoint
+    if parts[1] == 'search':
+        return (params or {}).get('type', 'search')
+    return parts[3] if len(parts) > 3 else parts[1]
+
+class RateBudgetScheduler:
+    """Decides which entity's requests may use the remaining rate budget."""
+
+    def __init__(self, priorities: Optional[Dict[str, int]] = None, shares: Optional[Dict[str, float]] = None,
+                 low_water: int = DEFAULT_LOW_WATER, clock=time.time, sleep=time.sleep):
+        """Initialize the scheduler; clock and sleep can be replaced for testing."""
+        self.priorities = dict(DEFAULT_PRIORITIES if priorities is None else priorities)
+        self.shares = dict(DEFAULT_SHARES if shares is None else shares)
+        self.low_water = low_water
+        self.clock = clock
+        self.sleep = sleep
+        self.lock = threading.Lock()
+        self.limit: Optional[int] = None
+        self.remaining: Optional[int] = None
+        self.observed_at = 0.0
+        self.recent: Dict[str, Deque[float]] = {}
+        self.requests: Dict[str, int] = {}
+        self.pause_seconds: Dict[str, float] = {}
+        self.pauses: Dict[str, int] = {}
+
+    def priority(self, entity: str) -> int:
+        """Return an entity's priority; 0 is the highest."""
+        return self.priorities.get(entity, DEFAULT_PRIORITY)
+
+    def observe(self, headers):
+        """Update the remaining budget from a response's rate limit headers."""
+        remaining, limit = headers.get('X-RateLimit-Remaining'), headers.get('X-RateLimit-Limit')
+        with self.lock:
+            try:
+                if remaining is not None:
+                    self.remaining = int(float(remaining))
+                    self.observed_at = self.clock()
+                if limit is not None:
+                    self.limit = int(float(limit))
+            except ValueError:
+                pass
+
+    def _window_requests(self, entity: str, now: float) -> int:
+        """Count an entity's requests in the current window."""
+        recent = self.recent.setdefault(entity, deque())
+        while recent and recent[0] <= now - WINDOW_SECONDS:
+            recent.popleft()
+        return len(recent)
+
+    def _pause_reason(self, entity: str, now: float) -> Optional[str]:
+        """Return why an entity must wait, or None if it may send a request now."""
+        priority = self.priority(entity)
+        if priority <= 0 or self.remaining is None or now - self.observed_at > OBSERVATION_TTL_SECONDS:
+            return None
+        if self.remaining < self.low_water * priority:
+            return f"{self.remaining} requests left (priority {priority} pauses below {self.low_water * priority})"
+        share = self.shares.get(entity)
+        if share is not None and self.limit and self.remaining < self.limit / 2:
+            used = self._window_requests(entity, now)
+            if used >= share * self.limit:
+                return f"used {used} requests, its {share:.0%} share of {self.limit}"
+        return None
+
+    def acquire(self, entity: str):
+        """Block until entity may send a request, then charge the request to it."""
+        paused = 0.0
+        while True:
+            with self.lock:
+                now = self.clock()
+                reason = self._pause_reason(entity, now) if paused < MAX_PAUSE_SECONDS else None
+                if reason is None:
+                    self._window_requests(entity, now)
+                    self.recent[entity].append(now)
+                    self.requests[entity] = self.requests.get(entity, 0) + 1
+                    if paused:
+                        self.pause_seconds[entity] = self.pause_seconds.get(entity, 0.0) + paused
+                        self.pauses[entity] = self.pauses.get(entity, 0) + 1
+                    break
+            if not paused:
+                logger.info(f"⏸️  Pausing {entity}: {reason}")
+            self.sleep(PAUSE_POLL_SECONDS)
+            paused += PAUSE_POLL_SECONDS
+
+        telemetry.record_budget_request(entity)
+        if paused:
+            telemetry.record_budget_pause(entity, paused)
+            logger.info(f"▶️  Resuming {entity} after {paused:.0f}s")
+
+    def report(self) -> Dict[str, Dict]:
+        """Return per-entity requests, share of all requests, and time spent paused."""
+        with self.lock:
+            total = sum(self.requests.values()) or 1
+            return {entity: {'priority': self.priority(entity),
+                             'requests': count,
+                             'share': round(count / total, 3),
+                             'paused_seconds': round(self.pause_seconds.get(entity, 0.0), 1),
+                             'pauses': self.pauses.get(entity, 0)}
+                    for entity, count in sorted(self.requests.items(), key=lambda item: -item[1])}
+
+    def log_report(self, label: str = ''):
+        """Log budget consumption per entity."""
+        for entity, usage in self.report().items():
+            logger.info(f"📊 {label}{entity} (priority {usage['priority']}): {usage['requests']} requests "
+                        f"({usage['share']:.0%} of all requests), paused {usage['paused_seconds']}s")
+
+def create_scheduler() -> RateBudgetScheduler:
+    """Create a scheduler from SYNC_RATE_PRIORITIES, SYNC_RATE_SHARES and SYNC_RATE_LOW_WATER."""
+    priorities = {**DEFAULT_PRIORITIES, **parse_mapping(os.environ.get('SYNC_RATE_PRIORITIES'), int)}
+    shares = {**DEFAULT_SHARES, **parse_mapping(os.environ.get('SYNC_RATE_SHARES'))}
+    low_water = int(os.environ.get('SYNC_RATE_LOW_WATER', DEFAULT_LOW_WATER))
+    return RateBudgetScheduler(priorities, shares, low_water)
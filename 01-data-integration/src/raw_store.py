@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Local Parquet landing zone for raw Lightspeed API pages.
+Every fetched page is written to a compressed dataset partitioned by entity and
+sale date (or version bucket), so repairs and re-transforms can replay the data
+from disk instead of crawling the API again.
+"""
+
+import os
+import json
+import uuid
+import logging
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+import requests
+
+from lightspeed_client import LightspeedClient, LightspeedAPIError
+
+logger = logging.getLogger(__name__)
+
+# Entities without a natural date are partitioned by version range instead
+VERSION_BUCKET_SIZE = 100_000_000
+
+def _require_pyarrow():
+    """Import pyarrow lazily so the sync runs without it unless the landing zone is used."""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+        return pyarrow
+    except ImportError:
+        raise ImportError("pyarrow is required for the raw landing zone (pip install pyarrow)")
+
+def entity_from_endpoint(endpoint: str) -> str:
+    """Map an API endpoint such as '2.0/sales' to its entity name."""
+    return endpoint.rstrip('/').split('/')[-1]
+
+def _to_int(value) -> Optional[int]:
+    """Convert a version value to int, tolerating missing or malformed values."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def _to_datetime(value) -> Optional[datetime]:
+    """Parse a Lightspeed timestamp such as '2025-03-01T10:15:00Z', tolerating missing values."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+class RawPageStore:
+    """Writes and reads raw Lightspeed pages as a hive-partitioned Parquet dataset."""
+
+    def __init__(self, root_dir: str, compression: str = 'zstd'):
+        """Initialize the store rooted at root_dir."""
+        self.root_dir = root_dir
+        self.compression = compression
+
+    def _partition_for(self, entity: str, record: Dict) -> str:
+        """Return the partition directory name for a record."""
+        if entity == 'sales':
+            sale_date = record.get('sale_date') or record.get('created_at')
+            if sale_date:
+                return f"sale_date={str(sale_date)[:10]}"
+
+        version = _to_int(record.get('version'))
+        bucket = version // VERSION_BUCKET_SIZE if version is not None else 'none'
+        return f"version_bucket={bucket}"
+
+    def write_page(self, endpoint: str, data: List[Dict]):
+        """Write one fetched page, grouped into its partitions."""
+        if not data:
+            return
+
+        pa = _require_pyarrow()
+        entity = entity_from_endpoint(endpoint)
+        fetched_at = datetime.now(timezone.utc)
+
+        partitions: Dict[str, List[Dict]] = {}
+        for record in data:
+            partitions.setdefault(self._partition_for(entity, record), []).append(record)
+
+        for partition, records in partitions.items():
+            table = pa.table({
+                'id': pa.array([str(r.get('id')) for r in records], pa.string()),
+                'version': pa.array([_to_int(r.get('version')) for r in records], pa.int64()),
+                'payload': pa.array([json.dumps(r, separators=(',', ':')) for r in records], pa.string()),
+                'fetched_at': pa.array([fetched_at] * len(records), pa.timestamp('us', tz='UTC'))
+            })
+
+            directory = os.path.join(self.root_dir, f"entity={entity}", partition)
+            os.makedirs(directory, exist_ok=True)
+            filename = f"{fetched_at.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet"
+            pa.parquet.write_table(table, os.path.join(directory, filename), compression=self.compression)
+
+        logger.debug(f"Landed {len(data)} {entity} records in {len(partitions)} partitions")
+
+    def has_entity(self, entity: str) -> bool:
+        """Check whether any pages have been landed for an entity."""
+        return os.path.isdir(os.path.join(self.root_dir, f"entity={entity}"))
+
+    def read_entity(self, entity: str, after_version: Optional[int] = None, record_id: Optional[str] = None,
+                    payload_field: Optional[Dict[str, str]] = None) -> List[Dict]:
+        """Read the latest copy of every landed record, ordered by version like the API.
+
+        record_id and payload_field ({field: value}) are applied in the dataset scan, so a
+        lookup only decodes the matching rows.
+        """
+        if not self.has_entity(entity):
+            logger.warning(f"No landed pages found for {entity} in {self.root_dir}")
+            return []
+
+        _require_pyarrow()
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+
+        dataset = ds.dataset(os.path.join(self.root_dir, f"entity={entity}"),
+                             format='parquet', partitioning='hive')
+        conditions = []
+        if after_version:
+            conditions.append(ds.field('version') > after_version)
+        if record_id is not None:
+            conditions.append(ds.field('id') == str(record_id))
+        for field, value in (payload_field or {}).items():
+            # Payloads are written with compact separators, so the pair appears verbatim
+            conditions.append(pc.match_substring(ds.field('payload'), json.dumps({field: value},
+                                                                                   separators=(',', ':'))[1:-1]))
+        row_filter = None
+        for condition in conditions:
+            row_filter = condition if row_filter is None else row_filter & condition
+        table = dataset.to_table(columns=['id', 'version', 'payload'], filter=row_filter)
+
+        # The same record may have been landed several times; keep its newest version
+        latest: Dict[str, tuple] = {}
+        for record_id, version, payload in zip(table.column('id').to_pylist(),
+                                               table.column('version').to_pylist(),
+                                               table.column('payload').to_pylist()):
+            current = latest.get(record_id)
+            if current is None or (version or -1) >= (current[0] or -1):
+                latest[record_id] = (version, payload)
+
+        ordered = sorted(latest.values(), key=lambda item: item[0] or -1)
+        records = [json.loads(payload) for _, payload in ordered]
+        if payload_field:
+            records = [r for r in records if all(r.get(field) == value for field, value in payload_field.items())]
+        logger.info(f"Replayed {len(records)} {entity} records from {self.root_dir}")
+        return records
+
+class ReplayLightspeedClient(LightspeedClient):
+    """Drop-in LightspeedClient that serves landed pages instead of calling the API."""
+
+    def __init__(self, store: RawPageStore):
+        """Initialize the replay client; requests never reach the network."""
+        super().__init__(f"replay://{store.root_dir}", bearer_token='')
+        self.store = store
+        self.min_request_interval = 0.0  # Nothing to throttle when reading from disk
+        self.raw_dir = store.root_dir
+        # (date_from, date_to) -> matching sales, so paging through a search scans once
+        self.search_cache: Dict[tuple, List[Dict]] = {}
+
+    def _fetch(self, endpoint: str, params: Optional[Dict] = None) -> requests.Response:
+        """Serve a request as a response object, for callers that read the raw body."""
+        response = requests.Response()
+        response.status_code = 200
+        response._content = json.dumps(self._make_request(endpoint, params), separators=(',', ':')).encode()
+        return response
+
+    def _search_sales(self, params: Dict) -> List[Dict]:
+        """Return the landed sales created in [date_from, date_to), one search page at a time."""
+        if params.get('type') != 'sales':
+            raise LightspeedAPIError(f"Replay cannot serve {params.get('type')} searches")
+        key = (params.get('date_from'), params.get('date_to'))
+        if key not in self.search_cache:
+            date_from, date_to = _to_datetime(key[0]), _to_datetime(key[1])
+            self.search_cache[key] = [
+                sale for sale in self.store.read_entity('sales')
+                if (created_at := _to_datetime(sale.get('created_at')))
+                and (date_from is None or created_at >= date_from) and (date_to is None or created_at < date_to)
+            ]
+        matches = self.search_cache[key]
+        offset = int(params.get('offset') or 0)
+        page_size = int(params.get('page_size') or len(matches) or 1)
+        return matches[offset:offset + page_size]
+
+    def _make_request(self, endpoint: str, params: Optional[Dict] = None) -> Dict:
+        """Serve the requests the sync makes from the landed dataset."""
+        params = params or {}
+        parts = endpoint.strip('/').split('/')
+        if parts[1:] == ['search']:
+            return {'data': self._search_sales(params)}
+        if len(parts) == 4 and parts[1] == 'products' and parts[3] == 'inventory':
+            # Inventory of one product such as '2.0/products/<id>/inventory'
+            return {'data': self.store.read_entity('inventory', payload_field={'product_id': parts[2]})}
+        if len(parts) == 3:
+            # Single record lookup such as '2.0/sales/<id>'
+            matches = self.store.read_entity(parts[1], record_id=parts[2])
+            return {'data': matches[0] if matches else {}}
+        if len(parts) == 2:
+            records = self.store.read_entity(parts[1], _to_int(params.get('after')))
+            page_size = _to_int(params.get('page_size'))
+            return {'data': records[:page_size] if page_size else records}
+        raise LightspeedAPIError(f"Replay cannot serve {endpoint}")
+
+    def _get_paginated_data(self, endpoint: str, params: Optional[Dict] = None, use_version_pagination: bool = True) -> List[Dict]:
+        """Return every landed record for the endpoint after the requested version."""
+        params = params or {}
+        return self.store.read_entity(entity_from_endpoint(endpoint), _to_int(params.get('after')))
+
+    def test_connection(self) -> bool:
+        """The replay source is available when the landing zone exists."""
+        return os.path.isdir(self.store.root_dir)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Targeted re-sync of the sales created in a date window.
+Re-fetches just that slice from Lightspeed and upserts it again, without
+touching sync_state, so a bad day can be repaired in seconds instead of a full
+re-crawl or a hand-edited watermark.
+
+    python3 src/resync.py --from 2025-03-01 --to 2025-03-02 --entities sales,sale_line_items
+
+Sales are found with the Lightspeed search endpoint's date filters. With
+--source versions (or if search fails) the window is mapped to the range of
+versions stored for those days, and only that version range is crawled.
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from incremental_sync import (create_supabase_client, batch_upsert, log_sync_start, log_sync_complete,
+                              refresh_sync_performance, transform_sale, transform_line_item)
+from lightspeed_client import create_lightspeed_client, LightspeedAPIError
+from analytics_snapshot import append_to_snapshot
+from accounts import load_accounts, tag_records
+from dedupe import dedupe_by_version
+
+logger = logging.getLogger(__name__)
+
+# Entities that can be re-synced by date, and the table each is written to
+RESYNC_TABLES = {
+    'sales': 'lightspeed_sales',
+    'sale_line_items': 'lightspeed_sale_line_items'
+}
+
+def parse_day(value: str) -> datetime:
+    """Parse a YYYY-MM-DD argument as midnight UTC."""
+    try:
+        return datetime.strptime(value, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"'{value}' is not a YYYY-MM-DD date")
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a Lightspeed timestamp such as '2025-03-01T10:15:00Z'."""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+def isoformat(moment: datetime) -> str:
+    """Format a UTC datetime the way Lightspeed expects it."""
+    return moment.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+def stored_version_window(supabase, start: datetime, end: datetime,
+                          account: Optional[str] = None) -> Optional[Tuple[int, int]]:
+    """Return the lowest and highest stored version of the sales created in [start, end)."""
+    def edge(descending: bool) -> Optional[int]:
+        query = supabase.table('lightspeed_sales').select('version') \
+            .gte('sale_date', start.isoformat()).lt('sale_date', end.isoformat()).not_.is_('version', 'null')
+        if account:
+            query = query.eq('account', account)
+        result = query.order('version', desc=descending).limit(1).execute()
+        return result.data[0]['version'] if result.data else None
+
+    lowest = edge(False)
+    if lowest is None:
+        return None
+    return lowest, edge(True)
+
+def fetch_window_sales(lightspeed, supabase, start: datetime, end: datetime, source: str = 'search',
+                       account: Optional[str] = None) -> List[Dict]:
+    """Fetch the sales created in [start, end), with their line items."""
+    if source == 'search':
+        try:
+            return lightspeed.search_sales(isoformat(start), isoformat(end))
+        except LightspeedAPIError as e:
+            logger.warning(f"Sales search failed ({e}); falling back to the stored version window")
+
+    window = stored_version_window(supabase, start, end, account)
+    if window is None:
+        logger.warning(f"No stored sales between {start.date()} and {end.date()} to map to versions")
+        return []
+
+    lowest, highest = window
+    logger.info(f"Mapped {start.date()}..{end.date()} to versions {lowest}..{highest}")
+    sales = lightspeed.get_sales_version_range(lowest - 1, highest)
+    # The version range also covers later sales modified in between; keep only the window's
+    return [sale for sale in sales if start <= (parse_timestamp(sale.get('created_at')) or end) < end]
+
+def resync_window(lightspeed, supabase, start: datetime, end: datetime, entities: List[str],
+                  source: str = 'search', account: Optional[str] = None) -> Dict[str, int]:
+    """Re-fetch and upsert the window's rows; returns rows written per entity (-1 when it failed)."""
+    sales, duplicates = dedupe_by_version(fetch_window_sales(lightspeed, supabase, start, end, source, account))
+    logger.info(f"Retrieved {len(sales)} sales created between {start.date()} and {end.date()}"
+                + (f" ({duplicates} duplicates dropped)" if duplicates else ""))
+
+    rows = {
+        'sales': [transform_sale(sale) for sale in sales],
+        'sale_line_items': [transform_line_item(sale.get('id'), item)
+                            for sale in sales for item in sale.get('line_items') or []]
+    }
+    metadata = {'date_from': start.isoformat(), 'date_to': end.isoformat(), 'source': source, 'account': account}
+
+    results = {}
+    for entity_type in entities:
+        table, records = RESYNC_TABLES[entity_type], rows[entity_type]
+        if account:
+            tag_records(records, account)
+
+        start_time = time.time()
+        log_id = log_sync_start(supabase, entity_type, 'resync', account)
+        try:
+            written = batch_upsert(supabase, table, records)
+            append_to_snapshot(table, records)
+        except Exception as e:
+            logger.error(f"❌ Failed to re-sync {entity_type}: {e}")
+            if log_id:
+                log_sync_complete(supabase, log_id, entity_type, len(records), 0, time.time() - start_time,
+                                  'failed', str(e), metadata)
+            results[entity_type] = -1
+            continue
+
+        if log_id:
+            log_sync_complete(supabase, log_id, entity_type, len(records), written, time.time() - start_time,
+                              metadata=metadata)
+        results[entity_type] = written
+
+    return results
+
+def main():
+    """Re-sync a date window."""
+    load_dotenv('.env.local')
+
+    parser = argparse.ArgumentParser(description="Re-fetch and re-upsert the sales of a date window "
+                                                 "without moving the sync watermark")
+    parser.add_argument('--from', dest='date_from', type=parse_day, required=True,
+                        help="first day to re-sync (YYYY-MM-DD, UTC)")
+    parser.add_argument('--to', dest='date_to', type=parse_day,
+                        help="last day to re-sync, inclusive (default: same as --from)")
+    parser.add_argument('--entities', default=','.join(RESYNC_TABLES),
+                        help=f"comma-separated entities to rewrite (default: {','.join(RESYNC_TABLES)})")
+    parser.add_argument('--source', choices=['search', 'versions'], default='search',
+                        help="find the window's sales with the search endpoint or the stored version range")
+    parser.add_argument('--account', help="account name from LIGHTSPEED_ACCOUNTS_FILE")
+    args = parser.parse_args()
+
+    entities = [entity.strip() for entity in args.entities.split(',') if entity.strip()]
+    unknown = [entity for entity in entities if entity not in RESYNC_TABLES]
+    if unknown:
+        parser.error(f"cannot re-sync {', '.join(unknown)} by date (choose from {', '.join(RESYNC_TABLES)})")
+    start = args.date_from
+    end = (args.date_to or args.date_from) + timedelta(days=1)
+    if end <= start:
+        parser.error("--to must not be before --from")
+
+    print(f"🩹 Re-syncing {', '.join(entities)} from {start.date()} to {(end - timedelta(days=1)).date()}")
+    print("=" * 40)
+
+    try:
+        account = None
+        if args.account:
+            account = next((a for a in load_accounts() if a['name'] == args.account), None)
+            if account is None:
+                raise ValueError(f"Account '{args.account}' is not in LIGHTSPEED_ACCOUNTS_FILE")
+        lightspeed = create_lightspeed_client(account)
+        supabase = create_supabase_client()
+
+        started = time.time()
+        results = resync_window(lightspeed, supabase, start, end, entities, args.source,
+                                account['name'] if account else None)
+        refresh_sync_performance(supabase)
+        for entity_type, written in results.items():
+            if written < 0:
+                print(f"❌ {entity_type} re-sync failed")
+            else:
+                print(f"✅ {entity_type}: {written} rows rewritten")
+        print(f"\n⏱️  Done in {time.time() - started:.1f}s (sync watermark unchanged)")
+        return all(written >= 0 for written in results.values())
+
+    except Exception as e:
+        logger.error(f"Re-sync failed: {e}")
+        print(f"\n❌ Re-sync failed: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Keyset-paginated streaming reader for Supabase tables.
+Pages are requested with "key > last key" instead of offsets, so every page costs
+the same and full-table scans are never truncated by the PostgREST row cap.
+"""
+
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PAGE_SIZE = 1000
+
+def _quote(value: Any) -> str:
+    """Quote a value for use inside a PostgREST or=() filter."""
+    text = str(value).replace('\\', '\\\\').replace('"', '\\"')
+    return f'"{text}"'
+
+def _select_columns(columns: str, required: List[str]) -> str:
+    """Make sure the pagination columns are part of the projection."""
+    if columns.strip() == '*':
+        return columns
+    selected = [c.strip() for c in columns.split(',') if c.strip()]
+    for column in required:
+        if column not in selected:
+            selected.append(column)
+    return ', '.join(selected)
+
+def iter_pages(supabase, table: str, columns: str = '*', key: str = 'id',
+               sort_column: Optional[str] = None, filters: Optional[Callable] = None,
+               page_size: int = DEFAULT_PAGE_SIZE, prefetch: bool = True) -> Iterator[List[Dict]]:
+    """Stream a table (or filtered query) page by page using keyset pagination.
+
+    Rows are ordered by key, or by (sort_column, key) when sort_column is given;
+    rows whose sort_column is NULL cannot be keyset-paged and are skipped.
+    filters is an optional callable that receives the query builder and returns it
+    with extra filters applied, e.g. lambda q: q.gte('sale_date', '2025-01-01').
+    With prefetch enabled the next page is requested while the current one is consumed.
+    """
+    required = [sort_column, key] if sort_column else [key]
+    projection = _select_columns(columns, required)
+
+    def fetch(last_row: Optional[Dict]) -> List[Dict]:
+        query = supabase.table(table).select(projection)
+        if filters:
+            query = filters(query)
+        if sort_column:
+            query = query.not_.is_(sort_column, 'null')
+        if last_row is not None:
+            if sort_column:
+                sort_value, key_value = _quote(last_row[sort_column]), _quote(last_row[key])
+                query = query.or_(f"{sort_column}.gt.{sort_value},and({sort_column}.eq.{sort_value},{key}.gt.{key_value})")
+            else:
+                query = query.gt(key, last_row[key])
+        if sort_column:
+            query = query.order(sort_column)
+        return query.order(key).limit(page_size).execute().data
+
+    executor = ThreadPoolExecutor(max_workers=1) if prefetch else None
+    pages = 0
+    rows = 0
+
+    try:
+        page = fetch(None)
+        # Stop on an empty page rather than a short one: PostgREST may cap pages below page_size
+        while page:
+            pending = executor.submit(fetch, page[-1]) if executor else None
+            pages += 1
+            rows += len(page)
+            yield page
+            page = pending.result() if pending else fetch(page[-1])
+    finally:
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    logger.debug(f"Read {rows} rows from {table} in {pages} pages")
+
+def iter_rows(supabase, table: str, columns: str = '*', **kwargs) -> Iterator[Dict]:
+    """Stream rows from a table; accepts the same options as iter_pages."""
+    for page in iter_pages(supabase, table, columns, **kwargs):
+        yield from page
+
+def read_all(supabase, table: str, columns: str = '*', **kwargs) -> List[Dict]:
+    """Read every row of a table (or filtered query) into a list."""
+    return list(iter_rows(supabase, table, columns, **kwargs))
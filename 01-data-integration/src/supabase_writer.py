@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Shared upsert helper for writing synced rows to Supabase.
+Upserts ask PostgREST for return=minimal with count=exact, so the affected row
+count comes back in the Content-Range header instead of every written row being
+serialized and sent back just to be counted.
+
+With SUPABASE_GZIP=1, batches are posted directly to the REST endpoint with a
+gzip-compressed body. If the backend turns out not to accept compressed bodies,
+gzip is switched off for the rest of the process and the batch is resent
+uncompressed through the Supabase client.
+"""
+
+import os
+import gzip
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from postgrest.exceptions import APIError
+from postgrest.types import CountMethod, ReturnMethod
+
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+UPSERT_PREFER = 'return=minimal,count=exact,resolution=merge-duplicates'
+
+# Bodies smaller than this are sent as-is; compressing them saves less than it costs
+GZIP_MIN_BYTES = 2048
+GZIP_LEVEL = 5
+
+# PostgREST error code for a body it could not parse as JSON
+INVALID_BODY_CODE = 'PGRST102'
+
+_gzip_supported = True
+_local = threading.local()
+
+def gzip_enabled() -> bool:
+    """Return True when compressed request bodies are enabled and not known to be rejected."""
+    return _gzip_supported and os.environ.get('SUPABASE_GZIP', '').lower() in ('1', 'true', 'yes')
+
+def compress_body(body: bytes) -> Optional[bytes]:
+    """Return the gzip-compressed body, or None when it should be sent as-is."""
+    if not gzip_enabled() or len(body) < GZIP_MIN_BYTES:
+        return None
+    return gzip.compress(body, GZIP_LEVEL)
+
+def gzip_rejected(status_code: int, error: Dict) -> bool:
+    """Check whether an error response means the compressed body was not understood.
+
+    Switches gzip off for the rest of the process when it was.
+    """
+    global _gzip_supported
+    if status_code == 415 or (status_code == 400 and error.get('code') == INVALID_BODY_CODE):
+        logger.warning(f"Supabase did not accept a gzip body ({status_code}); sending uncompressed from now on")
+        _gzip_supported = False
+        return True
+    return False
+
+def rest_url() -> str:
+    """Return the PostgREST base URL for SUPABASE_URL."""
+    return f"{os.environ['SUPABASE_URL'].rstrip('/')}/rest/v1"
+
+def rest_headers() -> Dict[str, str]:
+    """Return the auth headers for direct REST requests."""
+    key = os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    return {'apikey': key, 'Authorization': f'Bearer {key}', 'Content-Type': 'application/json'}
+
+def upsert_params(rows: List[Dict], on_conflict: str = '') -> Dict[str, str]:
+    """Return the query parameters the Supabase client sends with an upsert."""
+    params = {'columns': ','.join(f'"{key}"' for key in sorted({key for row in rows for key in row}))}
+    if on_conflict:
+        params['on_conflict'] = on_conflict
+    return params
+
+def content_range_count(content_range: Optional[str], rows: List[Dict]) -> int:
+    """Read the written row count from a Content-Range header such as '*/100'."""
+    total = (content_range or '').split('/')[-1]
+    return int(total) if total.isdigit() else len(rows)
+
+def error_body(response) -> Dict:
+    """Return a PostgREST error response as a dict for APIError."""
+    try:
+        return response.json()
+    except ValueError:
+        return {'message': response.text, 'code': str(response.status_code)}
+
+def _session() -> requests.Session:
+    """Return this thread's HTTP session for direct REST requests."""
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = requests.Session()
+        session.headers.update(rest_headers())
+        _local.session = session
+    return session
+
+def _post_gzip(table_name: str, rows: List[Dict], compressed: bytes, on_conflict: str) -> Optional[int]:
+    """POST a compressed upsert; returns the row count, or None if gzip is not accepted."""
+    response = _session().post(
+        f"{rest_url()}/{table_name}",
+        params=upsert_params(rows, on_conflict),
+        data=compressed,
+        headers={'Prefer': UPSERT_PREFER, 'Content-Encoding': 'gzip'},
+        timeout=120
+    )
+    if response.ok:
+        return content_range_count(response.headers.get('Content-Range'), rows)
+
+    error = error_body(response)
+    if gzip_rejected(response.status_code, error):
+        return None
+    raise APIError(error)
+
+def upsert_rows_sized(supabase, table_name: str, rows: List[Dict], on_conflict: str = '') -> Tuple[int, int]:
+    """Upsert one batch; return (rows written, uncompressed request body bytes)."""
+    body = json.dumps(rows, default=str).encode('utf-8')
+
+    compressed = compress_body(body)
+    if compressed is not None:
+        written = _post_gzip(table_name, rows, compressed, on_conflict)
+        if written is not None:
+            telemetry.record_request_bytes(table_name, len(body), len(compressed))
+            return written, len(body)
+
+    result = supabase.table(table_name).upsert(rows, on_conflict=on_conflict, count=CountMethod.exact,
+                                               returning=ReturnMethod.minimal).execute()
+    telemetry.record_request_bytes(table_name, len(body), len(body))
+    if result.count is None:
+        # Some proxies strip Content-Range; PostgREST writes the whole batch or raises
+        logger.debug(f"No row count returned for {table_name}; assuming {len(rows)}")
+        return len(rows), len(body)
+    return result.count, len(body)
+
+def upsert_rows(supabase, table_name: str, rows: List[Dict], on_conflict: str = '') -> int:
+    """Upsert one batch and return the number of rows written."""
+    return upsert_rows_sized(supabase, table_name, rows, on_conflict)[0]
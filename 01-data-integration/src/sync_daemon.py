@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Long-running sync daemon for Lightspeed to Supabase.
+Keeps the API clients warm and runs small incremental syncs on per-entity
+cadences (sales every few minutes, products hourly, outlets daily) instead of
+one full run a day from cron. Stop it with SIGTERM or Ctrl+C; a sync in
+progress is allowed to finish first.
+"""
+
+import os
+import sys
+import time
+import random
+import signal
+import logging
+import argparse
+import threading
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from incremental_sync import create_supabase_client, refresh_sync_performance, sync_entity_incremental
+from lightspeed_client import create_lightspeed_client
+from local_queue import get_batch_queue
+from queue_loader import QueueLoader
+from sync_lock import DaemonLock, lock_file_path
+import telemetry
+
+logger = logging.getLogger(__name__)
+
+# Seconds between syncs of each entity; override with SYNC_CADENCES="sales=300,products=3600"
+DEFAULT_CADENCES = {
+    'outlets': 24 * 3600,
+    'customers': 15 * 60,
+    'products': 3600,
+    'sales': 5 * 60,
+    'sale_line_items': 5 * 60,
+    'inventory': 3600
+}
+
+# Dependency order, used to break ties when several entities are due together
+ENTITY_ORDER = ['outlets', 'customers', 'products', 'sales', 'sale_line_items', 'inventory']
+
+# Each interval is randomly stretched or shrunk by up to this fraction
+DEFAULT_JITTER = 0.1
+
+def parse_cadences(value: Optional[str]) -> Dict[str, int]:
+    """Merge 'entity=seconds' overrides into the default cadences."""
+    cadences = dict(DEFAULT_CADENCES)
+    for pair in (value or '').split(','):
+        if not pair.strip():
+            continue
+        entity_type, sep, seconds = pair.partition('=')
+        entity_type = entity_type.strip()
+        if not sep or entity_type not in cadences:
+            raise ValueError(f"Invalid cadence '{pair}' (expected <entity>=<seconds>)")
+        cadences[entity_type] = int(seconds)
+    if not any(seconds > 0 for seconds in cadences.values()):
+        raise ValueError("Every entity is disabled; nothing to sync")
+    return cadences
+
+class SyncDaemon:
+    """Runs incremental entity syncs on their own schedules."""
+
+    def __init__(self, lightspeed, supabase, cadences: Dict[str, int], jitter: float = DEFAULT_JITTER):
+        """Initialize the schedule with every entity due immediately."""
+        self.lightspeed = lightspeed
+        self.supabase = supabase
+        self.cadences = cadences
+        self.jitter = jitter
+        self.stop_event = threading.Event()
+        now = time.time()
+        self.next_run = {entity_type: now for entity_type in ENTITY_ORDER if cadences.get(entity_type, 0) > 0}
+
+    def stop(self, *_):
+        """Ask the daemon to exit after the current sync."""
+        if not self.stop_event.is_set():
+            logger.info("🛑 Shutdown requested, finishing current sync...")
+        self.stop_event.set()
+
+    def _next_due(self) -> str:
+        """Return the entity whose run is due first."""
+        return min(self.next_run, key=lambda entity_type: (self.next_run[entity_type], ENTITY_ORDER.index(entity_type)))
+
+    def _schedule(self, entity_type: str, started_at: float):
+        """Schedule the next run one jittered interval after this one started."""
+        interval = self.cadences[entity_type]
+        delay = interval * (1 + random.uniform(-self.jitter, self.jitter))
+        # A run that overran its interval is rescheduled from now instead of queueing back-to-back catch-ups
+        self.next_run[entity_type] = max(started_at + delay, time.time() + interval * self.jitter)
+
+    def run_once(self, entity_type: str) -> bool:
+        """Run one incremental sync and schedule the next."""
+        started_at = time.time()
+        logger.info(f"🔄 Micro-sync of {entity_type}")
+        try:
+            return sync_entity_incremental(self.lightspeed, self.supabase, entity_type)
+        except Exception as e:
+            # sync_entity_incremental logs its own failures; this only guards the loop
+            logger.error(f"Unexpected error syncing {entity_type}: {e}")
+            return False
+        finally:
+            self._schedule(entity_type, started_at)
+            refresh_sync_performance(self.supabase)
+            telemetry.write_textfile('sync_daemon')
+            logger.info(f"Next {entity_type} sync in {self.next_run[entity_type] - time.time():.0f}s")
+
+    def run(self):
+        """Run syncs as they come due until stopped."""
+        logger.info("🚀 Sync daemon started with cadences: "
+                    + ', '.join(f"{entity_type}={seconds}s" for entity_type, seconds in self.cadences.items()))
+
+        while not self.stop_event.is_set():
+            entity_type = self._next_due()
+            wait = self.next_run[entity_type] - time.time()
+            if wait > 0 and self.stop_event.wait(wait):
+                break
+            self.run_once(entity_type)
+
+        logger.info("👋 Sync daemon stopped")
+
+def main():
+    """Start the sync daemon."""
+    load_dotenv('.env.local')
+
+    parser = argparse.ArgumentParser(description="Run incremental syncs continuously on per-entity cadences")
+    parser.add_argument('--cadences', default=os.environ.get('SYNC_CADENCES'),
+                        help="entity=seconds overrides, e.g. sales=300,products=3600 (0 disables an entity)")
+    parser.add_argument('--jitter', type=float, default=float(os.environ.get('SYNC_JITTER', DEFAULT_JITTER)),
+                        help="random fraction applied to each interval")
+    parser.add_argument('--lock-file', default=lock_file_path(),
+                        help="lock shared with the cron sync, which skips its run while the daemon holds it")
+    args = parser.parse_args()
+
+    print("🔁 Starting Sync Daemon")
+    print("=" * 40)
+
+    lock = DaemonLock(args.lock_file)
+    if not lock.acquire():
+        print(f"❌ Another sync daemon or cron sync holds {args.lock_file}")
+        return False
+
+    try:
+        cadences = parse_cadences(args.cadences)
+
+        # Clients are created and tested once and reused by every micro-sync
+        lightspeed = create_lightspeed_client(rate_budget=True)
+        supabase = create_supabase_client()
+        if not lightspeed.test_connection():
+            raise Exception("Failed to connect to Lightspeed API")
+
+        daemon = SyncDaemon(lightspeed, supabase, cadences, args.jitter)
+        signal.signal(signal.SIGTERM, daemon.stop)
+        signal.signal(signal.SIGINT, daemon.stop)
+
+        # With a load queue, loader workers upsert in the background while the daemon keeps fetching
+        queue = get_batch_queue()
+        loader = QueueLoader(supabase, queue) if queue else None
+        if loader:
+            loader.start()
+
+        daemon.run()
+        if loader:
+            loader.stop()
+        return True
+
+    except Exception as e:
+        logger.error(f"Sync daemon failed: {e}")
+        print(f"❌ Error: {e}")
+        return False
+
+    finally:
+        lock.release()
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
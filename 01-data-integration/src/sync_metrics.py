@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Per-stage timing and resource metrics for a single entity sync.
+The breakdown is written to sync_log.metadata so slow runs can be traced to
+the API, rate limiting, transformation or the Supabase upserts.
+"""
+
+import sys
+import time
+import logging
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+def peak_rss_mb() -> Optional[float]:
+    """Return the peak resident set size of this process in MB."""
+    if resource is None:
+        return None
+    # ru_maxrss is reported in bytes on macOS and kilobytes on Linux
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(maxrss / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+class SyncMetrics:
+    """Collects stage timings and counters for one entity sync."""
+
+    def __init__(self, lightspeed=None, account: Optional[str] = None):
+        """Start measuring, using the client's request counters as the baseline."""
+        self.lightspeed = lightspeed
+        self.account = account
+        self.start_time = time.perf_counter()
+        self.stage_seconds: Dict[str, float] = {}
+        self.counters: Dict[str, int] = {'batches': 0, 'bytes_out': 0, 'duplicates_dropped': 0}
+        self.client_baseline = dict(getattr(lightspeed, 'stats', {}))
+        self.client_final: Optional[Dict[str, float]] = None
+        self.mode = 'normal'  # Or 'catch_up' when the sync fell far behind
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a block of work as a named stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def add_time(self, name: str, seconds: float):
+        """Add time to a named stage."""
+        self.stage_seconds[name] = self.stage_seconds.get(name, 0.0) + seconds
+
+    def increment(self, name: str, amount: int = 1):
+        """Increase a counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record_batch(self, body_bytes: int, seconds: float):
+        """Record one upserted batch and the request body size the writer serialized."""
+        self.add_time('upsert', seconds)
+        self.increment('batches')
+        self.increment('bytes_out', body_bytes)
+
+    def freeze_client(self):
+        """Stop attributing client requests to this sync, e.g. before the next entity starts fetching."""
+        self.client_final = self._client_delta()
+
+    def _client_delta(self) -> Dict[str, float]:
+        """Return the client's request counters accumulated since this sync started."""
+        if self.client_final is not None:
+            return self.client_final
+        stats = getattr(self.lightspeed, 'stats', {})
+        return {key: value - self.client_baseline.get(key, 0) for key, value in stats.items()}
+
+    def to_metadata(self) -> Dict:
+        """Build the sync_log.metadata payload."""
+        client = self._client_delta()
+        stages = {name: round(seconds, 3) for name, seconds in self.stage_seconds.items()}
+
+        metadata = {
+            'total_seconds': round(time.perf_counter() - self.start_time, 3),
+            'stages': stages,
+            'fetch_seconds': stages.get('fetch', 0.0),
+            'http_seconds': round(client.get('http_seconds', 0.0), 3),
+            'json_decode_seconds': round(client.get('json_decode_seconds', 0.0), 3),
+            'rate_limit_wait_seconds': round(client.get('throttle_wait_seconds', 0.0), 3),
+            'retry_wait_seconds': round(client.get('retry_wait_seconds', 0.0), 3),
+            'api_wait_seconds': round(client.get('throttle_wait_seconds', 0.0) + client.get('retry_wait_seconds', 0.0), 3),
+            'transform_seconds': stages.get('transform', 0.0),
+            'upsert_seconds': stages.get('upsert', 0.0),
+            'requests': client.get('requests', 0),
+            'pages': client.get('pages', 0),
+            'api_retries': client.get('retries', 0),
+            'bytes_in': client.get('bytes_in', 0),
+            'peak_rss_mb': peak_rss_mb()
+        }
+        metadata.update(self.counters)
+        metadata['mode'] = self.mode
+        if self.account:
+            metadata['account'] = self.account
+        return metadata
+
+    def log_summary(self, entity_type: str):
+        """Log a one-line breakdown of where the sync spent its time."""
+        m = self.to_metadata()
+        logger.info(f"⏱️  {entity_type} ({m['mode']} mode): total {m['total_seconds']:.1f}s = fetch {m['fetch_seconds']:.1f}s "
+                    f"(http {m['http_seconds']:.1f}s, decode {m['json_decode_seconds']:.1f}s, "
+                    f"rate limit {m['rate_limit_wait_seconds']:.1f}s, 429 {m['retry_wait_seconds']:.1f}s) "
+                    f"+ transform {m['transform_seconds']:.1f}s + upsert {m['upsert_seconds']:.1f}s; "
+                    f"{m['pages']} pages, {m['batches']} batches, {m['bytes_in']} bytes in, "
+                    f"{m['bytes_out']} bytes out, {m['duplicates_dropped']} duplicates dropped, "
+                    f"peak RSS {m['peak_rss_mb']} MB")
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Prometheus-style telemetry for the sync and the Lightspeed API client.
+Metrics live in an in-process registry rendered in the Prometheus text format,
+served by the Flask app at /metrics and dumped to a per-job textfile at the end
+of a cron run (SYNC_METRICS_TEXTFILE) so short-lived syncs can be scraped too.
+"""
+
+import os
+import glob
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from accounts import DEFAULT_ACCOUNT
+
+logger = logging.getLogger(__name__)
+
+# Request and batch latency buckets in seconds
+DEFAULT_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], *extra: str) -> str:
+    """Render a label set such as {endpoint="2.0/sales",status="200"}."""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(labelnames, values)]
+    pairs.extend(e for e in extra if e)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+def _escape(value) -> str:
+    """Escape a label value for the text format."""
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    """Render a sample value, keeping integers free of a trailing .0."""
+    if value == float('inf'):
+        return '+Inf'
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Metric:
+    """Base class for a labelled metric."""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        """Initialize an empty metric."""
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+        self.lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        """Return the label values in declaration order."""
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def samples(self, const_labels: str = '') -> List[str]:
+        """Return the sample lines for this metric, with const_labels (e.g. 'job="x"') on each."""
+        with self.lock:
+            return [f"{self.name}{_format_labels(self.labelnames, key, const_labels)} {_format_value(value)}"
+                    for key, value in sorted(self.values.items())]
+
+class Counter(Metric):
+    """Monotonically increasing value."""
+
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        """Increase the counter for a label set."""
+        key = self._key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that can go up and down."""
+
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        """Set the gauge for a label set."""
+        with self.lock:
+            self.values[self._key(labels)] = value
+
+class Histogram(Metric):
+    """Distribution of observations in cumulative buckets."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        """Initialize an empty histogram."""
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.observations: Dict[Tuple[str, ...], Dict] = {}
+
+    def observe(self, value: float, **labels):
+        """Record one observation."""
+        key = self._key(labels)
+        with self.lock:
+            state = self.observations.setdefault(key, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][index] += 1
+            state['sum'] += value
+            state['count'] += 1
+
+    def samples(self, const_labels: str = '') -> List[str]:
+        """Return bucket, sum and count lines for every label set."""
+        lines = []
+        with self.lock:
+            for key, state in sorted(self.observations.items()):
+                for bound, count in zip(self.buckets, state['counts']):
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, const_labels, le)} {count}")
+                labels = _format_labels(self.labelnames, key, const_labels)
+                lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+                lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+class Registry:
+    """Holds metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        """Initialize an empty registry."""
+        self.metrics: Dict[str, Metric] = {}
+
+    def _register(self, metric: Metric) -> Metric:
+        """Return the existing metric with the same name, or register this one."""
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        """Get or create a counter."""
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()) -> Gauge:
+        """Get or create a gauge."""
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        """Get or create a histogram."""
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def families(self, const_labels: str = '') -> Dict[str, Tuple[List[str], List[str]]]:
+        """Return {name: (HELP/TYPE lines, sample lines)} for every metric that has samples."""
+        families = {}
+        for metric in self.metrics.values():
+            samples = metric.samples(const_labels)
+            if samples:
+                families[metric.name] = ([f"# HELP {metric.name} {metric.documentation}",
+                                          f"# TYPE {metric.name} {metric.kind}"], samples)
+        return families
+
+    def render(self, const_labels: str = '') -> str:
+        """Render every metric that has samples."""
+        return _render_families(self.families(const_labels))
+
+def _render_families(families: Dict[str, Tuple[List[str], List[str]]]) -> str:
+    """Render families as text, each HELP/TYPE header once followed by its samples."""
+    lines = []
+    for header, samples in families.values():
+        lines.extend(header)
+        lines.extend(samples)
+    return '\n'.join(lines) + '\n' if lines else ''
+
+def _parse_families(text: str) -> Dict[str, Tuple[List[str], List[str]]]:
+    """Split rendered text back into families; samples belong to the last HELP/TYPE above them."""
+    families = {}
+    current = None
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        if line.startswith('# HELP ') or line.startswith('# TYPE '):
+            current = line.split()[2]
+            header, _ = families.setdefault(current, ([], []))
+            header.append(line)
+        elif current is not None and not line.startswith('#'):
+            families[current][1].append(line)
+    return families
+
+REGISTRY = Registry()
+
+LIGHTSPEED_REQUESTS = REGISTRY.counter(
+    'lightspeed_requests_total', 'Lightspeed API requests by endpoint and HTTP status', ('endpoint', 'status'))
+LIGHTSPEED_REQUEST_SECONDS = REGISTRY.histogram(
+    'lightspeed_request_duration_seconds', 'Lightspeed API request latency', ('endpoint',))
+LIGHTSPEED_RATE_LIMIT_REMAINING = REGISTRY.gauge(
+    'lightspeed_rate_limit_remaining', 'X-RateLimit-Remaining from the last Lightspeed response')
+LIGHTSPEED_RATE_LIMIT_WAIT_SECONDS = REGISTRY.counter(
+    'lightspeed_rate_limit_wait_seconds_total', 'Time spent waiting on Lightspeed rate limits', ('reason',))
+LIGHTSPEED_BUDGET_REQUESTS = REGISTRY.counter(
+    'lightspeed_budget_requests_total', 'Lightspeed requests charged to each entity by the rate-budget scheduler', ('entity',))
+LIGHTSPEED_BUDGET_PAUSE_SECONDS = REGISTRY.counter(
+    'lightspeed_budget_pause_seconds_total', 'Time entity crawls were paused to protect the rate budget', ('entity',))
+SUPABASE_ROWS_UPSERTED = REGISTRY.counter(
+    'supabase_rows_upserted_total', 'Rows upserted into Supabase by table', ('table',))
+SUPABASE_BATCH_SECONDS = REGISTRY.histogram(
+    'supabase_upsert_batch_duration_seconds', 'Supabase upsert batch latency', ('table',))
+SUPABASE_RAW_BYTES = REGISTRY.counter(
+    'supabase_request_raw_bytes_total', 'Uncompressed JSON bytes of Supabase write requests by table', ('table',))
+SUPABASE_WIRE_BYTES = REGISTRY.counter(
+    'supabase_request_wire_bytes_total', 'Bytes sent in Supabase write request bodies (gzip when accepted) by table', ('table',))
+SYNC_RUNS = REGISTRY.counter(
+    'sync_runs_total', 'Entity sync runs by outcome', ('account', 'entity_type', 'status'))
+SYNC_LAST_DURATION_SECONDS = REGISTRY.gauge(
+    'sync_last_duration_seconds', 'Duration of the last entity sync', ('account', 'entity_type'))
+SYNC_LAST_RECORDS = REGISTRY.gauge(
+    'sync_last_records_processed', 'Records processed by the last entity sync', ('account', 'entity_type'))
+SYNC_LAST_RUN_TIMESTAMP = REGISTRY.gauge(
+    'sync_last_run_timestamp_seconds', 'Unix time the last entity sync finished', ('account', 'entity_type'))
+
+def endpoint_label(endpoint: str) -> str:
+    """Collapse record ids so '2.0/sales/<id>' is counted as '2.0/sales/:id'."""
+    parts = endpoint.strip('/').split('/')
+    if len(parts) > 2:
+        parts = parts[:2] + [':id'] + parts[3:]
+    return '/'.join(parts)
+
+def record_request(endpoint: str, status: int, seconds: float, rate_limit_remaining: Optional[str] = None):
+    """Record one Lightspeed API request."""
+    label = endpoint_label(endpoint)
+    LIGHTSPEED_REQUESTS.inc(endpoint=label, status=status)
+    LIGHTSPEED_REQUEST_SECONDS.observe(seconds, endpoint=label)
+    if rate_limit_remaining is not None:
+        try:
+            LIGHTSPEED_RATE_LIMIT_REMAINING.set(float(rate_limit_remaining))
+        except ValueError:
+            pass
+
+def record_rate_limit_wait(seconds: float, reason: str):
+    """Record time blocked by the client throttle ('throttle') or a 429 ('retry_after')."""
+    LIGHTSPEED_RATE_LIMIT_WAIT_SECONDS.inc(seconds, reason=reason)
+
+def record_budget_request(entity: str):
+    """Record a request charged to an entity's rate budget."""
+    LIGHTSPEED_BUDGET_REQUESTS.inc(entity=entity)
+
+def record_budget_pause(entity: str, seconds: float):
+    """Record time an entity's crawl was paused by the rate-budget scheduler."""
+    LIGHTSPEED_BUDGET_PAUSE_SECONDS.inc(seconds, entity=entity)
+
+def record_upsert(table: str, rows: int, seconds: float):
+    """Record one upserted batch."""
+    SUPABASE_ROWS_UPSERTED.inc(rows, table=table)
+    SUPABASE_BATCH_SECONDS.observe(seconds, table=table)
+
+def record_request_bytes(table: str, raw_bytes: int, wire_bytes: int):
+    """Record the uncompressed and on-the-wire size of one write request body."""
+    SUPABASE_RAW_BYTES.inc(raw_bytes, table=table)
+    SUPABASE_WIRE_BYTES.inc(wire_bytes, table=table)
+
+def record_sync(entity_type: str, status: str, duration: float, records_processed: int, finished_at: float,
+                account: Optional[str] = None):
+    """Record the outcome of one entity sync for an account ('default' in single-account mode)."""
+    account = account or DEFAULT_ACCOUNT
+    SYNC_RUNS.inc(account=account, entity_type=entity_type, status=status)
+    SYNC_LAST_DURATION_SECONDS.set(duration, account=account, entity_type=entity_type)
+    SYNC_LAST_RECORDS.set(records_processed, account=account, entity_type=entity_type)
+    SYNC_LAST_RUN_TIMESTAMP.set(finished_at, account=account, entity_type=entity_type)
+
+def job_textfile(path: str, job: str) -> str:
+    """Return a job's textfile next to SYNC_METRICS_TEXTFILE: /m/sync.prom -> /m/sync.<job>.prom."""
+    root, ext = os.path.splitext(path)
+    return f"{root}.{job}{ext or '.prom'}"
+
+def write_textfile(job: str, path: Optional[str] = None) -> Optional[str]:
+    """Atomically write the registry to this job's file, labelling every sample with job."""
+    path = path or os.environ.get('SYNC_METRICS_TEXTFILE')
+    if not path:
+        return None
+    path = job_textfile(path, job)
+    try:
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            f.write(REGISTRY.render(f'job="{_escape(job)}"'))
+        os.replace(tmp_path, path)
+        logger.info(f"Wrote sync metrics to {path}")
+        return path
+    except OSError as e:
+        logger.warning(f"Failed to write sync metrics to {path}: {e}")
+        return None
+
+def render_metrics(textfile: Optional[str] = None) -> str:
+    """Render this process's metrics merged with every job's last textfile.
+
+    Families are merged by name so each HELP/TYPE appears once; the job label keeps
+    the textfile series apart from this process's own.
+    """
+    families = REGISTRY.families()
+    textfile = textfile or os.environ.get('SYNC_METRICS_TEXTFILE')
+    if textfile:
+        root, ext = os.path.splitext(textfile)
+        for path in sorted(glob.glob(f"{glob.escape(root)}.*{ext or '.prom'}")):
+            try:
+                with open(path) as f:
+                    parsed = _parse_families(f.read())
+            except OSError:
+                continue
+            for name, (header, samples) in parsed.items():
+                families.setdefault(name, (header, []))[1].extend(samples)
+    return _render_families(families)
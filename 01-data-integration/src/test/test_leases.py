@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for sync leases.
+Runs against the in-process backend by default; pass --supabase to run the same
+checks against the sync_leases table (script/create_sync_leases.sql), e.g. on a
+local Supabase stack.
+"""
+
+import sys
+import time
+import argparse
+import threading
+from dotenv import load_dotenv
+
+sys.path.insert(0, 'src')
+from leases import Lease, LeaseLostError, MemoryLeaseBackend, SupabaseLeaseBackend, lease_resource
+
+load_dotenv('.env.local')
+
+class FakeClock:
+    """Clock that only moves when told to."""
+
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+def check(label, condition):
+    print(f"{'✅' if condition else '❌'} {label}")
+    return condition
+
+def test_leases(backend, advance):
+    """Run the ownership, heartbeat and takeover checks; advance(seconds) expires leases."""
+    resource = lease_resource('sales', 'lease-test', str(int(time.time())))
+    results = []
+
+    first = Lease(backend, resource, 'worker-a', ttl_seconds=2)
+    second = Lease(backend, resource, 'worker-b', ttl_seconds=2)
+
+    results.append(check("first worker acquires the lease", first.acquire()))
+    results.append(check("second worker is refused while it is held", not second.acquire()))
+    results.append(check("holder is reported", first.holder() == 'worker-a'))
+    results.append(check("owner can renew", backend.renew(resource, 'worker-a', 2)))
+
+    # Simulate worker-a dying: stop its heartbeat without releasing
+    first.stop_event.set()
+    first.heartbeat_thread.join()
+    advance(3)
+    results.append(check("expired lease is taken over", second.acquire()))
+    results.append(check("old owner's heartbeat is rejected", not backend.renew(resource, 'worker-a', 2)))
+
+    first.lost.set()
+    try:
+        first.check()
+        results.append(check("old owner sees LeaseLostError", False))
+    except LeaseLostError:
+        results.append(check("old owner sees LeaseLostError", True))
+
+    results.append(check("non-owner cannot release", not backend.release(resource, 'worker-a')))
+    second.release()
+    results.append(check("released lease is free", backend.holder(resource) is None))
+
+    # Many workers racing for one free lease: exactly one wins
+    race_resource = resource + '-race'
+    winners = []
+    def contend(index):
+        if backend.acquire(race_resource, f'racer-{index}', 30):
+            winners.append(index)
+    threads = [threading.Thread(target=contend, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.append(check(f"exactly one of 8 racing workers wins ({len(winners)})", len(winners) == 1))
+    if winners:
+        backend.release(race_resource, f'racer-{winners[0]}')
+
+    print(f"\n📊 {sum(results)}/{len(results)} checks passed")
+    return all(results)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check sync lease semantics")
+    parser.add_argument('--supabase', action='store_true', help="test the Supabase backend instead of the in-process one")
+    args = parser.parse_args()
+
+    if args.supabase:
+        from incremental_sync import create_supabase_client
+        print("🧪 Testing Supabase leases...")
+        success = test_leases(SupabaseLeaseBackend(create_supabase_client()), time.sleep)
+    else:
+        print("🧪 Testing in-process leases...")
+        clock = FakeClock()
+        def advance(seconds):
+            clock.now += seconds
+        success = test_leases(MemoryLeaseBackend(clock), advance)
+    sys.exit(0 if success else 1)
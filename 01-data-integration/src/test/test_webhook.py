@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Test script that posts sample Lightspeed webhook payloads to the local dashboard.
+Start the app (src/run_app.py) first, then run the webhook worker to sync them.
+"""
+
+import os
+import sys
+import hmac
+import json
+import hashlib
+import requests
+from urllib.parse import urlencode
+from dotenv import load_dotenv
+
+sys.path.insert(0, 'src')
+from local_queue import get_change_queue
+
+load_dotenv('.env.local')
+
+WEBHOOK_URL = os.environ.get('WEBHOOK_TEST_URL', 'http://127.0.0.1:5001/webhooks/lightspeed')
+
+def post_webhook(webhook_type, payload):
+    """Post one form-encoded webhook, signed when LIGHTSPEED_WEBHOOK_SECRET is set."""
+    data = {'type': webhook_type, 'payload': json.dumps(payload)}
+    body = urlencode(data)
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+    secret = os.environ.get('LIGHTSPEED_WEBHOOK_SECRET')
+    if secret:
+        signature = hmac.new(secret.encode('utf-8'), body.encode('utf-8'), hashlib.sha256).hexdigest()
+        headers['X-Signature'] = f"signature={signature}, algorithm=HMAC-SHA256"
+
+    response = requests.post(WEBHOOK_URL, data=body, headers=headers, timeout=10)
+    print(f"{webhook_type}: {response.status_code} {response.text.strip()}")
+    return response
+
+def test_webhooks(sale_id, product_id):
+    print("🧪 Posting sample webhooks...")
+
+    # The same sale twice should coalesce into one queued id
+    post_webhook('sale.update', {'id': sale_id})
+    post_webhook('sale.update', {'id': sale_id})
+    post_webhook('product.update', {'id': product_id})
+    post_webhook('inventory.update', {'id': 'inventory-test', 'product_id': product_id, 'outlet_id': 'outlet-test'})
+    post_webhook('register_sale.unknown', {'id': 'ignored'})
+
+    # Missing payload should be rejected
+    response = requests.post(WEBHOOK_URL, data={'type': 'sale.update'}, timeout=10)
+    print(f"invalid payload: {response.status_code} {'✅' if response.status_code in (400, 401) else '❌'}")
+
+    print(f"\n📊 Queue depth: {get_change_queue().depth()}")
+    print("Run `python3 src/webhook_worker.py --once` to sync the queued records")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3:
+        print("Usage: python3 src/test/test_webhook.py <sale_id> <product_id>")
+        sys.exit(1)
+    test_webhooks(sys.argv[1], sys.argv[2])
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Worker for Lightspeed webhook notifications.
+Drains the local change queue filled by the dashboard's /webhooks/lightspeed
+endpoint: ids are coalesced, the current records are fetched from Lightspeed
+and upserted in batches, so changes land within seconds of the notification.
+"""
+
+import os
+import sys
+import time
+import signal
+import logging
+import argparse
+import threading
+from typing import Dict, List, Tuple
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from incremental_sync import (create_supabase_client, batch_upsert, transform_sale, transform_line_item,
+                              transform_product, transform_customer, transform_inventory)
+from lightspeed_client import create_lightspeed_client, LightspeedNotFoundError
+from analytics_snapshot import append_to_snapshot
+from local_queue import get_change_queue
+
+logger = logging.getLogger(__name__)
+
+# Ids fetched and upserted together per entity
+DEFAULT_BATCH_SIZE = 50
+
+# Seconds a record must go without new notifications before it is fetched, so bursts coalesce
+DEFAULT_SETTLE_SECONDS = 2.0
+
+# Seconds to sleep when the queue is empty
+IDLE_SECONDS = 1.0
+
+def fetch_sale(lightspeed, sale_id: str) -> Dict[str, List[Dict]]:
+    """Fetch a sale and its line items."""
+    sale = lightspeed.get_sale(sale_id)
+    if not sale:
+        return {}
+    return {'lightspeed_sales': [transform_sale(sale)],
+            'lightspeed_sale_line_items': [transform_line_item(sale_id, item) for item in sale.get('line_items') or []]}
+
+def fetch_product(lightspeed, product_id: str) -> Dict[str, List[Dict]]:
+    """Fetch a product."""
+    product = lightspeed.get_product(product_id)
+    return {'lightspeed_products': [transform_product(product)]} if product else {}
+
+def fetch_customer(lightspeed, customer_id: str) -> Dict[str, List[Dict]]:
+    """Fetch a customer."""
+    customer = lightspeed.get_customer(customer_id)
+    return {'lightspeed_customers': [transform_customer(customer)]} if customer else {}
+
+def fetch_inventory(lightspeed, product_id: str) -> Dict[str, List[Dict]]:
+    """Fetch every outlet's inventory record for a product."""
+    return {'lightspeed_inventory': [transform_inventory(item) for item in lightspeed.get_product_inventory(product_id)]}
+
+# Entity type -> fetcher returning {table: transformed rows} for one id; tables are written in this order
+FETCHERS = {
+    'sales': fetch_sale,
+    'products': fetch_product,
+    'customers': fetch_customer,
+    'inventory': fetch_inventory
+}
+
+def fetch_batch(fetcher, lightspeed, record_ids: List[str]) -> Tuple[Dict[str, List[Dict]], List[str], Dict[str, str]]:
+    """Fetch each id on its own; returns ({table: rows}, ids no longer in Lightspeed, {failed id: error}).
+
+    The 2.0 API has no multi-id lookup for these records, so every id costs one request;
+    one bad id must not fail the rest of the batch.
+    """
+    tables: Dict[str, List[Dict]] = {}
+    missing, failures = [], {}
+    for record_id in record_ids:
+        try:
+            rows = fetcher(lightspeed, record_id)
+        except LightspeedNotFoundError:
+            missing.append(record_id)
+            continue
+        except Exception as e:
+            failures[record_id] = str(e)
+            continue
+        for table, records in rows.items():
+            tables.setdefault(table, []).extend(records)
+    return tables, missing, failures
+
+class WebhookWorker:
+    """Claims queued ids, fetches the records and upserts them."""
+
+    def __init__(self, lightspeed, supabase, queue, batch_size: int = DEFAULT_BATCH_SIZE,
+                 settle_seconds: float = DEFAULT_SETTLE_SECONDS):
+        """Initialize the worker."""
+        self.lightspeed = lightspeed
+        self.supabase = supabase
+        self.queue = queue
+        self.batch_size = batch_size
+        self.settle_seconds = settle_seconds
+        self.stop_event = threading.Event()
+
+    def stop(self, *_):
+        """Ask the worker to exit after the current batch."""
+        self.stop_event.set()
+
+    def process_entity(self, entity_type: str) -> int:
+        """Sync one batch of queued ids for an entity; returns the number processed."""
+        claimed = self.queue.claim(entity_type, self.batch_size, self.settle_seconds)
+        if not claimed:
+            return 0
+
+        record_ids = [record_id for record_id, _ in claimed]
+        start_time = time.time()
+        tables, missing, failures = fetch_batch(FETCHERS[entity_type], self.lightspeed, record_ids)
+        if missing:
+            # Deleted since the notification; nothing left to sync
+            logger.info(f"Skipping {len(missing)} {entity_type} no longer in Lightspeed")
+        for record_id, error in failures.items():
+            logger.error(f"Failed to fetch queued {entity_type} {record_id}: {error}")
+            self.queue.fail(entity_type, [item for item in claimed if item[0] == record_id], error)
+        fetched = [item for item in claimed if item[0] not in failures]
+
+        try:
+            for table, records in tables.items():
+                batch_upsert(self.supabase, table, records)
+                append_to_snapshot(table, records)
+        except Exception as e:
+            logger.error(f"Failed to sync {len(fetched)} queued {entity_type}: {e}")
+            self.queue.ack(entity_type, [item for item in fetched if item[0] in missing])
+            self.queue.fail(entity_type, [item for item in fetched if item[0] not in missing], str(e))
+            return len(claimed)
+
+        self.queue.ack(entity_type, fetched)
+        logger.info(f"⚡ Synced {len(fetched) - len(missing)} {entity_type} from webhooks in {time.time() - start_time:.1f}s")
+        return len(claimed)
+
+    def run_once(self) -> int:
+        """Process one batch of every entity type."""
+        return sum(self.process_entity(entity_type) for entity_type in FETCHERS)
+
+    def run(self):
+        """Process the queue until stopped."""
+        logger.info(f"Webhook worker started (queue: {self.queue.path})")
+        while not self.stop_event.is_set():
+            if self.run_once() == 0:
+                self.stop_event.wait(IDLE_SECONDS)
+        logger.info("Webhook worker stopped")
+
+def main():
+    """Run the webhook worker."""
+    load_dotenv('.env.local')
+
+    parser = argparse.ArgumentParser(description="Sync records announced by Lightspeed webhooks")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--settle', type=float, default=DEFAULT_SETTLE_SECONDS,
+                        help="seconds without new notifications before a record is fetched")
+    parser.add_argument('--once', action='store_true', help="drain what is queued now and exit")
+    args = parser.parse_args()
+
+    print("⚡ Starting Webhook Worker")
+    print("=" * 40)
+
+    try:
+        worker = WebhookWorker(create_lightspeed_client(), create_supabase_client(), get_change_queue(),
+                               args.batch_size, args.settle)
+        signal.signal(signal.SIGTERM, worker.stop)
+        signal.signal(signal.SIGINT, worker.stop)
+
+        if args.once:
+            worker.settle_seconds = 0
+            while worker.run_once():
+                pass
+            print(f"✅ Queue drained, remaining: {worker.queue.depth()}")
+        else:
+            worker.run()
+        return True
+
+    except Exception as e:
+        logger.error(f"Webhook worker failed: {e}")
+        print(f"❌ Error: {e}")
+        return False
+
+if __name__ == "__main__":
+    success = main()
+    sys.exit(0 if success else 1)
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Parsing and verification of Lightspeed webhook notifications.
+Lightspeed posts form-encoded 'type' and 'payload' fields (payload is the changed
+object as JSON); JSON bodies with the same keys are accepted for local testing.
+"""
+
+import hmac
+import json
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Webhook object type -> (entity_type, payload field holding the id to sync)
+WEBHOOK_ENTITIES = {
+    'sale': ('sales', 'id'),
+    'product': ('products', 'id'),
+    'customer': ('customers', 'id'),
+    # Inventory is refetched per product, which covers every outlet's record
+    'inventory': ('inventory', 'product_id')
+}
+
+class WebhookError(Exception):
+    """Raised for webhook requests that cannot be accepted."""
+    pass
+
+def verify_signature(body: bytes, header: Optional[str], secret: str) -> bool:
+    """Check an 'X-Signature: signature=<hex>, algorithm=HMAC-SHA256' header against the raw body."""
+    if not header:
+        return False
+    fields = dict(part.strip().split('=', 1) for part in header.split(',') if '=' in part)
+    signature = fields.get('signature', header.strip())
+    expected = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(signature, expected)
+
+def parse_webhook(form: Dict, json_body: Optional[Dict]) -> Tuple[str, Dict]:
+    """Return the webhook type (e.g. 'sale.update') and decoded payload."""
+    source = json_body if json_body else form
+    webhook_type = (source.get('type') or '').strip()
+    payload = source.get('payload')
+
+    if isinstance(payload, str):
+        try:
+            payload = json.loads(payload)
+        except ValueError:
+            raise WebhookError("payload is not valid JSON")
+
+    if not webhook_type or not isinstance(payload, dict):
+        raise WebhookError("expected 'type' and an object 'payload'")
+    return webhook_type, payload
+
+def changed_records(webhook_type: str, payload: Dict) -> Optional[Tuple[str, List[str]]]:
+    """Map a notification to (entity_type, ids to sync), or None for types we don't sync."""
+    object_type = webhook_type.split('.')[0]
+    if object_type not in WEBHOOK_ENTITIES:
+        return None
+
+    entity_type, id_field = WEBHOOK_ENTITIES[object_type]
+    record_id = payload.get(id_field)
+    if not record_id:
+        raise WebhookError(f"{webhook_type} payload has no {id_field}")
+    return entity_type, [str(record_id)]
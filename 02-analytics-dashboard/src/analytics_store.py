@@ -0,0 +1,199 @@
+"""
+Embedded DuckDB analytics store over the Parquet snapshot written by the sync.
+Dashboard pages query it with SQL instead of pulling raw rows over PostgREST.
+"""
+
+import os
+import glob
+import time
+import logging
+import threading
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_TABLES = {
+    'sales': 'lightspeed_sales',
+    'line_items': 'lightspeed_sale_line_items',
+    'products': 'lightspeed_products'
+}
+
+# The sync may compact a table (deleting merged files) while it is being read
+REFRESH_ATTEMPTS = 3
+REFRESH_RETRY_SECONDS = 0.5
+
+class AnalyticsStore:
+    """Local DuckDB database loaded from the analytics snapshot."""
+
+    def __init__(self, snapshot_dir):
+        """Open an in-memory DuckDB database over snapshot_dir."""
+        import duckdb
+
+        self.snapshot_dir = snapshot_dir
+        self.con = duckdb.connect(database=':memory:')
+        self._lock = threading.Lock()
+        self._loaded_mtime = None
+        self.refresh()
+
+    def _snapshot_mtime(self):
+        """Latest modification time across the snapshot files."""
+        mtimes = []
+        for f in glob.glob(os.path.join(self.snapshot_dir, '*', '*.parquet')):
+            try:
+                mtimes.append(os.path.getmtime(f))
+            except FileNotFoundError:
+                # Removed by a compaction since the glob; base.parquet carries its rows
+                pass
+        return max(mtimes, default=None)
+
+    def _load(self):
+        """Rebuild the tables from the snapshot files in one transaction."""
+        self.con.begin()
+        try:
+            for name, table in SNAPSHOT_TABLES.items():
+                pattern = os.path.join(self.snapshot_dir, table, '*.parquet')
+                # Delta files may repeat an id; keep the most recently synced copy
+                self.con.execute(f"""
+                    CREATE OR REPLACE TABLE {name} AS
+                    SELECT * EXCLUDE (_synced_at)
+                    FROM read_parquet('{pattern}', union_by_name = true)
+                    QUALIFY row_number() OVER (PARTITION BY id ORDER BY _synced_at DESC) = 1
+                """)
+            self.con.execute("""
+                CREATE OR REPLACE TABLE sales_by_day AS
+                SELECT CAST(CAST(sale_date AS TIMESTAMPTZ) AS DATE) AS sale_day, id, total_price
+                FROM sales
+            """)
+            self.con.commit()
+        except Exception:
+            self.con.rollback()
+            raise
+
+    def refresh(self):
+        """Reload the tables when the sync has written new snapshot files."""
+        mtime = self._snapshot_mtime()
+        if mtime is None or mtime == self._loaded_mtime:
+            return
+
+        with self._lock:
+            for attempt in range(1, REFRESH_ATTEMPTS + 1):
+                try:
+                    self._load()
+                    self._loaded_mtime = mtime
+                    return
+                except Exception as e:
+                    # Usually a file deleted by a compaction between the glob and the read
+                    if attempt == REFRESH_ATTEMPTS:
+                        if self._loaded_mtime is None:
+                            raise
+                        logger.warning(f"Could not reload analytics snapshot ({e}); serving the previous load")
+                        return
+                    time.sleep(REFRESH_RETRY_SECONDS)
+                    mtime = self._snapshot_mtime() or mtime
+
+    def query(self, sql, params=None):
+        """Run a query and return a DataFrame."""
+        self.refresh()
+        with self._lock:
+            return self.con.execute(sql, params or []).fetchdf()
+
+    def sales_totals(self, date_from, date_to):
+        """Total revenue and transaction count for the period."""
+        df = self.query("""
+            SELECT coalesce(sum(total_price), 0) AS total_revenue, count(*) AS transactions
+            FROM sales_by_day WHERE sale_day BETWEEN ? AND ?
+        """, [date_from, date_to])
+        return float(df['total_revenue'][0]), int(df['transactions'][0])
+
+    def daily_revenue(self, date_from, date_to):
+        """Revenue per day."""
+        return self.query("""
+            SELECT sale_day AS "Date", coalesce(sum(total_price), 0) AS "Revenue"
+            FROM sales_by_day WHERE sale_day BETWEEN ? AND ?
+            GROUP BY sale_day ORDER BY sale_day
+        """, [date_from, date_to])
+
+    def revenue_by_day_of_week(self, date_from, date_to):
+        """Revenue per day of week, Monday first."""
+        return self.query("""
+            SELECT dayname(sale_day) AS day_of_week, coalesce(sum(total_price), 0) AS total_price
+            FROM sales_by_day WHERE sale_day BETWEEN ? AND ?
+            GROUP BY day_of_week, isodow(sale_day) ORDER BY isodow(sale_day)
+        """, [date_from, date_to])
+
+    def top_products(self, date_from, date_to, by='quantity', limit=10):
+        """Top products by units sold ('quantity') or line revenue ('revenue')."""
+        measure = 'sum(li.quantity)' if by == 'quantity' else 'sum(li.price_total)'
+        return self.query(f"""
+            SELECT p.name, coalesce({measure}, 0) AS value
+            FROM line_items li
+            JOIN sales_by_day s ON s.id = li.sale_id
+            JOIN products p ON p.id = li.product_id
+            WHERE s.sale_day BETWEEN ? AND ?
+            GROUP BY p.name ORDER BY value DESC LIMIT ?
+        """, [date_from, date_to, limit])
+
+    def product_profitability(self, date_from, date_to, limit=20):
+        """Revenue, units, cost and margin per product."""
+        return self.query("""
+            WITH per_product AS (
+                SELECT p.name,
+                       sum(coalesce(li.price_total, 0)) AS revenue,
+                       sum(coalesce(li.quantity, 0)) AS quantity,
+                       coalesce(first(p.cost), 0) AS cost,
+                       coalesce(first(p.price), 0) AS price
+                FROM line_items li
+                JOIN sales_by_day s ON s.id = li.sale_id
+                JOIN products p ON p.id = li.product_id
+                WHERE s.sale_day BETWEEN ? AND ?
+                GROUP BY p.name
+            )
+            SELECT *, cost * quantity AS total_cost,
+                   revenue - cost * quantity AS gross_profit,
+                   round((revenue - cost * quantity) / revenue * 100, 1) AS margin_percent
+            FROM per_product WHERE revenue > 0
+            ORDER BY gross_profit DESC LIMIT ?
+        """, [date_from, date_to, limit])
+
+    def product_summary(self, date_from, date_to):
+        """Units, revenue and transaction count per product and SKU."""
+        return self.query("""
+            SELECT p.name AS "Product", p.sku AS "SKU",
+                   sum(coalesce(li.quantity, 0)) AS "Units Sold",
+                   sum(coalesce(li.price_total, 0)) AS "Revenue",
+                   count(li.sale_id) AS "Transactions"
+            FROM line_items li
+            JOIN sales_by_day s ON s.id = li.sale_id
+            JOIN products p ON p.id = li.product_id
+            WHERE s.sale_day BETWEEN ? AND ?
+            GROUP BY p.name, p.sku ORDER BY "Revenue" DESC
+        """, [date_from, date_to])
+
+    def daily_product_revenue(self, date_from, date_to, product_names):
+        """Daily revenue for the selected products."""
+        if not product_names:
+            return pd.DataFrame(columns=['sale_date', 'name', 'revenue'])
+        placeholders = ', '.join('?' for _ in product_names)
+        return self.query(f"""
+            SELECT s.sale_day AS sale_date, p.name, sum(coalesce(li.price_total, 0)) AS revenue
+            FROM line_items li
+            JOIN sales_by_day s ON s.id = li.sale_id
+            JOIN products p ON p.id = li.product_id
+            WHERE s.sale_day BETWEEN ? AND ? AND p.name IN ({placeholders})
+            GROUP BY s.sale_day, p.name ORDER BY s.sale_day
+        """, [date_from, date_to, *product_names])
+
+def open_analytics_store(snapshot_dir):
+    """Open the store if a snapshot and duckdb are available, otherwise return None."""
+    if not snapshot_dir:
+        return None
+    for table in SNAPSHOT_TABLES.values():
+        if not glob.glob(os.path.join(snapshot_dir, table, '*.parquet')):
+            return None
+    try:
+        return AnalyticsStore(snapshot_dir)
+    except ImportError:
+        return None
+    except Exception as e:
+        logger.warning(f"Could not load analytics snapshot ({e}); using Supabase")
+        return None
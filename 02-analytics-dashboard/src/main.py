@@ -1,11 +1,17 @@
 import streamlit as st
 import os
+import sys
 from dotenv import load_dotenv
 from supabase import create_client
 import pandas as pd
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
+from analytics_store import open_analytics_store
+
+# Shared Supabase helpers live with the sync code
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '01-data-integration', 'src'))
+from supabase_reader import read_all
 
 # Load environment variables - try multiple sources for local vs cloud deployment
 try:
@@ -17,6 +23,9 @@ except:
 SUPABASE_URL = os.getenv("SUPABASE_URL") or st.secrets.get("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or st.secrets.get("SUPABASE_SERVICE_ROLE_KEY")
 
+# Optional local Parquet snapshot kept current by the sync (see analytics_store.py)
+ANALYTICS_SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR")
+
 st.set_page_config(
     page_title="Craft Contemporary Analytics",
     page_icon="🎨",
@@ -31,17 +40,19 @@ def init_supabase():
         st.stop()
     return create_client(SUPABASE_URL, SUPABASE_KEY)
 
+@st.cache_resource
+def get_analytics_store():
+    """Open the local DuckDB analytics store when a snapshot is available"""
+    return open_analytics_store(ANALYTICS_SNAPSHOT_DIR)
+
 @st.cache_data(ttl=300)  # Cache for 5 minutes
 def load_sales_data(date_from, date_to):
     """Load sales data with caching"""
     try:
         supabase = init_supabase()
-        response = supabase.table("lightspeed_sales")\
-            .select("*")\
-            .gte("sale_date", date_from)\
-            .lte("sale_date", date_to)\
-            .execute()
-        return pd.DataFrame(response.data)
+        rows = read_all(supabase, "lightspeed_sales",
+                        filters=lambda q: q.gte("sale_date", date_from).lte("sale_date", date_to))
+        return pd.DataFrame(rows)
     except Exception as e:
         st.error(f"Error loading sales data: {e}")
         return pd.DataFrame()
@@ -51,10 +62,7 @@ def load_product_data():
     """Load product data with caching"""
     try:
         supabase = init_supabase()
-        response = supabase.table("lightspeed_products")\
-            .select("*")\
-            .execute()
-        return pd.DataFrame(response.data)
+        return pd.DataFrame(read_all(supabase, "lightspeed_products"))
     except Exception as e:
         st.error(f"Error loading product data: {e}")
         return pd.DataFrame()
@@ -66,16 +74,13 @@ def load_sales_with_products(date_from, date_to):
         supabase = init_supabase()
         
         # First get sales in date range
-        sales_response = supabase.table("lightspeed_sales")\
-            .select("id")\
-            .gte("sale_date", date_from)\
-            .lte("sale_date", date_to)\
-            .execute()
+        sales = read_all(supabase, "lightspeed_sales", columns="id",
+                         filters=lambda q: q.gte("sale_date", date_from).lte("sale_date", date_to))
         
-        if not sales_response.data:
+        if not sales:
             return pd.DataFrame()
         
-        sale_ids = [sale['id'] for sale in sales_response.data]
+        sale_ids = [sale['id'] for sale in sales]
         
         # Get line items for these sales (in batches due to query limits)
         all_line_items = []
@@ -125,6 +130,68 @@ def load_sales_with_products(date_from, date_to):
         st.error(f"Error loading sales with products: {e}")
         return pd.DataFrame()
 
+def load_dashboard_metrics(date_from, date_to):
+    """Aggregate headline metrics from the local analytics store, falling back to Supabase"""
+    store = get_analytics_store()
+    
+    if store:
+        try:
+            total_revenue, total_transactions = store.sales_totals(date_from, date_to)
+            if total_transactions == 0:
+                return None
+            top_products = store.top_products(date_from, date_to, by='quantity').set_index('name')['value']
+            top_revenue = store.top_products(date_from, date_to, by='revenue').set_index('name')['value']
+            return {
+                'total_revenue': total_revenue,
+                'total_transactions': total_transactions,
+                'daily_sales': store.daily_revenue(date_from, date_to),
+                'dow_sales': store.revenue_by_day_of_week(date_from, date_to),
+                'has_line_items': not top_products.empty,
+                'top_products': top_products,
+                'top_revenue': top_revenue
+            }
+        except Exception as e:
+            st.warning(f"Local analytics snapshot unavailable ({e}); loading from Supabase.")
+    
+    sales_df = load_sales_data(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
+    if sales_df.empty:
+        return None
+    
+    # Convert sale_date to datetime
+    sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
+    sales_df['total_price'] = pd.to_numeric(sales_df['total_price'], errors='coerce').fillna(0)
+    
+    # Group by date and sum sales
+    daily_sales = sales_df.groupby(sales_df['sale_date'].dt.date)['total_price'].sum().reset_index()
+    daily_sales.columns = ['Date', 'Revenue']
+    
+    # Add day of week and order days properly
+    sales_df['day_of_week'] = sales_df['sale_date'].dt.day_name()
+    dow_sales = sales_df.groupby('day_of_week')['total_price'].sum().reset_index()
+    day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+    dow_sales['day_of_week'] = pd.Categorical(dow_sales['day_of_week'], categories=day_order, ordered=True)
+    dow_sales = dow_sales.sort_values('day_of_week')
+    
+    # Load line items for product analysis
+    line_items_df = load_sales_with_products(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
+    top_products = top_revenue = None
+    
+    if not line_items_df.empty and 'name' in line_items_df.columns:
+        line_items_df['quantity'] = pd.to_numeric(line_items_df['quantity'], errors='coerce').fillna(0)
+        line_items_df['price_total'] = pd.to_numeric(line_items_df['price_total'], errors='coerce').fillna(0)
+        top_products = line_items_df.groupby('name')['quantity'].sum().sort_values(ascending=False).head(10)
+        top_revenue = line_items_df.groupby('name')['price_total'].sum().sort_values(ascending=False).head(10)
+    
+    return {
+        'total_revenue': sales_df['total_price'].sum(),
+        'total_transactions': len(sales_df),
+        'daily_sales': daily_sales,
+        'dow_sales': dow_sales,
+        'has_line_items': not line_items_df.empty,
+        'top_products': top_products,
+        'top_revenue': top_revenue
+    }
+
 def main():
     # Header
     st.title("🎨 Craft Contemporary Museum Shop")
@@ -160,26 +227,24 @@ def main():
     st.markdown("---")
     
     # Load data
-    sales_df = load_sales_data(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
-    products_df = load_product_data()
+    metrics = load_dashboard_metrics(date_from, date_to)
     
-    if sales_df.empty:
+    if metrics is None:
         st.warning(f"No sales data available from {date_from} to {date_to}.")
         return
     
-    # Convert sale_date to datetime
-    sales_df['sale_date'] = pd.to_datetime(sales_df['sale_date'])
-    sales_df['total_price'] = pd.to_numeric(sales_df['total_price'], errors='coerce').fillna(0)
+    total_revenue = metrics['total_revenue']
+    total_transactions = metrics['total_transactions']
+    daily_sales = metrics['daily_sales']
+    dow_sales = metrics['dow_sales']
     
     # Key Metrics Row
     col1, col2, col3, col4 = st.columns(4)
     
     with col1:
-        total_revenue = sales_df['total_price'].sum()
         st.metric("Total Revenue", f"${total_revenue:,.2f}")
     
     with col2:
-        total_transactions = len(sales_df)
         st.metric("Transactions", f"{total_transactions:,}")
     
     with col3:
@@ -199,10 +264,6 @@ def main():
     
     with col1:
         st.subheader("📈 Daily Sales Trend")
-        # Group by date and sum sales
-        daily_sales = sales_df.groupby(sales_df['sale_date'].dt.date)['total_price'].sum().reset_index()
-        daily_sales.columns = ['Date', 'Revenue']
-        
         fig = px.line(daily_sales, x='Date', y='Revenue', 
                      title=f"Daily Revenue ({date_from} to {date_to})")
         fig.update_layout(height=400)
@@ -211,15 +272,6 @@ def main():
     
     with col2:
         st.subheader("📊 Sales by Day of Week")
-        # Add day of week
-        sales_df['day_of_week'] = sales_df['sale_date'].dt.day_name()
-        dow_sales = sales_df.groupby('day_of_week')['total_price'].sum().reset_index()
-        
-        # Order days properly
-        day_order = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-        dow_sales['day_of_week'] = pd.Categorical(dow_sales['day_of_week'], categories=day_order, ordered=True)
-        dow_sales = dow_sales.sort_values('day_of_week')
-        
         fig = px.bar(dow_sales, x='day_of_week', y='total_price',
                     title="Revenue by Day of Week",
                     color='total_price',
@@ -230,20 +282,16 @@ def main():
     # Product Insights
     st.markdown("---")
     
-    # Load line items for product analysis
-    line_items_df = load_sales_with_products(date_from.strftime('%Y-%m-%d'), date_to.strftime('%Y-%m-%d'))
+    top_products = metrics['top_products']
+    top_revenue = metrics['top_revenue']
     
-    if not line_items_df.empty:
+    if metrics['has_line_items']:
         col1, col2 = st.columns(2)
         
         with col1:
             st.subheader("🏆 Top Selling Products")
             
-            # Extract product names and calculate quantities
-            if 'name' in line_items_df.columns:
-                line_items_df['quantity'] = pd.to_numeric(line_items_df['quantity'], errors='coerce').fillna(0)
-                top_products = line_items_df.groupby('name')['quantity'].sum().sort_values(ascending=False).head(10)
-                
+            if top_products is not None:
                 fig = px.bar(
                     y=top_products.index,
                     x=top_products.values,
@@ -259,11 +307,7 @@ def main():
         with col2:
             st.subheader("💰 Revenue by Product")
             
-            # Calculate revenue per product
-            if 'name' in line_items_df.columns:
-                line_items_df['price_total'] = pd.to_numeric(line_items_df['price_total'], errors='coerce').fillna(0)
-                top_revenue = line_items_df.groupby('name')['price_total'].sum().sort_values(ascending=False).head(10)
-                
+            if top_revenue is not None:
                 fig = px.bar(
                     y=top_revenue.index,
                     x=top_revenue.values,
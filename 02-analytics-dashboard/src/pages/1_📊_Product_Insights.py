@@ -3,7 +3,8 @@ import pandas as pd
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from main import init_supabase
+from main import init_supabase, get_analytics_store
+from supabase_reader import read_all
 
 st.set_page_config(
     page_title="Product Insights - Craft Contemporary",
@@ -18,12 +19,10 @@ def load_products_with_sales(date_from, date_to):
         supabase = init_supabase()
         
         # Load sales in date range
-        sales_response = supabase.table("lightspeed_sales")\
-            .select("*")\
-            .gte("sale_date", date_from)\
-            .lte("sale_date", date_to)\
-            .execute()
-        sales_df = pd.DataFrame(sales_response.data)
+        sales_df = pd.DataFrame(read_all(
+            supabase, "lightspeed_sales",
+            filters=lambda q: q.gte("sale_date", date_from).lte("sale_date", date_to)
+        ))
         
         if sales_df.empty:
             return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
@@ -45,10 +44,7 @@ def load_products_with_sales(date_from, date_to):
         line_items_df = pd.DataFrame(line_items_data)
         
         # Load all products
-        products_response = supabase.table("lightspeed_products")\
-            .select("*")\
-            .execute()
-        products_df = pd.DataFrame(products_response.data)
+        products_df = pd.DataFrame(read_all(supabase, "lightspeed_products"))
         
         return sales_df, line_items_df, products_df
         
@@ -56,6 +52,100 @@ def load_products_with_sales(date_from, date_to):
         st.error(f"Error loading product data: {e}")
         return pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
 
+def load_product_insights(date_from, date_to):
+    """Aggregate product performance from the local analytics store, falling back to Supabase"""
+    store = get_analytics_store()
+    
+    if store:
+        try:
+            product_summary = store.product_summary(date_from, date_to)
+            if product_summary.empty:
+                return None
+            return {
+                'revenue_by_product': store.top_products(date_from, date_to, by='revenue', limit=15).set_index('name')['value'],
+                'quantity_by_product': store.top_products(date_from, date_to, by='quantity', limit=15).set_index('name')['value'],
+                'profitability': store.product_profitability(date_from, date_to),
+                'product_summary': product_summary,
+                'daily_product_revenue': lambda names: store.daily_product_revenue(date_from, date_to, names)
+            }
+        except Exception as e:
+            st.warning(f"Local analytics snapshot unavailable ({e}); loading from Supabase.")
+    
+    sales_df, line_items_df, products_df = load_products_with_sales(
+        date_from.strftime('%Y-%m-%d'),
+        date_to.strftime('%Y-%m-%d')
+    )
+    
+    if line_items_df.empty or products_df.empty:
+        return None
+    
+    # Merge line items with product info
+    line_items_df['product_id'] = line_items_df['product_id'].astype(str)
+    products_df['id'] = products_df['id'].astype(str)
+    
+    product_sales = line_items_df.merge(
+        products_df[['id', 'name', 'sku', 'price', 'cost']],
+        left_on='product_id',
+        right_on='id',
+        how='left'
+    )
+    
+    # Calculate revenue and quantity by product
+    product_sales['revenue'] = pd.to_numeric(product_sales['price_total'], errors='coerce').fillna(0)
+    product_sales['quantity'] = pd.to_numeric(product_sales['quantity'], errors='coerce').fillna(0)
+    revenue_by_product = product_sales.groupby('name')['revenue'].sum().sort_values(ascending=False).head(15)
+    quantity_by_product = product_sales.groupby('name')['quantity'].sum().sort_values(ascending=False).head(15)
+    
+    profitability = None
+    if 'cost' in product_sales.columns and 'price' in product_sales.columns:
+        # Calculate profit margins
+        product_sales['cost'] = pd.to_numeric(product_sales['cost'], errors='coerce').fillna(0)
+        product_sales['price'] = pd.to_numeric(product_sales['price'], errors='coerce').fillna(0)
+        
+        # Group by product for profitability
+        profitability = product_sales.groupby('name').agg({
+            'revenue': 'sum',
+            'quantity': 'sum',
+            'cost': 'first',
+            'price': 'first'
+        }).reset_index()
+        
+        # Calculate metrics
+        profitability['total_cost'] = profitability['cost'] * profitability['quantity']
+        profitability['gross_profit'] = profitability['revenue'] - profitability['total_cost']
+        profitability['margin_percent'] = (profitability['gross_profit'] / profitability['revenue'] * 100).round(1)
+        
+        # Filter out products with no sales
+        profitability = profitability[profitability['revenue'] > 0].sort_values('gross_profit', ascending=False).head(20)
+    
+    # Create summary table
+    product_summary = product_sales.groupby(['name', 'sku']).agg({
+        'quantity': 'sum',
+        'revenue': 'sum',
+        'sale_id': 'count'
+    }).reset_index()
+    product_summary.columns = ['Product', 'SKU', 'Units Sold', 'Revenue', 'Transactions']
+    product_summary = product_summary.sort_values('Revenue', ascending=False)
+    
+    def daily_product_revenue(names):
+        # Merge with sales dates
+        product_trends = product_sales[product_sales['name'].isin(names)].merge(
+            sales_df[['id', 'sale_date']],
+            left_on='sale_id',
+            right_on='id',
+            how='left'
+        )
+        product_trends['sale_date'] = pd.to_datetime(product_trends['sale_date'])
+        return product_trends.groupby([product_trends['sale_date'].dt.date, 'name'])['revenue'].sum().reset_index()
+    
+    return {
+        'revenue_by_product': revenue_by_product,
+        'quantity_by_product': quantity_by_product,
+        'profitability': profitability,
+        'product_summary': product_summary,
+        'daily_product_revenue': daily_product_revenue
+    }
+
 def main():
     st.title("📊 Product Performance Deep Dive")
     st.markdown("### Comprehensive Product Analytics")
@@ -81,25 +171,14 @@ def main():
         st.markdown(f"**Analysis Period**: {(date_to - date_from).days} days")
     
     # Load data
-    sales_df, line_items_df, products_df = load_products_with_sales(
-        date_from.strftime('%Y-%m-%d'),
-        date_to.strftime('%Y-%m-%d')
-    )
+    insights = load_product_insights(date_from, date_to)
     
-    if line_items_df.empty or products_df.empty:
+    if insights is None:
         st.warning("No data available for the selected date range.")
         return
     
-    # Merge line items with product info
-    line_items_df['product_id'] = line_items_df['product_id'].astype(str)
-    products_df['id'] = products_df['id'].astype(str)
-    
-    product_sales = line_items_df.merge(
-        products_df[['id', 'name', 'sku', 'price', 'cost']],
-        left_on='product_id',
-        right_on='id',
-        how='left'
-    )
+    revenue_by_product = insights['revenue_by_product']
+    quantity_by_product = insights['quantity_by_product']
     
     st.markdown("---")
     
@@ -109,65 +188,36 @@ def main():
     with col1:
         st.subheader("🏆 Top Products by Revenue")
         
-        if not product_sales.empty:
-            # Calculate revenue by product
-            product_sales['revenue'] = pd.to_numeric(product_sales['price_total'], errors='coerce').fillna(0)
-            revenue_by_product = product_sales.groupby('name')['revenue'].sum().sort_values(ascending=False).head(15)
-            
-            fig = px.bar(
-                x=revenue_by_product.values,
-                y=revenue_by_product.index,
-                orientation='h',
-                title="Top 15 Products by Revenue",
-                labels={'x': 'Revenue ($)', 'y': 'Product'}
-            )
-            fig.update_layout(height=600)
-            st.plotly_chart(fig, use_container_width=True)
+        fig = px.bar(
+            x=revenue_by_product.values,
+            y=revenue_by_product.index,
+            orientation='h',
+            title="Top 15 Products by Revenue",
+            labels={'x': 'Revenue ($)', 'y': 'Product'}
+        )
+        fig.update_layout(height=600)
+        st.plotly_chart(fig, use_container_width=True)
     
     with col2:
         st.subheader("📦 Top Products by Units Sold")
         
-        if not product_sales.empty:
-            # Calculate quantity by product
-            product_sales['quantity'] = pd.to_numeric(product_sales['quantity'], errors='coerce').fillna(0)
-            quantity_by_product = product_sales.groupby('name')['quantity'].sum().sort_values(ascending=False).head(15)
-            
-            fig = px.bar(
-                x=quantity_by_product.values,
-                y=quantity_by_product.index,
-                orientation='h',
-                title="Top 15 Products by Units Sold",
-                labels={'x': 'Units Sold', 'y': 'Product'},
-                color_discrete_sequence=['#FF6B6B']
-            )
-            fig.update_layout(height=600)
-            st.plotly_chart(fig, use_container_width=True)
+        fig = px.bar(
+            x=quantity_by_product.values,
+            y=quantity_by_product.index,
+            orientation='h',
+            title="Top 15 Products by Units Sold",
+            labels={'x': 'Units Sold', 'y': 'Product'},
+            color_discrete_sequence=['#FF6B6B']
+        )
+        fig.update_layout(height=600)
+        st.plotly_chart(fig, use_container_width=True)
     
     # Product Profitability Analysis
     st.markdown("---")
     st.subheader("💰 Product Profitability Analysis")
     
-    if 'cost' in product_sales.columns and 'price' in product_sales.columns:
-        # Calculate profit margins
-        product_sales['cost'] = pd.to_numeric(product_sales['cost'], errors='coerce').fillna(0)
-        product_sales['price'] = pd.to_numeric(product_sales['price'], errors='coerce').fillna(0)
-        
-        # Group by product for profitability
-        profitability = product_sales.groupby('name').agg({
-            'revenue': 'sum',
-            'quantity': 'sum',
-            'cost': 'first',
-            'price': 'first'
-        }).reset_index()
-        
-        # Calculate metrics
-        profitability['total_cost'] = profitability['cost'] * profitability['quantity']
-        profitability['gross_profit'] = profitability['revenue'] - profitability['total_cost']
-        profitability['margin_percent'] = (profitability['gross_profit'] / profitability['revenue'] * 100).round(1)
-        
-        # Filter out products with no sales
-        profitability = profitability[profitability['revenue'] > 0].sort_values('gross_profit', ascending=False).head(20)
-        
+    profitability = insights['profitability']
+    if profitability is not None:
         # Create profitability scatter plot
         fig = px.scatter(
             profitability,
@@ -185,67 +235,48 @@ def main():
     st.markdown("---")
     st.subheader("📋 Detailed Product Performance")
     
-    if not product_sales.empty:
-        # Create summary table
-        product_summary = product_sales.groupby(['name', 'sku']).agg({
-            'quantity': 'sum',
-            'revenue': 'sum',
-            'sale_id': 'count'
-        }).reset_index()
-        
-        product_summary.columns = ['Product', 'SKU', 'Units Sold', 'Revenue', 'Transactions']
-        product_summary['Avg Transaction Size'] = (product_summary['Revenue'] / product_summary['Transactions']).round(2)
-        product_summary = product_summary.sort_values('Revenue', ascending=False)
-        
-        # Format currency columns
-        product_summary['Revenue'] = product_summary['Revenue'].apply(lambda x: f"${x:,.2f}")
-        product_summary['Avg Transaction Size'] = product_summary['Avg Transaction Size'].apply(lambda x: f"${x:,.2f}")
-        
-        st.dataframe(
-            product_summary,
-            use_container_width=True,
-            hide_index=True,
-            column_config={
-                "Units Sold": st.column_config.NumberColumn(format="%d"),
-                "Transactions": st.column_config.NumberColumn(format="%d")
-            }
-        )
+    product_summary = insights['product_summary'].copy()
+    product_summary['Avg Transaction Size'] = (product_summary['Revenue'] / product_summary['Transactions']).round(2)
+    
+    # Format currency columns
+    product_summary['Revenue'] = product_summary['Revenue'].apply(lambda x: f"${x:,.2f}")
+    product_summary['Avg Transaction Size'] = product_summary['Avg Transaction Size'].apply(lambda x: f"${x:,.2f}")
+    
+    st.dataframe(
+        product_summary,
+        use_container_width=True,
+        hide_index=True,
+        column_config={
+            "Units Sold": st.column_config.NumberColumn(format="%d"),
+            "Transactions": st.column_config.NumberColumn(format="%d")
+        }
+    )
     
     # Product Trends
     st.markdown("---")
     st.subheader("📈 Product Sales Trends")
     
     # Allow selection of top products to track
-    if not product_sales.empty:
-        top_products = revenue_by_product.head(10).index.tolist()
-        selected_products = st.multiselect(
-            "Select products to track",
-            options=top_products,
-            default=top_products[:5]
-        )
+    top_products = revenue_by_product.head(10).index.tolist()
+    selected_products = st.multiselect(
+        "Select products to track",
+        options=top_products,
+        default=top_products[:5]
+    )
+    
+    if selected_products:
+        daily_product_sales = insights['daily_product_revenue'](selected_products)
         
-        if selected_products:
-            # Merge with sales dates
-            product_trends = product_sales[product_sales['name'].isin(selected_products)].merge(
-                sales_df[['id', 'sale_date']],
-                left_on='sale_id',
-                right_on='id',
-                how='left'
-            )
-            
-            product_trends['sale_date'] = pd.to_datetime(product_trends['sale_date'])
-            daily_product_sales = product_trends.groupby([product_trends['sale_date'].dt.date, 'name'])['revenue'].sum().reset_index()
-            
-            fig = px.line(
-                daily_product_sales,
-                x='sale_date',
-                y='revenue',
-                color='name',
-                title="Daily Revenue by Product",
-                labels={'sale_date': 'Date', 'revenue': 'Revenue ($)', 'name': 'Product'}
-            )
-            fig.update_layout(height=400)
-            st.plotly_chart(fig, use_container_width=True)
+        fig = px.line(
+            daily_product_sales,
+            x='sale_date',
+            y='revenue',
+            color='name',
+            title="Daily Revenue by Product",
+            labels={'sale_date': 'Date', 'revenue': 'Revenue ($)', 'name': 'Product'}
+        )
+        fig.update_layout(height=400)
+        st.plotly_chart(fig, use_container_width=True)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,6 +1,8 @@
 #!/bin/bash
 # Setup script for daily incremental sync cron job
 # Run this script to install the cron job for automated daily syncs
+# The job shares the sync daemon's lock (SYNC_DAEMON_LOCK), so it skips its run
+# while 01-data-integration/src/sync_daemon.py is running
 
 set -e
 
@@ -31,6 +33,7 @@ echo "✅ Cron job installed successfully!"
 echo ""
 echo "📅 Schedule: Daily at 2:00 AM"
 echo "📄 Logs: $LOG_PATH"
+echo "🔁 Skipped while the sync daemon holds its lock (python3 01-data-integration/src/sync_daemon.py)"
 echo "🔍 View current cron jobs: crontab -l"
 echo "❌ Remove cron job: crontab -e (then delete the line)"
 echo ""